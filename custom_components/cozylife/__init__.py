@@ -2,14 +2,30 @@
 from __future__ import annotations
 
 import asyncio
+from datetime import timedelta
+from functools import partial
 import logging
 
 import voluptuous as vol
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_EFFECT
-from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.components.light import (
+    ATTR_BRIGHTNESS,
+    ATTR_COLOR_TEMP_KELVIN,
+    ATTR_HS_COLOR,
+)
+from homeassistant.const import ATTR_ENTITY_ID, CONF_EFFECT, CONF_STATE
+from homeassistant.core import (
+    HomeAssistant,
+    callback,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
+from homeassistant.exceptions import ServiceValidationError
 import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
+from homeassistant.helpers.storage import STORAGE_DIR
 from homeassistant.helpers.typing import ConfigType
 
 from .const import (
@@ -17,11 +33,27 @@ from .const import (
     CONF_DEVICE_TYPE_CODE,
     CONF_SUBNET,
     CONF_DEVICES,
+    CONF_IDLE_TIMEOUT,
+    CONF_MAX_CONNECTIONS,
+    CONF_RELIABLE_CONTROL,
     PLATFORMS,
+    ENTITIES_KEY,
+    STATE_CACHE_KEY,
+    CONNECTIONS_KEY,
 )
 
 CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+from .device import DeviceDescriptor
+from .discovery import in_range, merge_devices
+from .manager import HANDOVER_GRACE, ConnectionManager
 from .tcp_client import tcp_client
+from .pool import ConnectionPool, DEFAULT_IDLE_TIMEOUT, DEFAULT_MAX_CONNECTIONS
+from .ratelimit import DEFAULT_HUB_RATE, TokenBucket
+from .recovery import RecoveryCoordinator
+from .scene import PREPARE_TIMEOUT, apply_payloads
+from .scheduler import DeviceScheduler
+from .state_cache import DeviceStateCache
+from .utils import get_catalog, set_catalog_path
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -31,6 +63,44 @@ LIGHT_ENTITIES_KEY = "light_entities"
 # Entry IDs that were absorbed into a hub during consolidation
 _ABSORBED_IDS_KEY = "_absorbed_ids"
 
+# Compact product catalog, cached under .storage
+CATALOG_FILE = f"{DOMAIN}.catalog.json"
+
+# How often idle sockets are swept out of a hub's connection pool
+POOL_SWEEP_INTERVAL = timedelta(seconds=30)
+
+SERVICE_APPLY_SCENE = "apply_scene"
+ATTR_ENTITIES = "entities"
+ATTR_RELIABLE = "reliable"
+
+SCENE_TARGET_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_ENTITY_ID): cv.entity_id,
+        vol.Optional(CONF_STATE, default="on"): vol.In(["on", "off"]),
+        vol.Optional(ATTR_BRIGHTNESS): vol.All(vol.Coerce(int), vol.Range(min=0, max=255)),
+        vol.Optional(ATTR_COLOR_TEMP_KELVIN): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Optional(ATTR_HS_COLOR): vol.All(
+            vol.Coerce(tuple),
+            vol.ExactSequence(
+                (
+                    vol.All(vol.Coerce(float), vol.Range(min=0, max=360)),
+                    vol.All(vol.Coerce(float), vol.Range(min=0, max=100)),
+                )
+            ),
+        ),
+    }
+)
+
+APPLY_SCENE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_ENTITIES): vol.All(cv.ensure_list, [SCENE_TARGET_SCHEMA]),
+        vol.Optional(ATTR_RELIABLE): cv.boolean,
+    }
+)
+
+SERVICE_DUMP_TRACE = "dump_trace"
+DUMP_TRACE_SCHEMA = vol.Schema({vol.Optional(ATTR_ENTITY_ID): cv.entity_ids})
+
 
 def _get_subnet(ip: str) -> str:
     """Return the /24 subnet prefix for an IP address."""
@@ -67,8 +137,15 @@ async def async_migrate_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         if (
             other.entry_id != entry.entry_id
             and other.version >= 2
-            and other.data.get(CONF_SUBNET) == subnet
             and other.data.get(CONF_DEVICES)  # non-empty → real hub
+            and (
+                other.data.get(CONF_SUBNET) == subnet
+                # a hub over a wider range (e.g. a /22) covers it too
+                or (
+                    other.data.get("start_ip") and other.data.get("end_ip")
+                    and in_range(data["ip"], other.data["start_ip"], other.data["end_ip"])
+                )
+            )
         ):
             existing_hub = other
             break
@@ -122,6 +199,16 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN].setdefault(LIGHT_ENTITIES_KEY, [])
 
+    # Keep the product catalog on disk and warm it up off the setup path;
+    # only discovery needs it
+    set_catalog_path(hass.config.path(STORAGE_DIR, CATALOG_FILE))
+    async def _async_refresh_catalog() -> None:
+        await hass.async_add_executor_job(get_catalog)
+
+    hass.async_create_background_task(
+        _async_refresh_catalog(), f"{DOMAIN} catalog refresh"
+    )
+
     # Consolidation: group v2 entries by subnet, merge devices, mark extras
     entries = hass.config_entries.async_entries(DOMAIN)
     by_subnet: dict[str, list[ConfigEntry]] = {}
@@ -186,22 +273,53 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         )
         return True
 
-    clients: dict[str, tcp_client] = {}
+    if STATE_CACHE_KEY not in hass.data[DOMAIN]:
+        cache = DeviceStateCache(hass)
+        await cache.async_load()
+        hass.data[DOMAIN].setdefault(STATE_CACHE_KEY, cache)
+    state_cache: DeviceStateCache = hass.data[DOMAIN][STATE_CACHE_KEY]
+    hass.data[DOMAIN].setdefault(CONNECTIONS_KEY, ConnectionManager())
+
+    # Sockets are opened on first use and closed again when idle
+    pool = ConnectionPool(
+        max_connections=entry.options.get(CONF_MAX_CONNECTIONS, DEFAULT_MAX_CONNECTIONS),
+        idle_timeout=entry.options.get(CONF_IDLE_TIMEOUT, DEFAULT_IDLE_TIMEOUT),
+    )
+    # All devices behind the hub share one frame budget on the access point
+    hub_limiter = TokenBucket(DEFAULT_HUB_RATE)
+    reliable = entry.options.get(CONF_RELIABLE_CONTROL, False)
+    # Device I/O runs on the hub's own workers, queued fairly per device
+    scheduler = DeviceScheduler(name=f"{DOMAIN}-{entry.entry_id[:8]}")
+    # After a mass outage devices reconnect in waves, queued like other I/O
+    recovery = RecoveryCoordinator(
+        lambda client: scheduler.submit(client.device_id, client.reconnect),
+        name=f"{DOMAIN}-{entry.entry_id[:8]}",
+    )
+    entry_data = hass.data[DOMAIN][entry.entry_id] = {
+        "clients": {},
+        "pool": pool,
+        "hub_limiter": hub_limiter,
+        "scheduler": scheduler,
+        "recovery": recovery,
+        "reliable": reliable,
+        "options": dict(entry.options),
+        # Platform callbacks that add entities for newly added clients
+        "adders": [],
+    }
 
     for dev in devices:
-        client = tcp_client(dev["ip"])
-        client._device_id = dev["did"]
-        client._pid = dev["pid"]
-        client._dpid = dev["dpid"]
-        client._device_model_name = dev.get("dmn", "CozyLife Device")
-        client._device_type_code = dev.get(CONF_DEVICE_TYPE_CODE, "01")
-        await hass.async_add_executor_job(client._initSocket)
-        clients[dev["did"]] = client
-
-    hass.data[DOMAIN][entry.entry_id] = {
-        "clients": clients,
-        "devices": devices,
-    }
+        client = _acquire(hass, entry.entry_id, entry_data, dev)
+        if client is not None:
+            entry_data["clients"][dev["did"]] = client
+        state_cache.async_update_info(dev["did"], dev)
+
+    async def _async_sweep_idle(_now) -> None:
+        await hass.async_add_executor_job(pool.close_idle)
+
+    entry.async_on_unload(
+        async_track_time_interval(hass, _async_sweep_idle, POOL_SWEEP_INTERVAL)
+    )
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
@@ -224,9 +342,214 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             ),
         )
 
+    if not hass.services.has_service(DOMAIN, SERVICE_APPLY_SCENE):
+        async def async_apply_scene(call: ServiceCall) -> ServiceResponse:
+            return await _async_apply_scene(hass, call)
+
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_APPLY_SCENE,
+            async_apply_scene,
+            schema=APPLY_SCENE_SCHEMA,
+            supports_response=SupportsResponse.OPTIONAL,
+        )
+
+    if not hass.services.has_service(DOMAIN, SERVICE_DUMP_TRACE):
+        async def async_dump_trace(call: ServiceCall) -> ServiceResponse:
+            registry = hass.data[DOMAIN].get(ENTITIES_KEY, {})
+            entity_ids = call.data.get(ATTR_ENTITY_ID) or list(registry)
+            return {
+                "traces": {
+                    entity_id: registry[entity_id]._tcp_client.trace()
+                    for entity_id in entity_ids
+                    if entity_id in registry
+                }
+            }
+
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_DUMP_TRACE,
+            async_dump_trace,
+            schema=DUMP_TRACE_SCHEMA,
+            supports_response=SupportsResponse.ONLY,
+        )
+
     return True
 
 
+def _wire(entry_data: dict, client: tcp_client) -> None:
+    """Run a client on the hub's pool, frame budget and workers."""
+    client._pool = entry_data["pool"]
+    client._hub_limiter = entry_data["hub_limiter"]
+    client._scheduler = entry_data["scheduler"]
+    client._recovery = entry_data["recovery"]
+    client.reliable = entry_data["reliable"]
+    entry_data["recovery"].register(client)
+
+
+def _acquire(
+    hass: HomeAssistant, entry_id: str, entry_data: dict, dev: dict
+) -> tcp_client | None:
+    """Reference a device from a hub; returns its client if the hub owns it."""
+    manager: ConnectionManager = hass.data[DOMAIN][CONNECTIONS_KEY]
+    parked = manager.unpark(dev["did"])
+    if parked is not None and parked._ip != dev["ip"]:
+        hass.async_add_executor_job(parked.disconnect)
+        parked = None
+
+    def _create() -> tcp_client:
+        if parked is None:
+            return tcp_client(dev["ip"], descriptor=DeviceDescriptor.from_dict(dev))
+        # Same device at the same address: keep its socket and state
+        parked.descriptor = DeviceDescriptor.from_dict(dev)
+        parked._handed_over = True
+        return parked
+
+    client, owned = manager.acquire(entry_id, dev["did"], _create)
+    if not owned:
+        _LOGGER.warning(
+            "Device %s is configured on more than one CozyLife hub; "
+            "it is served by the hub that set it up first", dev["did"],
+        )
+        return None
+    _wire(entry_data, client)
+    if client._connect is not None:
+        entry_data["pool"].checkin(client)
+    return client
+
+
+@callback
+def _async_hand_over(
+    hass: HomeAssistant, entry_data: dict, new_owner: str, clients: list[tcp_client]
+) -> None:
+    """Move clients of a hub being unloaded to another hub that uses them."""
+    owner_data = hass.data[DOMAIN].get(new_owner)
+    for client in clients:
+        # Keep the socket: forget it here rather than closing it
+        entry_data["pool"].release(client)
+        entry_data["recovery"].unregister(client)
+        if owner_data is None:
+            # Wired when that hub sets up and acquires it
+            continue
+        _wire(owner_data, client)
+        if client._connect is not None:
+            owner_data["pool"].checkin(client)
+        owner_data["clients"][client.device_id] = client
+    if owner_data is not None:
+        for async_add_clients in owner_data["adders"]:
+            async_add_clients(clients)
+
+
+@callback
+def async_add_devices(
+    hass: HomeAssistant, entry: ConfigEntry, devices: list[dict]
+) -> tuple[list[dict], list[dict]]:
+    """Add or re-address devices on a hub without reloading it.
+
+    New devices get a client and entities on the running platforms;
+    known devices found at a new address are pointed there.  The entry is
+    written once for the whole batch, so the cost follows the number of
+    changed devices rather than the size of the hub.  Returns
+    ``(added, moved)``.
+    """
+    merged, added, moved = merge_devices(entry.data.get(CONF_DEVICES, []), devices)
+    if not added and not moved:
+        return added, moved
+
+    entry_data = hass.data.get(DOMAIN, {}).get(entry.entry_id)
+    if entry_data is not None:
+        state_cache: DeviceStateCache = hass.data[DOMAIN][STATE_CACHE_KEY]
+        clients = entry_data["clients"]
+        for dev in moved:
+            # The client may be shared with, and run by, another hub
+            client = hass.data[DOMAIN][CONNECTIONS_KEY].get(dev["did"])
+            if client is not None:
+                client._ip = dev["ip"]
+                if client.descriptor is not None:
+                    client.descriptor = client.descriptor._replace(ip=dev["ip"])
+                # Drop the old socket behind any I/O already queued for it
+                client._scheduler.submit(dev["did"], client.disconnect)
+            state_cache.async_update_info(dev["did"], dev)
+        new_clients = []
+        for dev in added:
+            client = _acquire(hass, entry.entry_id, entry_data, dev)
+            if client is not None:
+                clients[dev["did"]] = client
+                new_clients.append(client)
+            state_cache.async_update_info(dev["did"], dev)
+        # Platforms still being set up pick new clients up from the dict
+        for async_add_clients in entry_data["adders"]:
+            async_add_clients(new_clients)
+
+    # Options are unchanged, so the update listener leaves the hub running
+    hass.config_entries.async_update_entry(
+        entry, data={**entry.data, CONF_DEVICES: merged}
+    )
+    return added, moved
+
+
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the hub when its options change."""
+    entry_data = hass.data[DOMAIN].get(entry.entry_id)
+    if entry_data is not None and entry_data["options"] != dict(entry.options):
+        await hass.config_entries.async_reload(entry.entry_id)
+
+
+async def _async_apply_scene(hass: HomeAssistant, call: ServiceCall) -> ServiceResponse:
+    """Apply per-entity target states to many devices in one synchronized burst."""
+    registry = hass.data[DOMAIN].get(ENTITIES_KEY, {})
+    unknown = [t[ATTR_ENTITY_ID] for t in call.data[ATTR_ENTITIES]
+               if t[ATTR_ENTITY_ID] not in registry]
+    if unknown:
+        raise ServiceValidationError(
+            f"Not CozyLife entities: {', '.join(unknown)}"
+        )
+
+    # Build every payload before touching the network; entities sharing a
+    # device get their payloads merged into a single frame.
+    by_device: dict[str, tuple[tcp_client, dict, list]] = {}
+    for target in call.data[ATTR_ENTITIES]:
+        entity = registry[target[ATTR_ENTITY_ID]]
+        client = entity._tcp_client
+        payload = entity.scene_payload(target)
+        _, merged, members = by_device.setdefault(
+            client.device_id, (client, {}, [])
+        )
+        merged.update(payload)
+        members.append(entity)
+
+    groups = list(by_device.values())
+    results = await hass.async_add_executor_job(
+        apply_payloads,
+        [(client, payload) for client, payload, _ in groups],
+        PREPARE_TIMEOUT,
+        call.data.get(ATTR_RELIABLE),
+    )
+
+    response: dict[str, dict] = {}
+    for (_, _, members), result in zip(groups, results):
+        for entity in members:
+            entity.async_write_ha_state()
+            response[entity.entity_id] = result
+            if not result["success"]:
+                # Replace the optimistic state with what the device reports
+                hass.async_create_task(entity._async_reconcile())
+
+    failed = [entity_id for entity_id, r in response.items() if not r["success"]]
+    if failed:
+        _LOGGER.warning("apply_scene failed for: %s", ", ".join(failed))
+
+    return {"results": response}
+
+
+@callback
+def _async_close_parked(hass: HomeAssistant, client: tcp_client, _now) -> None:
+    """Close a parked client no hub took over."""
+    manager = hass.data.get(DOMAIN, {}).get(CONNECTIONS_KEY)
+    if manager is not None and manager.discard(client.device_id, client):
+        hass.async_add_executor_job(client.disconnect)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a CozyLife hub config entry."""
     # If entry was never fully set up (absorbed), just return True
@@ -236,8 +559,26 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if ok:
         entry_data = hass.data[DOMAIN].pop(entry.entry_id, None)
-        if entry_data and "clients" in entry_data:
-            for client in entry_data["clients"].values():
-                await hass.async_add_executor_job(client.disconnect)
+        if entry_data and "pool" in entry_data:
+            # Devices another hub also lists stay connected and move there
+            manager: ConnectionManager = hass.data[DOMAIN][CONNECTIONS_KEY]
+            unused, moved = manager.release_entry(entry.entry_id)
+            for new_owner, clients in moved.items():
+                _async_hand_over(hass, entry_data, new_owner, clients)
+            # Keep the rest connected for a moment in case the hub is
+            # reloading; the new instance takes them over
+            for client in unused:
+                entry_data["pool"].release(client)
+                entry_data["recovery"].unregister(client)
+                manager.park(client.device_id, client)
+                async_call_later(
+                    hass, HANDOVER_GRACE, partial(_async_close_parked, hass, client)
+                )
+        if entry_data and "recovery" in entry_data:
+            entry_data["recovery"].shutdown()
+        if entry_data and "scheduler" in entry_data:
+            entry_data["scheduler"].shutdown()
+        if entry_data and "pool" in entry_data:
+            await hass.async_add_executor_job(entry_data["pool"].close_all)
 
     return ok
@@ -0,0 +1,320 @@
+"""Command-line tool for CozyLife devices.
+
+Runs without Home Assistant, from this directory::
+
+    python -m cli scan 192.168.1.0/24
+    python -m cli info 192.168.1.20 192.168.1.21
+    python -m cli query 192.168.1.20
+    python -m cli control 192.168.1.20 '{"1": 1, "4": 500}'
+    python -m cli bench 192.168.1.20 --count 200
+    python -m cli bench --emulate 8 --count 100 --unpaced
+    python -m cli emulate --count 3 --base-port 15555
+
+Every command prints JSON on stdout.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .const import SUPPORT_DEVICE_CATEGORY
+    from .discovery import ip_range, parse_range, prioritize, read_arp_cache, sweep
+    from .emulator import EmulatedDevice
+    from .ratelimit import AdaptiveLimiter
+    from .tcp_client import tcp_client
+    from .utils import get_catalog, set_catalog_path
+except ImportError:
+    from const import SUPPORT_DEVICE_CATEGORY
+    from discovery import ip_range, parse_range, prioritize, read_arp_cache, sweep
+    from emulator import EmulatedDevice
+    from ratelimit import AdaptiveLimiter
+    from tcp_client import tcp_client
+    from utils import get_catalog, set_catalog_path
+
+DEFAULT_PORT = tcp_client._port
+WORKERS = 32
+
+CATALOG_PATH = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'cozylife', 'catalog.json')
+
+# Effectively disables the rate limiters for raw protocol benchmarks
+_UNPACED_RATE = 1e9
+
+
+def _parse_target(target: str, port: int) -> tuple[str, int]:
+    """Split ``host[:port]``."""
+    host, _, target_port = target.partition(':')
+    return host, int(target_port) if target_port else port
+
+
+def _client(host: str, port: int, timeout: float, unpaced: bool = False) -> tcp_client:
+    client = tcp_client(host, timeout=timeout)
+    client._port = port
+    if unpaced:
+        client._limiter = AdaptiveLimiter(_UNPACED_RATE, _UNPACED_RATE, _UNPACED_RATE)
+    return client
+
+
+def device_info(host: str, port: int, timeout: float, deadline: float | None = None) -> dict:
+    """Return the CMD_INFO data for one device."""
+    client = _client(host, port, timeout)
+    try:
+        client._device_info(deadline)
+        return {
+            'ip': host,
+            'port': port,
+            'did': client.device_id,
+            'pid': client.pid,
+            'dmn': client.device_model_name,
+            'dpid': list(client.dpid),
+            'device_type_code': client.device_type_code,
+            'reachable': client.descriptor is not None,
+        }
+    finally:
+        client.disconnect()
+
+
+def cmd_scan(args) -> object:
+    start_ip, end_ip = parse_range(args.start, args.end)
+    ips = prioritize(ip_range(start_ip, end_ip), read_arp_cache())
+    started = time.monotonic()
+    responders = sweep(ips, port=args.port, timeout=args.timeout)
+    swept = time.monotonic()
+    get_catalog()
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        infos = list(pool.map(lambda ip: device_info(ip, args.port, args.timeout, args.deadline), responders))
+    devices = [
+        info for info in infos
+        if args.all or info['device_type_code'] in SUPPORT_DEVICE_CATEGORY
+    ]
+    return {
+        'range': [start_ip, end_ip],
+        'addresses': len(ips),
+        'listening': len(responders),
+        'sweep_s': round(swept - started, 3),
+        'total_s': round(time.monotonic() - started, 3),
+        'devices': devices,
+    }
+
+
+def cmd_info(args) -> object:
+    targets = [_parse_target(t, args.port) for t in args.targets]
+    get_catalog()
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        return list(pool.map(lambda t: device_info(t[0], t[1], args.timeout, args.deadline), targets))
+
+
+def cmd_query(args) -> object:
+    targets = [_parse_target(t, args.port) for t in args.targets]
+
+    def _query(target):
+        client = _client(*target, args.timeout)
+        try:
+            # always a live read, never a coalesced one
+            result = client.query_result(deadline=args.deadline, max_age=0)
+            return {'ip': target[0], 'port': target[1], 'outcome': result.outcome,
+                    'stage': result.stage, 'elapsed_ms': round(result.elapsed * 1000, 3),
+                    'state': result.data}
+        finally:
+            client.disconnect()
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        return list(pool.map(_query, targets))
+
+
+def cmd_control(args) -> object:
+    payload = {str(k): v for k, v in json.loads(args.payload).items()}
+    targets = [_parse_target(t, args.port) for t in args.targets]
+
+    def _control(target):
+        client = _client(*target, args.timeout)
+        try:
+            result = client.control(payload, deadline=args.deadline)
+            return {'ip': target[0], 'port': target[1], 'outcome': result.outcome,
+                    'stage': result.stage, 'trace': client.trace()}
+        finally:
+            client.disconnect()
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        return list(pool.map(_control, targets))
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _summary(latencies: list[float]) -> dict:
+    if not latencies:
+        return {}
+    ms = [lat * 1000 for lat in latencies]
+    return {
+        'min_ms': round(min(ms), 3),
+        'mean_ms': round(statistics.fmean(ms), 3),
+        'p50_ms': round(_percentile(ms, 50), 3),
+        'p95_ms': round(_percentile(ms, 95), 3),
+        'p99_ms': round(_percentile(ms, 99), 3),
+        'max_ms': round(max(ms), 3),
+    }
+
+
+def bench(targets: list[tuple[str, int]], count: int, mode: str,
+          timeout: float, unpaced: bool, deadline: float | None = None) -> dict:
+    """Run ``count`` operations against every target concurrently.
+
+    ``deadline`` is the overall budget of each operation; operations that
+    run out of it are counted as ``timed_out`` as well as ``lost``.
+    """
+
+    def _run(target):
+        client = _client(*target, timeout, unpaced)
+        latencies = []
+        lost = 0
+        timed_out = 0
+        try:
+            for i in range(count):
+                if mode == 'query':
+                    # every iteration is a real round trip
+                    result = client.query_result(deadline=deadline, max_age=0)
+                    ok = result.data is not None
+                else:
+                    result = client.control({'1': 1, '4': (i * 37) % 1000}, deadline=deadline)
+                    ok = result.ok
+                if ok:
+                    latencies.append(result.elapsed)
+                else:
+                    lost += 1
+                    timed_out += result.timed_out
+        finally:
+            client.disconnect()
+        return {'ip': target[0], 'port': target[1], 'ok': len(latencies), 'lost': lost,
+                'timed_out': timed_out, 'rate': round(client._limiter.rate, 2), **_summary(latencies)}
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, len(targets))) as pool:
+        devices = list(pool.map(_run, targets))
+    elapsed = time.monotonic() - started
+    total = sum(d['ok'] for d in devices)
+    return {
+        'mode': mode,
+        'devices': len(targets),
+        'count': count,
+        'paced': not unpaced,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_ops': round(total / elapsed, 1) if elapsed else None,
+        'lost': sum(d['lost'] for d in devices),
+        'timed_out': sum(d['timed_out'] for d in devices),
+        'per_device': devices,
+    }
+
+
+def cmd_bench(args) -> object:
+    emulated = [
+        EmulatedDevice(latency=args.latency, loss=args.loss).start()
+        for _ in range(args.emulate)
+    ]
+    try:
+        targets = [_parse_target(t, args.port) for t in args.targets]
+        targets += [device.address for device in emulated]
+        if not targets:
+            raise SystemExit('bench: give device addresses or --emulate N')
+        return bench(targets, args.count, args.mode, args.timeout, args.unpaced, args.deadline)
+    finally:
+        for device in emulated:
+            device.stop()
+
+
+def cmd_emulate(args) -> object:
+    devices = [
+        EmulatedDevice(host=args.host, port=args.base_port + i if args.base_port else 0,
+                       latency=args.latency, loss=args.loss).start()
+        for i in range(args.count)
+    ]
+    print(json.dumps([
+        {'ip': d.address[0], 'port': d.address[1], 'did': d.did} for d in devices
+    ]), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for device in devices:
+            device.stop()
+    return None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='cozylife', description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='device port (default 5555)')
+    parser.add_argument('--timeout', type=float, default=1.0, help='socket timeout in seconds')
+    parser.add_argument('--deadline', type=float, default=None,
+                        help='overall budget of each operation in seconds (default: 2x timeout)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='debug logging on stderr')
+    parser.add_argument('--catalog', default=CATALOG_PATH,
+                        help='product catalog cache file (default: %(default)s)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    scan = sub.add_parser('scan', help='discover devices in a range or CIDR')
+    scan.add_argument('start', help='start address or CIDR')
+    scan.add_argument('end', nargs='?', help='end address')
+    scan.add_argument('--all', action='store_true', help='include hosts of unknown device type')
+    scan.set_defaults(func=cmd_scan)
+
+    info = sub.add_parser('info', help='CMD_INFO for one or more devices')
+    info.add_argument('targets', nargs='+', metavar='host[:port]')
+    info.set_defaults(func=cmd_info)
+
+    query = sub.add_parser('query', help='CMD_QUERY for one or more devices')
+    query.add_argument('targets', nargs='+', metavar='host[:port]')
+    query.set_defaults(func=cmd_query)
+
+    control = sub.add_parser('control', help='send a control payload')
+    control.add_argument('targets', nargs='+', metavar='host[:port]')
+    control.add_argument('payload', help='JSON object of dpid -> value')
+    control.set_defaults(func=cmd_control)
+
+    bench_parser = sub.add_parser('bench', help='latency and throughput benchmark')
+    bench_parser.add_argument('targets', nargs='*', metavar='host[:port]')
+    bench_parser.add_argument('--count', type=int, default=100, help='operations per device')
+    bench_parser.add_argument('--mode', choices=['query', 'control'], default='query')
+    bench_parser.add_argument('--unpaced', action='store_true', help='bypass the rate limiters')
+    bench_parser.add_argument('--emulate', type=int, default=0, metavar='N',
+                              help='also start N emulated devices and include them')
+    bench_parser.add_argument('--latency', type=float, default=0.0, help='emulated reply delay (s)')
+    bench_parser.add_argument('--loss', type=float, default=0.0, help='emulated drop ratio')
+    bench_parser.set_defaults(func=cmd_bench)
+
+    emulate = sub.add_parser('emulate', help='run emulated devices until interrupted')
+    emulate.add_argument('--count', type=int, default=1)
+    emulate.add_argument('--host', default='127.0.0.1')
+    emulate.add_argument('--latency', type=float, default=0.0)
+    emulate.add_argument('--loss', type=float, default=0.0)
+    emulate.add_argument('--base-port', type=int, default=0,
+                         help='first port to listen on (default: any free port)')
+    emulate.set_defaults(func=cmd_emulate)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, stream=sys.stderr)
+    set_catalog_path(args.catalog)
+    result = args.func(args)
+    if result is not None:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Always-on per-device command trace."""
+from __future__ import annotations
+
+import threading
+import time
+
+TRACE_SIZE = 64
+
+# Who issued the command
+CALLER_POLL = 'poll'
+CALLER_SERVICE = 'service'
+CALLER_TRANSITION = 'transition'
+CALLER_SCENE = 'scene'
+CALLER_DISCOVERY = 'discovery'
+
+# How it ended
+OUTCOME_PENDING = 'pending'
+OUTCOME_OK = 'ok'
+OUTCOME_SENT = 'sent'  # written to the socket, no reply expected
+OUTCOME_SEND_FAILED = 'send_failed'
+OUTCOME_NO_REPLY = 'no_reply'
+OUTCOME_TIMEOUT = 'timeout'  # the operation's deadline ran out
+
+_FIELDS = ('cmd', 'sn', 'size', 'sent', 'replied', 'outcome', 'caller')
+_SENT = 3
+_REPLIED = 4
+_OUTCOME = 5
+
+
+class CommandTrace:
+    """Fixed-size ring buffer of the most recent commands to one device.
+
+    Slots are allocated once and overwritten in place, so recording costs no
+    string formatting and almost no allocation on the hot path.  Times are
+    stamped on the monotonic clock, so latencies survive wall-clock jumps,
+    and shown as wall-clock seconds by dump().
+    """
+
+    __slots__ = ('_slots', '_next', '_lock')
+
+    def __init__(self, size: int = TRACE_SIZE) -> None:
+        self._slots = [[None] * len(_FIELDS) for _ in range(size)]
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def start(self, cmd: int, sn: str, size: int, caller: str | None) -> list:
+        """Record a command as sent and return its slot for finish()."""
+        with self._lock:
+            slot = self._slots[self._next % len(self._slots)]
+            self._next += 1
+        slot[0] = cmd
+        slot[1] = sn
+        slot[2] = size
+        slot[_SENT] = time.monotonic()
+        slot[_REPLIED] = None
+        slot[_OUTCOME] = OUTCOME_PENDING
+        slot[6] = caller
+        return slot
+
+    @staticmethod
+    def finish(slot: list, outcome: str, replied: bool = False) -> None:
+        """Set the outcome of a started command, stamping the reply time."""
+        if replied:
+            slot[_REPLIED] = time.monotonic()
+        slot[_OUTCOME] = outcome
+
+    def dump(self) -> list[dict]:
+        """Return the recorded commands, oldest first."""
+        with self._lock:
+            count = min(self._next, len(self._slots))
+            start = self._next - count
+            rows = [
+                list(self._slots[i % len(self._slots)])
+                for i in range(start, self._next)
+            ]
+        # Wall-clock time of the monotonic clock's zero, for display only
+        offset = time.time() - time.monotonic()
+        records = []
+        for row in rows:
+            record = dict(zip(_FIELDS, row))
+            if record['replied'] is not None:
+                record['latency_ms'] = round((record['replied'] - record['sent']) * 1000, 2)
+                record['replied'] += offset
+            if record['sent'] is not None:
+                record['sent'] += offset
+            records.append(record)
+        return records
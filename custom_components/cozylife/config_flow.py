@@ -1,29 +1,61 @@
 """Config flow for CozyLife integration."""
 from __future__ import annotations
 
+import asyncio
+from datetime import timedelta
+from functools import partial
 import logging
-from ipaddress import IPv4Address, ip_address
 
 import voluptuous as vol
 
-from homeassistant.config_entries import ConfigFlow
-from homeassistant.data_entry_flow import FlowResult
+from homeassistant.config_entries import ConfigEntry, ConfigFlow, OptionsFlow
+from homeassistant.const import CONF_NAME
+from homeassistant.core import callback
+import homeassistant.helpers.config_validation as cv
+from homeassistant.data_entry_flow import FlowResult, UnknownFlow
+from homeassistant.helpers.event import async_track_time_interval
 
+from . import async_add_devices
 from .const import (
     DOMAIN,
     CONF_DEVICE_TYPE_CODE,
+    CONF_GROUPS,
+    LIGHT_TYPE_CODE,
     CONF_SUBNET,
     CONF_DEVICES,
-    SUPPORT_DEVICE_CATEGORY,
+    CONF_IDLE_TIMEOUT,
+    CONF_MAX_CONNECTIONS,
+    CONF_RELIABLE_CONTROL,
 )
-from .tcp_client import tcp_client
+from .discovery import (
+    InvalidRange,
+    RangeTooLarge,
+    ScanProgress,
+    hub_ranges,
+    hub_subnet,
+    hub_title,
+    in_range,
+    ip_range,
+    merge_devices,
+    parse_range,
+    rescan,
+    scan_ips,
+)
+from .pool import DEFAULT_IDLE_TIMEOUT, DEFAULT_MAX_CONNECTIONS
 
 _LOGGER = logging.getLogger(__name__)
 
+CONF_MEMBERS = "members"
+CONF_EXPECTED = "expected"
+
+# How often the scan progress shown in the flow is refreshed
+PROGRESS_INTERVAL = timedelta(seconds=1)
+
 STEP_USER_DATA_SCHEMA = vol.Schema(
     {
         vol.Required("start_ip"): str,
-        vol.Required("end_ip"): str,
+        vol.Optional("end_ip"): str,
+        vol.Optional(CONF_EXPECTED): vol.All(vol.Coerce(int), vol.Range(min=1)),
     }
 )
 
@@ -34,52 +66,35 @@ def _get_subnet(ip: str) -> str:
     return ".".join(parts[:3])
 
 
+def _hub_for(entries: list[ConfigEntry], ip: str) -> ConfigEntry | None:
+    """Return the hub entry whose subnet or range covers ``ip``."""
+    subnet = _get_subnet(ip)
+    for entry in entries:
+        if entry.data.get(CONF_SUBNET) == subnet or (
+            entry.data.get("start_ip") and entry.data.get("end_ip")
+            and in_range(ip, entry.data["start_ip"], entry.data["end_ip"])
+        ):
+            return entry
+    return None
+
+
 class CozyLifeConfigFlow(ConfigFlow, domain=DOMAIN):
     """Handle a config flow for CozyLife."""
 
     VERSION = 2
 
-    @staticmethod
-    def _probe_device(ip: str) -> dict | None:
-        """Probe a single device at the given IP."""
-        client = tcp_client(ip, timeout=0.5)
-        try:
-            client._initSocket()
-            if not client._connect:
-                return None
-            client._device_info()
-            if not client._connect:
-                return None
-            if not hasattr(client, '_device_id') or not isinstance(client._device_id, str):
-                return None
-            if not hasattr(client, '_device_type_code') or client._device_type_code not in SUPPORT_DEVICE_CATEGORY:
-                return None
-            return {
-                "ip": ip,
-                "did": client._device_id,
-                "pid": client._pid,
-                "dmn": client._device_model_name,
-                "dpid": client._dpid,
-                CONF_DEVICE_TYPE_CODE: client._device_type_code,
-            }
-        except Exception:
-            _LOGGER.exception("Error probing device at %s", ip)
-            return None
-        finally:
-            client.disconnect()
+    def __init__(self) -> None:
+        """Initialize the flow."""
+        self._scan_range: tuple[str, str] | None = None
+        self._progress: ScanProgress | None = None
+        self._scan_task: asyncio.Future | None = None
+        self._unsub_tick = None
 
     @staticmethod
-    def _scan_range(start_ip: str, end_ip: str) -> list[dict]:
-        """Scan an IP range and return a list of discovered device dicts."""
-        start_int = int(IPv4Address(start_ip))
-        end_int = int(IPv4Address(end_ip))
-        devices = []
-        for ip_int in range(start_int, end_int + 1):
-            ip = str(IPv4Address(ip_int))
-            result = CozyLifeConfigFlow._probe_device(ip)
-            if result is not None:
-                devices.append(result)
-        return devices
+    @callback
+    def async_get_options_flow(config_entry: ConfigEntry) -> OptionsFlow:
+        """Return the options flow for a hub."""
+        return CozyLifeOptionsFlow()
 
     async def async_step_user(
         self, user_input: dict | None = None
@@ -88,67 +103,36 @@ class CozyLifeConfigFlow(ConfigFlow, domain=DOMAIN):
         errors: dict[str, str] = {}
 
         if user_input is not None:
-            start_ip = user_input["start_ip"].strip()
-            end_ip = user_input["end_ip"].strip()
-
-            # Validate IPs
             try:
-                start_addr = ip_address(start_ip)
-                end_addr = ip_address(end_ip)
-            except ValueError:
-                errors["base"] = "invalid_ip"
-                return self.async_show_form(
-                    step_id="user",
-                    data_schema=STEP_USER_DATA_SCHEMA,
-                    errors=errors,
-                )
-
-            # Must be same /24 subnet
-            if _get_subnet(start_ip) != _get_subnet(end_ip):
-                errors["base"] = "different_subnet"
-                return self.async_show_form(
-                    step_id="user",
-                    data_schema=STEP_USER_DATA_SCHEMA,
-                    errors=errors,
+                start_ip, end_ip = parse_range(
+                    user_input["start_ip"].strip(),
+                    user_input.get("end_ip", "").strip() or None,
                 )
-
-            # End must be >= start
-            if int(start_addr) > int(end_addr):
+            except RangeTooLarge:
+                errors["base"] = "range_too_large"
+            except InvalidRange:
                 errors["base"] = "invalid_range"
+            except ValueError:
+                errors["base"] = "invalid_ip"
+            if errors:
                 return self.async_show_form(
                     step_id="user",
                     data_schema=STEP_USER_DATA_SCHEMA,
                     errors=errors,
                 )
 
-            subnet = _get_subnet(start_ip)
+            subnet = hub_subnet(start_ip, end_ip)
 
             # Abort if this subnet hub already exists
             await self.async_set_unique_id(subnet)
             self._abort_if_unique_id_configured()
 
-            # Scan
-            devices = await self.hass.async_add_executor_job(
-                self._scan_range, start_ip, end_ip
-            )
-
-            if not devices:
-                errors["base"] = "cannot_connect"
-                return self.async_show_form(
-                    step_id="user",
-                    data_schema=STEP_USER_DATA_SCHEMA,
-                    errors=errors,
-                )
-
-            return self.async_create_entry(
-                title=f"CozyLife Hub ({subnet}.0/24)",
-                data={
-                    CONF_SUBNET: subnet,
-                    "start_ip": start_ip,
-                    "end_ip": end_ip,
-                    CONF_DEVICES: devices,
-                },
+            self._scan_range = (start_ip, end_ip)
+            self._progress = ScanProgress(
+                len(ip_range(start_ip, end_ip)), user_input.get(CONF_EXPECTED)
             )
+            self._scan_task = None
+            return await self.async_step_scan()
 
         return self.async_show_form(
             step_id="user",
@@ -156,42 +140,240 @@ class CozyLifeConfigFlow(ConfigFlow, domain=DOMAIN):
             errors=errors,
         )
 
+    async def async_step_scan(
+        self, user_input: dict | None = None
+    ) -> FlowResult:
+        """Scan the range, showing the probed and found counts as it goes.
+
+        The step is shown again every PROGRESS_INTERVAL with fresh counts.
+        The scan ends early once the expected number of devices is found.
+        """
+        progress = self._progress
+        if self._scan_task is None:
+            self._scan_task = self.hass.async_add_executor_job(
+                partial(scan_ips, ip_range(*self._scan_range), progress=progress)
+            )
+            self._unsub_tick = async_track_time_interval(
+                self.hass, self._async_tick, PROGRESS_INTERVAL
+            )
+        if not self._scan_task.done():
+            self.async_update_progress(progress.fraction)
+            return self.async_show_progress(
+                step_id="scan",
+                progress_action="scan",
+                progress_task=self._scan_task,
+                description_placeholders={
+                    "probed": str(progress.probed),
+                    "total": str(progress.total),
+                    "found": str(len(progress.found)),
+                },
+            )
+        self._stop_ticker()
+        return self.async_show_progress_done(next_step_id="scan_done")
+
+    async def async_step_scan_done(
+        self, user_input: dict | None = None
+    ) -> FlowResult:
+        """Create the hub from the devices the scan found."""
+        try:
+            devices = self._scan_task.result()
+        except Exception:  # noqa: BLE001 - reported as nothing found
+            _LOGGER.exception("Scan of %s-%s failed", *self._scan_range)
+            devices = []
+        self._scan_task = None
+
+        if not devices:
+            return self.async_show_form(
+                step_id="user",
+                data_schema=STEP_USER_DATA_SCHEMA,
+                errors={"base": "cannot_connect"},
+            )
+
+        start_ip, end_ip = self._scan_range
+        subnet = hub_subnet(start_ip, end_ip)
+        return self.async_create_entry(
+            title=hub_title(subnet),
+            data={
+                CONF_SUBNET: subnet,
+                "start_ip": start_ip,
+                "end_ip": end_ip,
+                CONF_DEVICES: devices,
+            },
+        )
+
+    @callback
+    def _async_tick(self, _now) -> None:
+        """Show the scan step again, with the current counts."""
+        if self._scan_task is not None and not self._scan_task.done():
+            self.hass.async_create_task(self._async_refresh_progress())
+
+    async def _async_refresh_progress(self) -> None:
+        try:
+            await self.hass.config_entries.flow.async_configure(self.flow_id)
+        except UnknownFlow:
+            # Finished or closed meanwhile
+            pass
+
+    @callback
+    def _stop_ticker(self) -> None:
+        if self._unsub_tick is not None:
+            self._unsub_tick()
+            self._unsub_tick = None
+
+    @callback
+    def async_remove(self) -> None:
+        """Stop a running scan when the flow is closed."""
+        self._stop_ticker()
+        if self._progress is not None:
+            self._progress.stop()
+
     async def async_step_import(self, import_data: dict) -> FlowResult:
         """Handle import from YAML configuration.
 
-        Groups devices by /24 subnet. If a hub entry for the subnet already
-        exists, the device is appended to that entry and a reload is scheduled.
+        Takes a batch of devices (or a single device).  Devices inside an
+        existing hub's range are added to the running hub in one update,
+        without reloading it.  The rest are grouped into hub ranges with
+        hub_ranges; the first becomes this flow's entry and any others get
+        an import flow of their own.
         """
-        subnet = _get_subnet(import_data["ip"])
-
-        # Check if a hub entry for this subnet already exists
-        for entry in self._async_current_entries():
-            if entry.data.get(CONF_SUBNET) == subnet:
-                # Append device if not already present
-                existing_dids = {d["did"] for d in entry.data.get(CONF_DEVICES, [])}
-                if import_data["did"] in existing_dids:
-                    return self.async_abort(reason="already_configured")
-
-                new_devices = list(entry.data[CONF_DEVICES]) + [import_data]
-                self.hass.config_entries.async_update_entry(
-                    entry,
-                    data={**entry.data, CONF_DEVICES: new_devices},
-                )
-                self.hass.async_create_task(
-                    self.hass.config_entries.async_reload(entry.entry_id)
-                )
+        devices = import_data.get(CONF_DEVICES, [import_data])
+        hubs: dict[str, tuple[ConfigEntry, list[dict]]] = {}
+        unassigned: list[dict] = []
+        entries = self._async_current_entries()
+        for dev in devices:
+            entry = _hub_for(entries, dev["ip"])
+            if entry is not None:
+                hubs.setdefault(entry.entry_id, (entry, []))[1].append(dev)
+            else:
+                unassigned.append(dev)
+
+        added = 0
+        for entry, hub_devices in hubs.values():
+            added += len(async_add_devices(self.hass, entry, hub_devices)[0])
+
+        if not unassigned:
+            if added:
                 return self.async_abort(reason="device_added_to_hub")
+            return self.async_abort(reason="already_configured")
+
+        # New hubs are keyed and sized like a scanned range would be
+        new_hubs = hub_ranges(unassigned)
+        subnet, start_ip, end_ip, subnet_devices = new_hubs.pop(0)
+        for _, _, _, other_devices in new_hubs:
+            self.hass.async_create_task(
+                self.hass.config_entries.flow.async_init(
+                    DOMAIN,
+                    context={"source": "import"},
+                    data={CONF_DEVICES: other_devices},
+                )
+            )
 
-        # No hub for this subnet yet — create one
+        # No hub for these devices yet — create one
         await self.async_set_unique_id(subnet)
         self._abort_if_unique_id_configured()
 
         return self.async_create_entry(
-            title=f"CozyLife Hub ({subnet}.0/24)",
+            title=hub_title(subnet),
             data={
                 CONF_SUBNET: subnet,
-                "start_ip": f"{subnet}.1",
-                "end_ip": f"{subnet}.254",
-                CONF_DEVICES: [import_data],
+                "start_ip": start_ip,
+                "end_ip": end_ip,
+                CONF_DEVICES: merge_devices([], subnet_devices)[0],
             },
         )
+
+
+class CozyLifeOptionsFlow(OptionsFlow):
+    """Handle hub options."""
+
+    async def async_step_init(
+        self, user_input: dict | None = None
+    ) -> FlowResult:
+        """Choose between hub settings and a device rescan."""
+        return self.async_show_menu(step_id="init", menu_options=["settings", "rescan", "group"])
+
+    async def async_step_settings(
+        self, user_input: dict | None = None
+    ) -> FlowResult:
+        """Connection pool and delivery settings."""
+        if user_input is not None:
+            return self.async_create_entry(data={**self.config_entry.options, **user_input})
+
+        options = self.config_entry.options
+        return self.async_show_form(
+            step_id="settings",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(
+                        CONF_IDLE_TIMEOUT,
+                        default=options.get(CONF_IDLE_TIMEOUT, DEFAULT_IDLE_TIMEOUT),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=10)),
+                    vol.Required(
+                        CONF_MAX_CONNECTIONS,
+                        default=options.get(CONF_MAX_CONNECTIONS, DEFAULT_MAX_CONNECTIONS),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                    vol.Required(
+                        CONF_RELIABLE_CONTROL,
+                        default=options.get(CONF_RELIABLE_CONTROL, False),
+                    ): bool,
+                }
+            ),
+        )
+
+    async def async_step_group(
+        self, user_input: dict | None = None
+    ) -> FlowResult:
+        """Create, change or remove a group light.
+
+        Saving a group with no members removes it.
+        """
+        options = self.config_entry.options
+        groups = dict(options.get(CONF_GROUPS, {}))
+        if user_input is not None:
+            name = user_input[CONF_NAME].strip()
+            if user_input[CONF_MEMBERS]:
+                groups[name] = list(user_input[CONF_MEMBERS])
+            else:
+                groups.pop(name, None)
+            return self.async_create_entry(data={**options, CONF_GROUPS: groups})
+
+        lights = {
+            dev["did"]: f"{dev.get('dmn') or 'CozyLife'} ({dev['did'][-4:]})"
+            for dev in self.config_entry.data.get(CONF_DEVICES, [])
+            if dev.get(CONF_DEVICE_TYPE_CODE) == LIGHT_TYPE_CODE
+        }
+        return self.async_show_form(
+            step_id="group",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(CONF_NAME): str,
+                    vol.Optional(CONF_MEMBERS, default=[]): cv.multi_select(lights),
+                }
+            ),
+            description_placeholders={"groups": ", ".join(groups) or "-"},
+        )
+
+    async def async_step_rescan(
+        self, user_input: dict | None = None
+    ) -> FlowResult:
+        """Look for new or moved devices in the hub's IP range.
+
+        Addresses already mapped to a known device are skipped while they
+        still answer, so only the unknown part of the range is probed.
+        """
+        entry = self.config_entry
+        if user_input is None:
+            return self.async_show_form(step_id="rescan")
+
+        devices = entry.data.get(CONF_DEVICES, [])
+        known = {dev["ip"]: dev["did"] for dev in devices}
+        found = await self.hass.async_add_executor_job(
+            rescan, entry.data["start_ip"], entry.data["end_ip"], known
+        )
+        # New devices join the running hub; moved ones are re-addressed
+        added, moved = async_add_devices(self.hass, entry, found)
+
+        return self.async_abort(
+            reason="rescan_complete",
+            description_placeholders={"added": str(len(added)), "moved": str(len(moved))},
+        )
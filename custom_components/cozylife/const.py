@@ -9,8 +9,37 @@ CONF_DEVICE_TYPE_CODE = "device_type_code"
 CONF_SUBNET = "subnet"
 CONF_DEVICES = "devices"
 
+# Options
+CONF_IDLE_TIMEOUT = "idle_timeout"
+CONF_MAX_CONNECTIONS = "max_connections"
+CONF_RELIABLE_CONTROL = "reliable_control"
+# Group lights: name -> list of member dids
+CONF_GROUPS = "groups"
+
 PLATFORMS = ["light", "switch"]
 
+# Overall latency budgets (seconds) for one device operation, covering
+# reconnect, rate-limit wait, send and every read
+POLL_BUDGET = 2.0
+SERVICE_BUDGET = 3.0
+# Floor for one transition frame; a frame that cannot go out within its
+# slot (or this floor) is dropped in favour of the next one
+FRAME_BUDGET = 0.5
+# Times a poll that gave way to a command is queued again before it is skipped
+POLL_RESCHEDULES = 3
+# Polls read only the dpids their entity renders; every this many seconds
+# one reads all of them instead
+FULL_SNAPSHOT_INTERVAL = 600.0
+
+# hass.data[DOMAIN] key mapping entity_id -> live CozyLife entity
+ENTITIES_KEY = "entities"
+
+# hass.data[DOMAIN] key holding the persistent DeviceStateCache
+STATE_CACHE_KEY = "state_cache"
+
+# hass.data[DOMAIN] key holding the ConnectionManager shared by all hubs
+CONNECTIONS_KEY = "connections"
+
 PLATFORMS_BY_TYPE = {
     LIGHT_TYPE_CODE: "light",
     SWITCH_TYPE_CODE: "switch",
@@ -26,6 +55,8 @@ SAT = '6'
 
 LIGHT_DPID = [SWITCH, WORK_MODE, TEMP, BRIGHT, HUE, SAT]
 SWITCH_DPID = [SWITCH, ]
+# Dpids only meaningful together, so a poll reads both or neither
+LIGHT_DPID_PAIRS = ((TEMP, BRIGHT), (HUE, SAT))
 
 # Default color temperature bounds (Kelvin)
 DEFAULT_MIN_KELVIN = 2700
@@ -0,0 +1,121 @@
+"""Overall time budgets for device operations.
+
+A ``Deadline`` is created once per operation and handed down through
+reconnect, rate-limit wait, send and every read, so the operation as a
+whole cannot outlive its budget no matter how many socket calls it makes.
+"""
+from __future__ import annotations
+
+import time
+from typing import NamedTuple
+
+# Where an operation was when it ran out of time or failed
+STAGE_CONNECT = 'connect'
+STAGE_PACE = 'pace'
+STAGE_SEND = 'send'
+STAGE_RECV = 'recv'
+STAGE_ACK = 'ack'  # reliable control: every try went unacknowledged
+STAGE_PREEMPTED = 'preempted'  # gave way to more urgent work for the device
+
+# A preemptible operation waits for replies in slices this long, so it
+# notices a preemption while the device is slow to answer
+PREEMPT_CHECK = 0.1
+
+RESULT_OK = 'ok'
+RESULT_TIMEOUT = 'timeout'
+RESULT_FAILED = 'failed'
+
+
+class DeadlineExceeded(TimeoutError):
+    """The overall budget of an operation ran out."""
+
+    def __init__(self, stage: str) -> None:
+        super().__init__(f'deadline exceeded during {stage}')
+        self.stage = stage
+
+
+class Deadline:
+    """Absolute expiry of one operation, on the monotonic clock."""
+
+    __slots__ = ('expires',)
+
+    # Only a PreemptibleDeadline can end early
+    preempted = False
+
+    def __init__(self, budget: float) -> None:
+        self.expires = time.monotonic() + budget
+
+    @classmethod
+    def coerce(cls, deadline: Deadline | float | None, default: float) -> Deadline:
+        """Accept a Deadline, a budget in seconds, or None for ``default``."""
+        if isinstance(deadline, Deadline):
+            return deadline
+        return cls(default if deadline is None else deadline)
+
+    def remaining(self) -> float:
+        return self.expires - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, limit: float, stage: str) -> float:
+        """Socket timeout for the next call: ``limit`` capped by what is left.
+
+        Raises DeadlineExceeded if nothing is left.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(stage)
+        return min(limit, remaining)
+
+
+class PreemptibleDeadline(Deadline):
+    """A deadline that more urgent work for the same device can cut short.
+
+    ``preempt`` leaves nothing remaining, so the operation gives up at its
+    next socket call or rate-limit wait instead of holding the device.
+    Reads are armed for at most PREEMPT_CHECK at a time so a preemption is
+    noticed while waiting for a slow reply too.
+    """
+
+    __slots__ = ('preempted',)
+
+    def __init__(self, budget: float) -> None:
+        super().__init__(budget)
+        self.preempted = False
+
+    def preempt(self) -> None:
+        self.preempted = True
+
+    def remaining(self) -> float:
+        return 0.0 if self.preempted else super().remaining()
+
+    def timeout(self, limit: float, stage: str) -> float:
+        timeout = super().timeout(limit, stage)
+        return min(timeout, PREEMPT_CHECK) if stage == STAGE_RECV else timeout
+
+
+class OpResult(NamedTuple):
+    """Outcome of one device operation.
+
+    Truthy only when the operation succeeded, so ``if client.control(...)``
+    reads naturally.
+    """
+
+    outcome: str
+    data: dict | None = None
+    stage: str | None = None  # where a timeout or failure happened
+    elapsed: float = 0.0
+    attempts: int = 1  # transmissions, for reliable control
+
+    @property
+    def ok(self) -> bool:
+        return self.outcome == RESULT_OK
+
+    @property
+    def timed_out(self) -> bool:
+        return self.outcome == RESULT_TIMEOUT
+
+    def __bool__(self) -> bool:
+        return self.outcome == RESULT_OK
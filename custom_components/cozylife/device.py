@@ -0,0 +1,138 @@
+"""Compact, immutable device records.
+
+Product metadata (type code, model name, dpids, icon) comes from the cloud
+catalog and is identical for every device with the same pid, so it is
+interned: all devices of one product share a single ``Product``.  A
+``DeviceDescriptor`` is then just the did, the address and that shared
+product, so a device costs a few small tuples however large the fleet.
+"""
+from __future__ import annotations
+
+import sys
+from typing import Iterable, NamedTuple
+
+try:
+    from .const import CONF_DEVICE_TYPE_CODE, LIGHT_TYPE_CODE
+except ImportError:
+    from const import CONF_DEVICE_TYPE_CODE, LIGHT_TYPE_CODE
+
+DEFAULT_PID = 'p93sfg'
+DEFAULT_MODEL_NAME = 'CozyLife Device'
+
+
+def _intern(value: str | None) -> str | None:
+    return None if value is None else sys.intern(str(value))
+
+
+class Product(NamedTuple):
+    """Catalog data shared by every device of one product id."""
+
+    pid: str
+    device_type_code: str | None
+    model_name: str | None
+    dpid: tuple[int, ...]
+    icon: str | None = None
+
+
+# pid -> the shared Product
+_PRODUCTS: dict[str, Product] = {}
+
+
+def intern_product(
+    pid: str,
+    device_type_code: str | None,
+    model_name: str | None,
+    dpid: Iterable[int],
+    icon: str | None = None,
+) -> Product:
+    """Return the shared Product for these values.
+
+    A pid seen again with the same values returns the existing instance;
+    different values (a newer catalog, or a hand-written YAML entry) replace
+    it for future lookups without touching devices that hold the old one.
+    """
+    product = Product(
+        _intern(pid),
+        _intern(device_type_code),
+        _intern(model_name),
+        tuple(int(d) for d in dpid),
+        _intern(icon),
+    )
+    existing = _PRODUCTS.get(product.pid)
+    if existing is not None and (existing == product or (icon is None and existing[:4] == product[:4])):
+        # Entry data carries no icon; keep the catalog's
+        return existing
+    _PRODUCTS[product.pid] = product
+    return product
+
+
+def compact_catalog(pid_list: list) -> dict[str, Product]:
+    """Reduce the raw cloud catalog to the fields the integration uses.
+
+    The raw catalog carries every product in several languages along with
+    pairing data; only type code, model name, dpids and icon are kept.
+    """
+    catalog: dict[str, Product] = {}
+    for item in pid_list:
+        device_type_code = item.get('device_type_code')
+        for model in item.get('device_model') or []:
+            pid = model.get('device_product_id')
+            if not pid:
+                continue
+            catalog[pid] = intern_product(
+                pid,
+                device_type_code,
+                model.get('device_model_name'),
+                model.get('dpid') or (),
+                model.get('icon'),
+            )
+    return catalog
+
+
+class DeviceDescriptor(NamedTuple):
+    """Identity and address of one device, plus its shared Product."""
+
+    did: str
+    ip: str
+    product: Product
+
+    @property
+    def pid(self) -> str:
+        return self.product.pid
+
+    @property
+    def dpid(self) -> tuple[int, ...]:
+        return self.product.dpid
+
+    @property
+    def model_name(self) -> str | None:
+        return self.product.model_name
+
+    @property
+    def device_type_code(self) -> str | None:
+        return self.product.device_type_code
+
+    @classmethod
+    def from_dict(cls, dev: dict) -> DeviceDescriptor:
+        """Build from a config entry device dict."""
+        return cls(
+            dev['did'],
+            dev['ip'],
+            intern_product(
+                dev.get('pid', DEFAULT_PID),
+                dev.get(CONF_DEVICE_TYPE_CODE, LIGHT_TYPE_CODE),
+                dev.get('dmn', DEFAULT_MODEL_NAME),
+                dev.get('dpid', [1]),
+            ),
+        )
+
+    def as_dict(self) -> dict:
+        """The config entry form: ip, did, pid, dmn, dpid and type code."""
+        return {
+            'ip': self.ip,
+            'did': self.did,
+            'pid': self.pid,
+            'dmn': self.model_name,
+            'dpid': list(self.dpid),
+            CONF_DEVICE_TYPE_CODE: self.device_type_code,
+        }
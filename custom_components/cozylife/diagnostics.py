@@ -0,0 +1,35 @@
+"""Diagnostics support for CozyLife."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a hub, including each device's command trace."""
+    entry_data = hass.data[DOMAIN].get(entry.entry_id, {})
+    clients = entry_data.get("clients", {})
+    scheduler = entry_data.get("scheduler")
+    recovery = entry_data.get("recovery")
+    return {
+        "data": dict(entry.data),
+        "options": dict(entry.options),
+        "scheduler": scheduler.stats() if scheduler is not None else {},
+        "recovery": recovery.progress() if recovery is not None else {},
+        "devices": {
+            did: {
+                "ip": client._ip,
+                "available": client.available,
+                "connected": client._connect is not None,
+                "rate": client._limiter.rate,
+                "trace": client.trace(),
+            }
+            for did, client in clients.items()
+        },
+    }
@@ -0,0 +1,417 @@
+"""Network discovery of CozyLife devices.
+
+Discovery runs in two phases.  A sweep fires non-blocking connects to the
+device port across the whole range at once and keeps the addresses that
+accept.  Only those responders then get the CMD_INFO handshake and catalog
+lookup, concurrently, so scan time tracks the number of devices rather than
+the size of the range.
+
+Kept free of Home Assistant imports so it can also be used from the
+command line.
+"""
+from __future__ import annotations
+
+import errno
+import logging
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ipaddress import IPv4Address, IPv4Network
+from typing import Iterable
+
+try:
+    from .const import SUPPORT_DEVICE_CATEGORY
+    from .tcp_client import tcp_client
+    from .utils import get_catalog
+except ImportError:
+    from const import SUPPORT_DEVICE_CATEGORY
+    from tcp_client import tcp_client
+    from utils import get_catalog
+
+_LOGGER = logging.getLogger(__name__)
+
+PROBE_TIMEOUT = 0.5
+# Whole CMD_INFO handshake (connect, send, reply) of one probe
+PROBE_BUDGET = 1.0
+SCAN_WORKERS = 32
+
+# Phase 1: how long to wait for connects, and how many sockets may be in
+# flight at once (kept well below the usual 1024 file-descriptor limit)
+SWEEP_TIMEOUT = 1.0
+SWEEP_BATCH = 512
+
+_CONNECT_PENDING = {0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY}
+
+# Largest range a single hub may scan (a /16)
+MAX_RANGE_SIZE = 65536
+
+ARP_CACHE_PATH = '/proc/net/arp'
+# /proc/net/arp flag for a completed (resolved) entry
+_ATF_COM = 0x2
+
+
+class InvalidRange(ValueError):
+    """The addresses are valid but do not form a usable scan range."""
+
+
+class RangeTooLarge(InvalidRange):
+    """The scan range is larger than MAX_RANGE_SIZE."""
+
+
+class ScanProgress:
+    """Live counts of a running scan, for a caller in another thread.
+
+    The scan updates the counts as batches are swept and devices answer.
+    ``stop`` ends it early: no further batch is swept and no further
+    responder is identified, and the scan returns what it found so far.
+    Setting ``expected`` stops it by itself once that many devices are
+    found.
+    """
+
+    def __init__(self, total: int, expected: int | None = None) -> None:
+        self.total = total
+        self.expected = expected
+        self.probed = 0
+        self.responders = 0
+        self.identified = 0
+        self._found: list[dict] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def found(self) -> list[dict]:
+        with self._lock:
+            return list(self._found)
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    @property
+    def fraction(self) -> float:
+        """Share of the work done; the sweep counts for most of it."""
+        if self.stopped:
+            return 1.0
+        swept = self.probed / self.total if self.total else 1.0
+        identified = self.identified / self.responders if self.responders else 1.0
+        return min(1.0, 0.8 * swept + 0.2 * identified * swept)
+
+    def _swept(self, count: int, responders: int) -> None:
+        self.probed += count
+        self.responders += responders
+
+    def _identified(self, device: dict | None) -> None:
+        with self._lock:
+            self.identified += 1
+            if device is not None:
+                self._found.append(device)
+                if self.expected and len(self._found) >= self.expected:
+                    self._stop.set()
+
+
+def parse_range(start: str, end: str | None = None) -> tuple[str, str]:
+    """Normalise user input into a (start_ip, end_ip) pair.
+
+    ``start`` may be a CIDR such as ``10.0.0.0/22``, in which case ``end`` is
+    ignored and the network's host range is used.
+
+    :raises InvalidRange: on a missing end, reversed or oversized range
+    :raises ValueError: on malformed addresses
+    """
+    if '/' in start:
+        network = IPv4Network(start, strict=False)
+        if network.num_addresses > 2:
+            first, last = network[1], network[-2]
+        else:
+            first, last = network[0], network[-1]
+    else:
+        if not end:
+            raise InvalidRange('end address is required without a CIDR')
+        first, last = IPv4Address(start), IPv4Address(end)
+    if int(first) > int(last):
+        raise InvalidRange('end address is before start address')
+    if int(last) - int(first) + 1 > MAX_RANGE_SIZE:
+        raise RangeTooLarge('range is larger than a /16')
+    return str(first), str(last)
+
+
+def covering_network(start_ip: str, end_ip: str) -> IPv4Network:
+    """Return the smallest network that contains both addresses."""
+    start_int = int(IPv4Address(start_ip))
+    end_int = int(IPv4Address(end_ip))
+    prefix = 32 - (start_int ^ end_int).bit_length()
+    return IPv4Network((start_int, prefix), strict=False)
+
+
+def hub_subnet(start_ip: str, end_ip: str) -> str:
+    """Return the hub key for a range.
+
+    Ranges inside one /24 keep the historical ``a.b.c`` key so existing
+    hubs stay unique; anything wider is keyed by its covering CIDR.
+    """
+    network = covering_network(start_ip, end_ip)
+    if network.prefixlen >= 24:
+        return start_ip.rsplit('.', 1)[0]
+    return str(network)
+
+
+def hub_title(subnet: str) -> str:
+    """Return the config entry title for a hub key from hub_subnet."""
+    if '/' in subnet:
+        return f'CozyLife Hub ({subnet})'
+    return f'CozyLife Hub ({subnet}.0/24)'
+
+
+def hub_ranges(devices: list[dict]) -> list[tuple[str, str, str, list[dict]]]:
+    """Group devices without a hub into hub ranges, keyed like the user flow.
+
+    Devices within one /16 (the largest range a hub scans) share a hub over
+    the smallest network around them.  Anything inside a single /24 keeps
+    the historical ``a.b.c.1``-``a.b.c.254`` range.  Returns
+    ``(hub key, start_ip, end_ip, devices)`` per hub.
+    """
+    by_block: dict[str, list[dict]] = {}
+    for dev in devices:
+        block = str(IPv4Network(f"{dev['ip']}/16", strict=False))
+        by_block.setdefault(block, []).append(dev)
+    hubs = []
+    for block_devices in by_block.values():
+        ips = sorted((dev['ip'] for dev in block_devices), key=lambda ip: int(IPv4Address(ip)))
+        network = covering_network(ips[0], ips[-1])
+        if network.prefixlen >= 24:
+            network = IPv4Network(f'{ips[0]}/24', strict=False)
+        start_ip, end_ip = str(network[1]), str(network[-2])
+        hubs.append((hub_subnet(start_ip, end_ip), start_ip, end_ip, block_devices))
+    return hubs
+
+
+def in_range(ip: str, start_ip: str, end_ip: str) -> bool:
+    """Return True if ip lies within start_ip..end_ip."""
+    return int(IPv4Address(start_ip)) <= int(IPv4Address(ip)) <= int(IPv4Address(end_ip))
+
+
+def ip_range(start_ip: str, end_ip: str) -> list[str]:
+    """Return every address from start_ip to end_ip inclusive."""
+    start_int = int(IPv4Address(start_ip))
+    end_int = int(IPv4Address(end_ip))
+    return [str(IPv4Address(ip_int)) for ip_int in range(start_int, end_int + 1)]
+
+
+def read_arp_cache(path: str = ARP_CACHE_PATH) -> set[str]:
+    """Return addresses the kernel currently has a resolved neighbour entry for.
+
+    Returns an empty set where the ARP table is not readable (non-Linux,
+    containers without /proc/net).
+    """
+    live: set[str] = set()
+    try:
+        with open(path, encoding='ascii') as arp:
+            next(arp, None)  # header
+            for line in arp:
+                fields = line.split()
+                if len(fields) >= 3 and int(fields[2], 16) & _ATF_COM:
+                    live.add(fields[0])
+    except (OSError, ValueError):
+        _LOGGER.debug('ARP cache %s not readable', path)
+    return live
+
+
+def prioritize(ips: list[str], live: set[str]) -> list[str]:
+    """Order addresses so those known to be live are probed first."""
+    return [ip for ip in ips if ip in live] + [ip for ip in ips if ip not in live]
+
+
+def sweep(
+    ips: list[str],
+    port: int = tcp_client._port,
+    timeout: float = SWEEP_TIMEOUT,
+    batch: int = SWEEP_BATCH,
+    progress: ScanProgress | None = None,
+) -> list[str]:
+    """Phase 1: return the addresses that accept a TCP connection on port.
+
+    Connects are started non-blocking for a whole batch at once and
+    collected with a selector, so a batch costs at most ``timeout`` no
+    matter how many addresses are dead.  ``progress`` is updated after
+    each batch and can stop the sweep between batches.
+    """
+    responders: list[str] = []
+    for i in range(0, len(ips), batch):
+        if progress is not None and progress.stopped:
+            break
+        before = len(responders)
+        with selectors.DefaultSelector() as selector:
+            for ip in ips[i:i + batch]:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                try:
+                    err = sock.connect_ex((ip, port))
+                except OSError:
+                    err = -1
+                if err in _CONNECT_PENDING:
+                    selector.register(sock, selectors.EVENT_WRITE, ip)
+                else:
+                    sock.close()
+
+            deadline = time.monotonic() + timeout
+            while selector.get_map():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                for key, _ in selector.select(remaining):
+                    sock = key.fileobj
+                    selector.unregister(sock)
+                    if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                        responders.append(key.data)
+                    sock.close()
+
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+        if progress is not None:
+            progress._swept(len(ips[i:i + batch]), len(responders) - before)
+    return responders
+
+
+def probe_device(
+    ip: str,
+    timeout: float = PROBE_TIMEOUT,
+    port: int = tcp_client._port,
+    budget: float = PROBE_BUDGET,
+) -> dict | None:
+    """Probe a single device at the given IP within ``budget`` seconds."""
+    client = tcp_client(ip, timeout=timeout)
+    client._port = port
+    try:
+        client._device_info(budget)
+        if client.descriptor is None:
+            return None
+        if client.device_type_code not in SUPPORT_DEVICE_CATEGORY:
+            return None
+        return client.descriptor.as_dict()
+    except Exception:
+        _LOGGER.exception("Error probing device at %s", ip)
+        return None
+    finally:
+        client.disconnect()
+
+
+def _probe_into(
+    results: dict[str, dict],
+    ip: str,
+    port: int,
+    progress: ScanProgress | None,
+) -> None:
+    """Probe one responder into ``results``, reporting it to ``progress``."""
+    if progress is not None and progress.stopped:
+        return
+    device = probe_device(ip, port=port)
+    if device is not None:
+        results[ip] = device
+    if progress is not None:
+        progress._identified(device)
+
+
+def identify(
+    ips: list[str],
+    workers: int = SCAN_WORKERS,
+    port: int = tcp_client._port,
+    progress: ScanProgress | None = None,
+) -> list[dict]:
+    """Phase 2: run the CMD_INFO handshake concurrently on responders.
+
+    Devices are reported to ``progress`` as they answer; once it is
+    stopped, responders not probed yet are skipped.
+    """
+    if not ips:
+        return []
+    # Load the product catalog once, before the workers need it
+    get_catalog()
+    results: dict[str, dict] = {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(ips))) as pool:
+        for ip in ips:
+            pool.submit(_probe_into, results, ip, port, progress)
+    return [results[ip] for ip in ips if ip in results]
+
+
+def scan_ips(
+    ips: Iterable[str],
+    workers: int = SCAN_WORKERS,
+    port: int = tcp_client._port,
+    progress: ScanProgress | None = None,
+) -> list[dict]:
+    """Discover the CozyLife devices among the given addresses.
+
+    Addresses in the kernel ARP cache are swept first, so live hosts are
+    found before dead space is covered.  The responders of each sweep
+    batch are identified while the next batch is swept, so devices turn
+    up as the scan goes.  Pass a ``progress`` to follow the scan from
+    another thread or end it early.
+    """
+    ordered = prioritize(list(ips), read_arp_cache())
+    responders: list[str] = []
+    results: dict[str, dict] = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i in range(0, len(ordered), SWEEP_BATCH):
+            if progress is not None and progress.stopped:
+                break
+            batch = sweep(ordered[i:i + SWEEP_BATCH], port=port, progress=progress)
+            if batch and not responders:
+                # Load the product catalog once, before the workers need it
+                get_catalog()
+            responders.extend(batch)
+            for ip in batch:
+                pool.submit(_probe_into, results, ip, port, progress)
+    _LOGGER.debug("Sweep found %d hosts listening", len(responders))
+    return [results[ip] for ip in responders if ip in results]
+
+
+def rescan(
+    start_ip: str,
+    end_ip: str,
+    known: dict[str, str],
+    workers: int = SCAN_WORKERS,
+) -> list[dict]:
+    """Discover devices that are not already known at their address.
+
+    ``known`` maps ip -> did for the devices already configured.  Known
+    addresses that still accept connections are skipped; only responders
+    at unknown addresses get the info handshake.  A known device that moved
+    answers at an unknown address and is picked up there.
+    """
+    ips = ip_range(start_ip, end_ip)
+    responders = sweep(prioritize(ips, read_arp_cache()))
+    candidates = [ip for ip in responders if ip not in known]
+    _LOGGER.debug(
+        "Rescan of %s-%s: %d hosts listening, identifying %d",
+        start_ip, end_ip, len(responders), len(candidates),
+    )
+    return identify(candidates, workers)
+
+
+def merge_devices(
+    existing: list[dict], found: list[dict]
+) -> tuple[list[dict], list[dict], list[dict]]:
+    """Merge newly found devices into a hub's device list.
+
+    Returns ``(merged, added, moved)`` where ``moved`` are known devices
+    found at a new address.  Devices that were not found are kept as is.
+    """
+    merged = [dict(dev) for dev in existing]
+    by_did = {dev["did"]: dev for dev in merged}
+    added: list[dict] = []
+    moved: list[dict] = []
+    for dev in found:
+        current = by_did.get(dev["did"])
+        if current is None:
+            merged.append(dev)
+            by_did[dev["did"]] = dev
+            added.append(dev)
+        elif current["ip"] != dev["ip"]:
+            current["ip"] = dev["ip"]
+            moved.append(current)
+    return merged, added, moved
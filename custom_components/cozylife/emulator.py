@@ -0,0 +1,131 @@
+"""Emulated CozyLife device speaking the port 5555 JSON protocol.
+
+Used by the command-line tool to benchmark without real bulbs and by the
+test suite as a loopback device.
+"""
+from __future__ import annotations
+
+import json
+import random
+import socketserver
+import threading
+import time
+
+DEFAULT_STATE = {'1': 0, '2': 0, '3': 1000, '4': 1000, '5': 65535, '6': 65535}
+
+
+class EmulatedDevice:
+    """A fake bulb listening on a local TCP port.
+
+    ``latency`` delays every reply, ``loss`` drops that fraction of requests
+    without answering and ``push`` sends the cmd 10 state report real
+    firmware emits after each control command.  Setting ``drop`` to N drops
+    the next N requests, for deterministic loss.
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        did: str | None = None,
+        pid: str = 'p93sfg',
+        state: dict | None = None,
+        latency: float = 0.0,
+        loss: float = 0.0,
+        push: bool = True,
+    ) -> None:
+        self.did = did or f'{random.getrandbits(80):020x}'
+        self.pid = pid
+        self.state = dict(DEFAULT_STATE if state is None else state)
+        self.latency = latency
+        self.loss = loss
+        self.push = push
+        self.drop = 0
+        self.requests: list[dict] = []
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer((host, port), self._handler(), bind_and_activate=False)
+        self._server.allow_reuse_address = True
+        self._server.daemon_threads = True
+        self._server.server_bind()
+        self._server.server_activate()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def start(self) -> EmulatedDevice:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> EmulatedDevice:
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def reply(self, request: dict) -> list[dict]:
+        """Return the messages the device sends in answer to one request."""
+        cmd = request.get('cmd')
+        sn = request.get('sn')
+        msg = request.get('msg') or {}
+        if cmd == 0:
+            ip = self.address[0]
+            return [{'cmd': 0, 'pv': 0, 'sn': sn, 'res': 0, 'msg': {
+                'did': self.did, 'dtp': '02', 'pid': self.pid, 'mac': self.did[-12:],
+                'ip': ip, 'rssi': -40, 'sv': '1.0.0', 'hv': '0.0.1'}}]
+        if cmd == 2:
+            with self._lock:
+                attrs = msg.get('attr') or [0]
+                keys = list(self.state) if 0 in attrs else [str(a) for a in attrs if str(a) in self.state]
+                data = {k: self.state[k] for k in keys}
+            return [{'cmd': 2, 'pv': 0, 'sn': sn, 'res': 0,
+                     'msg': {'attr': [int(k) for k in keys], 'data': data}}]
+        if cmd == 3:
+            data = msg.get('data') or {}
+            with self._lock:
+                self.state.update({str(k): v for k, v in data.items()})
+                snapshot = dict(self.state)
+            replies = [{'cmd': 3, 'pv': 0, 'sn': sn, 'res': 0, 'msg': msg}]
+            if self.push:
+                replies.append({'cmd': 10, 'pv': 0, 'sn': str(int(time.time() * 1000)), 'res': 0,
+                                'msg': {'attr': [int(k) for k in snapshot], 'data': snapshot}})
+            return replies
+        return []
+
+    def _handler(self):
+        device = self
+
+        class _Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                try:
+                    self._serve()
+                except OSError:
+                    # Client hung up; real firmware just drops the reply too
+                    return
+
+            def _serve(self) -> None:
+                for line in self.rfile:
+                    try:
+                        request = json.loads(line)
+                    except ValueError:
+                        continue
+                    with device._lock:
+                        device.requests.append(request)
+                        dropped = device.drop > 0
+                        if dropped:
+                            device.drop -= 1
+                    if dropped or (device.loss and random.random() < device.loss):
+                        continue
+                    if device.latency:
+                        time.sleep(device.latency)
+                    for message in device.reply(request):
+                        self.wfile.write(json.dumps(message, separators=(',', ':')).encode() + b'\r\n')
+                        self.wfile.flush()
+
+        return _Handler
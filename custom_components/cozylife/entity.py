@@ -0,0 +1,209 @@
+"""Device I/O and state handling shared by the CozyLife entity platforms."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any
+
+from homeassistant.helpers.entity import DeviceInfo
+
+from .cmdtrace import CALLER_POLL, CALLER_SERVICE
+from .const import (
+    DOMAIN,
+    ENTITIES_KEY,
+    FULL_SNAPSHOT_INTERVAL,
+    LIGHT_DPID_PAIRS,
+    POLL_BUDGET,
+    POLL_RESCHEDULES,
+    SERVICE_BUDGET,
+    STATE_CACHE_KEY,
+    SWITCH_DPID,
+)
+from .deadline import STAGE_PREEMPTED, PreemptibleDeadline
+from .scheduler import PRIORITY_INTERACTIVE, PRIORITY_POLL
+from .tcp_client import tcp_client
+
+_LOGGER = logging.getLogger(__name__)
+
+# Least urgent priority for the current task's device I/O; background
+# effect updates raise it so their frames yield to user commands
+BACKGROUND_PRIORITY: ContextVar[int] = ContextVar(
+    f"{DOMAIN}_background_priority", default=PRIORITY_INTERACTIVE)
+
+
+class CozyLifeDeviceMixin:
+    """On/off device entity backed by one tcp_client.
+
+    Listed before the platform's entity class.  Runs the device I/O on the
+    hub's scheduler, polls the device and keeps the state cache current;
+    subclasses extend ``_apply_state`` and ``scene_payload`` for the dpids
+    they render.
+    """
+
+    _tcp_client = None
+    _attr_is_on = True
+    # Dpids a poll reads; everything else comes with the full snapshots
+    _poll_dpids = SWITCH_DPID
+    _full_snapshot_at = 0.0
+
+    def __init__(self, tcp_client: tcp_client, hass) -> None:
+        """Initialize."""
+        self.hass = hass
+        self._tcp_client = tcp_client
+        # last query result; stays None while every poll gives way
+        self._state = None
+        self._unique_id = tcp_client.device_id
+        self._name = tcp_client.device_id[-4:]
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        """Return device info for device registry."""
+        return DeviceInfo(
+            identifiers={(DOMAIN, self._unique_id)},
+            name=self._tcp_client.device_model_name,
+            manufacturer="CozyLife",
+            model=self._tcp_client.pid,
+        )
+
+    @property
+    def unique_id(self) -> str | None:
+        """Return a unique ID."""
+        return self._unique_id
+
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        self.hass.data[DOMAIN].setdefault(ENTITIES_KEY, {})[self.entity_id] = self
+        # Publish the cached state now and reconcile with the device later
+        cached = self._state_cache.get_state(self._unique_id)
+        if cached:
+            self._apply_state(cached)
+        if cached and self._tcp_client._handed_over:
+            # Taken over from before a reload; the next poll is soon enough
+            self._tcp_client._handed_over = False
+        else:
+            self.hass.async_create_task(self._async_reconcile())
+
+    async def async_will_remove_from_hass(self):
+        self.hass.data[DOMAIN].get(ENTITIES_KEY, {}).pop(self.entity_id, None)
+        await super().async_will_remove_from_hass()
+
+    async def async_update(self):
+        await self._async_refresh_state()
+
+    @property
+    def _state_cache(self):
+        return self.hass.data[DOMAIN][STATE_CACHE_KEY]
+
+    async def _async_refresh_state(self):
+        """Query the device and remember the result in the state cache.
+
+        Polls give way to commands for the device and are queued again
+        behind them.
+        """
+        attrs = self._poll_attrs()
+        for _ in range(POLL_RESCHEDULES + 1):
+            deadline = PreemptibleDeadline(POLL_BUDGET)
+            result = await self._async_io(
+                self._refresh_state, deadline, attrs,
+                priority=PRIORITY_POLL, preempt=deadline.preempt)
+            if result.stage != STAGE_PREEMPTED:
+                break
+        if result and attrs is None:
+            self._full_snapshot_at = time.monotonic() + FULL_SNAPSHOT_INTERVAL
+        if self._state:
+            self._state_cache.async_update_state(self._unique_id, self._state)
+
+    def _poll_attrs(self):
+        """Dpids the next poll reads, or None for a full snapshot.
+
+        Polls read only the dpids this entity renders; a full snapshot every
+        FULL_SNAPSHOT_INTERVAL keeps the rest of the state cache fresh.
+        """
+        if time.monotonic() >= self._full_snapshot_at:
+            return None
+        known = self._tcp_client.dpid
+        keep = {dpid for dpid in self._poll_dpids if not known or int(dpid) in known}
+        for pair in LIGHT_DPID_PAIRS:
+            if keep.intersection(pair):
+                keep.update(pair)
+        return [dpid for dpid in self._poll_dpids if dpid in keep] or None
+
+    async def _async_reconcile(self):
+        await self._async_refresh_state()
+        if self.hass is not None:
+            self.async_write_ha_state()
+
+    def _refresh_state(self, deadline=POLL_BUDGET, attrs=None):
+        result = self._tcp_client.query_result(CALLER_POLL, deadline, attrs)
+        if result.stage == STAGE_PREEMPTED:
+            return result
+        if result.timed_out:
+            _LOGGER.debug('Poll of %s timed out during %s after %.2fs',
+                          self._unique_id, result.stage, result.elapsed)
+        self._state = result.data
+        if self._state:
+            self._apply_state(self._state)
+        return result
+
+    async def _async_io(self, func, *args, priority=PRIORITY_INTERACTIVE, preempt=None):
+        """Run blocking device I/O on the hub's per-device scheduler."""
+        scheduler = self._tcp_client._scheduler
+        if scheduler is None:
+            return await self.hass.async_add_executor_job(func, *args)
+        priority = max(priority, BACKGROUND_PRIORITY.get())
+        return await asyncio.wrap_future(scheduler.submit(
+            self._tcp_client.device_id, func, *args, priority=priority, preempt=preempt))
+
+    async def _async_control(self, payload: dict) -> bool:
+        """Send a service command, falling back to the device's state if it fails."""
+        result = await self._async_io(
+            self._tcp_client.control, payload, CALLER_SERVICE, SERVICE_BUDGET)
+        if not result:
+            _LOGGER.warning('%s did not take the command (%s during %s, %d tries)',
+                            self._unique_id, result.outcome, result.stage, result.attempts)
+            self.hass.async_create_task(self._async_reconcile())
+        else:
+            # Keep the cache current, so a reload publishes what was last set
+            self._state_cache.async_update_state(self._unique_id, payload)
+        return bool(result)
+
+    def _apply_state(self, state: dict):
+        if '1' in state:
+            self._attr_is_on = 0 < state['1']
+
+    def scene_payload(self, target: dict) -> dict:
+        """Return the control payload for a scene target, applied optimistically."""
+        self._attr_is_on = target.get('state', 'on') == 'on'
+        return {'1': 1 if self._attr_is_on else 0}
+
+    @property
+    def name(self) -> str:
+        return 'cozylife:' + self._name
+
+    @property
+    def available(self) -> bool:
+        """Return if the device is available."""
+        return self._tcp_client.available
+
+    @property
+    def is_on(self) -> bool:
+        """Return True if entity is on."""
+        return self._attr_is_on
+
+    async def async_turn_on(self, **kwargs: Any) -> None:
+        """Turn the entity on."""
+        self._attr_is_on = True
+
+        await self._async_control({'1': 1})
+
+        return None
+
+    async def async_turn_off(self, **kwargs: Any) -> None:
+        """Turn the entity off."""
+        self._attr_is_on = False
+
+        await self._async_control({'1': 0})
+
+        return None
@@ -17,13 +17,15 @@ from homeassistant.components.light import (
     ColorMode,
     LightEntityFeature,
     LightEntity,
+    filter_supported_color_modes,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_EFFECT
-from homeassistant.core import HomeAssistant, ServiceCall
-from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.const import ATTR_ENTITY_ID, CONF_EFFECT
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+from homeassistant.exceptions import ServiceValidationError
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers import entity_platform
+from homeassistant.helpers import entity_platform, entity_registry as er
+from homeassistant.helpers.event import async_track_state_change_event
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 from typing import Any
 from .const import (
@@ -31,6 +33,8 @@ from .const import (
     SWITCH_TYPE_CODE,
     LIGHT_TYPE_CODE,
     CONF_DEVICE_TYPE_CODE,
+    CONF_DEVICES,
+    CONF_GROUPS,
     LIGHT_DPID,
     SWITCH,
     WORK_MODE,
@@ -40,6 +44,37 @@ from .const import (
     SAT,
     DEFAULT_MIN_KELVIN,
     DEFAULT_MAX_KELVIN,
+    ENTITIES_KEY,
+    FRAME_BUDGET,
+)
+
+from .lightmath import (
+    BRIGHTNESS_STEP,
+    HUE_STEP,
+    SAT_STEP,
+    TEMP_STEP,
+    brightness_to_device,
+    device_to_brightness,
+    device_to_kelvin,
+    frame_payload,
+    frame_plan,
+    hs_to_device,
+    kelvin_to_device,
+    payload_steps,
+    step_count,
+)
+from .cmdtrace import CALLER_TRANSITION
+from .scene import PREPARE_TIMEOUT, apply_payloads
+from .entity import BACKGROUND_PRIORITY, CozyLifeDeviceMixin
+from .scheduler import PRIORITY_EFFECT, PRIORITY_TRANSITION
+from .program import (
+    CHRISMAS_STEPS,
+    DEFAULT_MODE,
+    DEFAULT_SPEED,
+    MAX_SPEED,
+    MAX_STEPS,
+    ProgramStep,
+    program_payload,
 )
 
 import asyncio
@@ -63,7 +98,6 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
 
 
 SCAN_INTERVAL = timedelta(seconds=60)
-MIN_INTERVAL=0.2
 
 CIRCADIAN_BRIGHTNESS = True
 try:
@@ -80,6 +114,28 @@ SERVICE_SCHEMA_SET_EFFECT = {
 vol.Required(CONF_EFFECT): vol.In([mode.lower() for mode in scenes])
 }
 
+SERVICE_SET_PROGRAM = "set_program"
+PROGRAM_STEP_SCHEMA = vol.Schema({
+    vol.Required(ATTR_HS_COLOR): vol.All(
+        vol.Coerce(tuple),
+        vol.ExactSequence((
+            vol.All(vol.Coerce(float), vol.Range(min=0, max=360)),
+            vol.All(vol.Coerce(float), vol.Range(min=0, max=100)),
+        )),
+    ),
+    vol.Optional(ATTR_BRIGHTNESS): vol.All(vol.Coerce(int), vol.Range(min=0, max=255)),
+})
+SERVICE_SCHEMA_SET_PROGRAM = {
+    vol.Required('steps'): vol.All(
+        cv.ensure_list, vol.Length(min=1, max=MAX_STEPS), [PROGRAM_STEP_SCHEMA]),
+    vol.Optional('speed', default=DEFAULT_SPEED):
+        vol.All(vol.Coerce(int), vol.Range(min=0, max=MAX_SPEED)),
+    vol.Optional('mode', default=DEFAULT_MODE):
+        vol.All(vol.Coerce(int), vol.Range(min=0, max=255)),
+    vol.Optional(ATTR_BRIGHTNESS, default=255):
+        vol.All(vol.Coerce(int), vol.Range(min=0, max=255)),
+}
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -88,36 +144,50 @@ async def async_setup_entry(
 ) -> None:
     """Set up CozyLife lights from a hub config entry."""
     entry_data = hass.data[DOMAIN][entry.entry_id]
-    clients = entry_data["clients"]
-    devices = entry_data["devices"]
-
-    entities = []
-    for dev in devices:
-        device_type = dev.get(CONF_DEVICE_TYPE_CODE, LIGHT_TYPE_CODE)
-        if device_type != LIGHT_TYPE_CODE:
-            continue
-        client = clients.get(dev["did"])
-        if client is None:
-            continue
-        if 'switch' not in dev.get("dmn", "").lower():
-            entity = CozyLifeLight(client, hass, scenes)
-        else:
-            entity = CozyLifeSwitchAsLight(client, hass)
-        entities.append(entity)
-
-    if entities:
-        async_add_entities(entities)
 
-    # Register light entities for set_all_effect service
-    hass.data[DOMAIN].setdefault("light_entities", [])
-    for entity in entities:
-        if isinstance(entity, CozyLifeLight):
-            hass.data[DOMAIN]["light_entities"].append(entity)
-
-    # Register entity-level set_effect service (idempotent per platform)
+    @callback
+    def _async_add_clients(clients) -> None:
+        entities = []
+        for client in clients:
+            if client.device_type_code != LIGHT_TYPE_CODE:
+                continue
+            if 'switch' not in (client.device_model_name or "").lower():
+                entity = CozyLifeLight(client, hass, scenes)
+            else:
+                entity = CozyLifeSwitchAsLight(client, hass)
+            entities.append(entity)
+
+        if entities:
+            async_add_entities(entities)
+
+        # Register light entities for set_all_effect service
+        hass.data[DOMAIN].setdefault("light_entities", [])
+        for entity in entities:
+            if isinstance(entity, CozyLifeLight):
+                hass.data[DOMAIN]["light_entities"].append(entity)
+
+    _async_add_clients(list(entry_data["clients"].values()))
+    # Devices added to the running hub later come through here
+    entry_data["adders"].append(_async_add_clients)
+
+    groups = [
+        CozyLifeGroupLight(hass, entry, name, dids)
+        for name, dids in entry.options.get(CONF_GROUPS, {}).items()
+    ]
+    if groups:
+        async_add_entities(groups)
+
+    # Register entity-level set_effect service (idempotent per platform).
+    # Only CozyLifeLight implements these; switches shown as lights and
+    # group lights lack the EFFECT feature and are refused by Home Assistant
     platform = entity_platform.async_get_current_platform()
     platform.async_register_entity_service(
-        SERVICE_SET_EFFECT, SERVICE_SCHEMA_SET_EFFECT, "async_set_effect"
+        SERVICE_SET_EFFECT, SERVICE_SCHEMA_SET_EFFECT, "async_set_effect",
+        required_features=[LightEntityFeature.EFFECT],
+    )
+    platform.async_register_entity_service(
+        SERVICE_SET_PROGRAM, SERVICE_SCHEMA_SET_PROGRAM, "async_set_program",
+        required_features=[LightEntityFeature.EFFECT],
     )
 
 
@@ -132,107 +202,45 @@ async def async_setup_platform(
         "Configuration of CozyLife lights via YAML is deprecated. "
         "Your YAML config has been imported. Please remove it."
     )
+    devices = []
     for item in config.get('lights', []):
         # Determine device type: switches exposed as lights get type "01" (light platform)
         device_type = LIGHT_TYPE_CODE
         if 'switch' in item.get('dmn', '').lower():
             device_type = LIGHT_TYPE_CODE  # stays on light platform even if switch-like
 
-        import_data = {
+        devices.append({
             "ip": item["ip"],
             "did": item["did"],
             "pid": item.get("pid", "p93sfg"),
             "dmn": item.get("dmn", "Smart Bulb Light"),
             "dpid": item.get("dpid", [1, 2, 3, 4, 5, 7, 8, 9, 13, 14]),
             CONF_DEVICE_TYPE_CODE: device_type,
-        }
+        })
+    if devices:
+        # One flow for the whole list, so the hub entry is written once
         hass.async_create_task(
             hass.config_entries.flow.async_init(
                 DOMAIN,
                 context={"source": "import"},
-                data=import_data,
+                data={CONF_DEVICES: devices},
             )
         )
 
 
-class CozyLifeSwitchAsLight(LightEntity):
+class CozyLifeSwitchAsLight(CozyLifeDeviceMixin, LightEntity):
 
-    _tcp_client = None
-    _attr_is_on = True
     _attr_color_mode = ColorMode.ONOFF
     _unrecorded_attributes = frozenset({"brightness","color_temp_kelvin"})
 
     def __init__(self, tcp_client: tcp_client, hass) -> None:
         """Initialize."""
-        self.hass = hass
-        self._tcp_client = tcp_client
-        self._unique_id = tcp_client.device_id
-        self._name = tcp_client.device_id[-4:]
+        super().__init__(tcp_client, hass)
         self._attr_supported_color_modes = {ColorMode.ONOFF}
 
-    @property
-    def device_info(self) -> DeviceInfo:
-        """Return device info for device registry."""
-        return DeviceInfo(
-            identifiers={(DOMAIN, self._unique_id)},
-            name=self._tcp_client._device_model_name,
-            manufacturer="CozyLife",
-            model=self._tcp_client._pid,
-        )
-
-    @property
-    def unique_id(self) -> str | None:
-        """Return a unique ID."""
-        return self._unique_id
-
-    async def async_added_to_hass(self):
-        await super().async_added_to_hass()
-        await self.hass.async_add_executor_job(self._refresh_state)
-
-    async def async_update(self):
-        await self.hass.async_add_executor_job(self._refresh_state)
-
-    def _refresh_state(self):
-        self._state = self._tcp_client.query()
-        if self._state:
-            self._attr_is_on = 0 < self._state['1']
-
-    @property
-    def name(self) -> str:
-        return 'cozylife:' + self._name
-
-    @property
-    def available(self) -> bool:
-        """Return if the device is available."""
-        if self._tcp_client._connect:
-            return True
-        else:
-            return False
-
-    @property
-    def is_on(self) -> bool:
-        """Return True if entity is on."""
-        return self._attr_is_on
-
-    async def async_turn_on(self, **kwargs: Any) -> None:
-        """Turn the entity on."""
-        self._attr_is_on = True
-
-        await self.hass.async_add_executor_job(self._tcp_client.control, {
-            '1': 1
-        })
-
-        return None
-
-    async def async_turn_off(self, **kwargs: Any) -> None:
-        """Turn the entity off."""
-        self._attr_is_on = False
-
-        await self.hass.async_add_executor_job(self._tcp_client.control, {
-            '1': 0
-        })
-
-        return None
+    def device_values(self) -> dict:
+        """Current state in device units, where a transition would start."""
+        return {}
 
 
 class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
@@ -245,26 +253,23 @@ class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
     _tcp_client = None
 
     _attr_color_mode = ColorMode.BRIGHTNESS
+    _poll_dpids = LIGHT_DPID
 
     def __init__(self, tcp_client: tcp_client, hass, scenes) -> None:
         """Initialize."""
-        self.hass = hass
-        self._tcp_client = tcp_client
-        self._unique_id = tcp_client.device_id
+        super().__init__(tcp_client, hass)
         self._scenes = scenes
         self._effect = 'manual'
 
         self._cl = None
         self._max_brightness = 255
         self._min_brightness = 1
-        self._name = tcp_client.device_id[-4:]
         # Report kelvin bounds to Home Assistant (min = warmest, max = coldest)
         self._attr_min_color_temp_kelvin = DEFAULT_MIN_KELVIN
         self._attr_max_color_temp_kelvin = DEFAULT_MAX_KELVIN
 
         # Device protocol uses 0-1000 scale mapping linearly to kelvin
-        # 0 = warmest (min_kelvin), 1000 = coldest (max_kelvin)
-        self._kelvin_ratio = (self._attr_max_color_temp_kelvin - self._attr_min_color_temp_kelvin) / 1000
+        # 0 = warmest (min_kelvin), 1000 = coldest (max_kelvin), see lightmath
         self._attr_color_temp_kelvin = self._attr_max_color_temp_kelvin
         self._attr_hs_color = (0, 0)
         self._transitioning = 0
@@ -274,7 +279,7 @@ class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
         # Per-instance copy to avoid mutating class-level set
         self._attr_supported_color_modes = set()
 
-        if not 'switch' in self._tcp_client._device_model_name.lower():
+        if not 'switch' in (self._tcp_client.device_model_name or '').lower():
 
             if 3 in tcp_client.dpid:
                 self._attr_color_mode = ColorMode.COLOR_TEMP
@@ -306,6 +311,75 @@ class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
             await self.async_turn_on(effect=effect)
 
 
+    def scene_payload(self, target: dict) -> dict:
+        """Return the control payload for a scene target, applied optimistically."""
+        self._transitioning = 0
+        if target.get('state', 'on') == 'off':
+            self._attr_is_on = False
+            return {'1': 0}
+
+        self._attr_is_on = True
+        payload = {'1': 255, '2': 0}
+        brightness = target.get(ATTR_BRIGHTNESS)
+        colortemp_kelvin = target.get(ATTR_COLOR_TEMP_KELVIN)
+        hs_color = target.get(ATTR_HS_COLOR)
+
+        if brightness is not None:
+            self._effect = 'manual'
+            payload['4'] = brightness_to_device(brightness)
+            self._attr_brightness = brightness
+
+        if colortemp_kelvin is not None:
+            self._effect = 'manual'
+            colortemp_kelvin = min(max(colortemp_kelvin, self._attr_min_color_temp_kelvin),
+                                   self._attr_max_color_temp_kelvin)
+            self._attr_color_mode = ColorMode.COLOR_TEMP
+            self._attr_color_temp_kelvin = colortemp_kelvin
+            payload['3'] = kelvin_to_device(
+                colortemp_kelvin, self._attr_min_color_temp_kelvin, self._attr_max_color_temp_kelvin)
+
+        if hs_color is not None:
+            self._effect = 'manual'
+            self._attr_color_mode = ColorMode.HS
+            self._attr_hs_color = tuple(hs_color)
+            r, g, b = colorutil.color_hs_to_RGB(*hs_color)
+            hs_color = colorutil.color_RGB_to_hs(r, g, b)
+            payload['5'], payload['6'] = hs_to_device(*hs_color)
+
+        return payload
+
+    def device_values(self) -> dict:
+        """Current state in device units, where a transition would start."""
+        values = {'4': brightness_to_device(self._attr_brightness or 0) if self._attr_is_on else 0}
+        if self._attr_color_temp_kelvin is not None:
+            values['3'] = kelvin_to_device(self._attr_color_temp_kelvin,
+                                           self._attr_min_color_temp_kelvin,
+                                           self._attr_max_color_temp_kelvin)
+        if self._attr_hs_color is not None:
+            values['5'], values['6'] = hs_to_device(*self._attr_hs_color)
+        return values
+
+    async def async_set_program(self, steps, speed=DEFAULT_SPEED, mode=DEFAULT_MODE,
+                                brightness=255):
+        """Compile a scene program and start it on the bulb."""
+        program = [
+            ProgramStep(step[ATTR_HS_COLOR][0], step[ATTR_HS_COLOR][1],
+                        step.get(ATTR_BRIGHTNESS))
+            for step in steps
+        ]
+        try:
+            payload = program_payload(program, speed, mode, brightness,
+                                      dpid=self._tcp_client.dpid)
+        except ValueError as err:
+            raise ServiceValidationError(f'{self.entity_id}: {err}') from err
+
+        self._transitioning = 0
+        self._effect = 'manual'
+        self._attr_is_on = True
+        self._attr_brightness = brightness
+        self.async_write_ha_state()
+        await self._async_control(payload)
+
     @property
     def effect(self):
         """Return the current effect."""
@@ -316,39 +390,42 @@ class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
         """Return the list of supported effects."""
         return self._scenes
 
-    def _refresh_state(self):
-        """Query device and set attributes."""
-        self._state = self._tcp_client.query()
-        if self._state:
-            self._attr_is_on = 0 < self._state['1']
-
-            if '2' in self._state:
-                if self._state['2'] == 0:
-                    if '3' in self._state:
-                        color_temp = self._state['3']
-                        if color_temp < 60000:
-                            self._attr_color_mode = ColorMode.COLOR_TEMP
-                            self._attr_color_temp_kelvin = round(
-                                self._attr_min_color_temp_kelvin + self._state['3'] * self._kelvin_ratio)
-
-                    if '4' in self._state:
-                        self._attr_brightness = int(self._state['4'] / 1000 * 255)
-
-                    if '5' in self._state:
-                        color = self._state['5']
-                        if color < 60000:
-                            self._attr_color_mode = ColorMode.HS
-                            r, g, b = colorutil.color_hs_to_RGB(
-                                round(self._state['5']), round(self._state['6'] / 10))
-                            hs_color = colorutil.color_RGB_to_hs(r, g, b)
-                            self._attr_hs_color = hs_color
+    def _apply_state(self, state: dict):
+        """Set attributes from a dpid state dict."""
+        if '1' in state:
+            self._attr_is_on = 0 < state['1']
+
+        if '2' in state:
+            if state['2'] == 0:
+                if '3' in state:
+                    color_temp = state['3']
+                    if color_temp < 60000:
+                        self._attr_color_mode = ColorMode.COLOR_TEMP
+                        self._attr_color_temp_kelvin = device_to_kelvin(
+                            state['3'], self._attr_min_color_temp_kelvin, self._attr_max_color_temp_kelvin)
+
+                if '4' in state:
+                    self._attr_brightness = device_to_brightness(state['4'])
+
+                if '5' in state and '6' in state:
+                    color = state['5']
+                    if color < 60000:
+                        self._attr_color_mode = ColorMode.HS
+                        r, g, b = colorutil.color_hs_to_RGB(
+                            round(state['5']), round(state['6'] / 10))
+                        hs_color = colorutil.color_RGB_to_hs(r, g, b)
+                        self._attr_hs_color = hs_color
 
     async def async_update(self):
         """Poll device state. Handle natural effect on update cycle."""
         if self._attr_is_on and self._effect == 'natural':
-            await self.async_turn_on(effect='natural')
+            token = BACKGROUND_PRIORITY.set(PRIORITY_EFFECT)
+            try:
+                await self.async_turn_on(effect='natural')
+            finally:
+                BACKGROUND_PRIORITY.reset(token)
         else:
-            await self.hass.async_add_executor_job(self._refresh_state)
+            await self._async_refresh_state()
 
     def calc_color_temp_kelvin(self):
         if self._cl == None:
@@ -388,7 +465,7 @@ class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
         count = 0
         if brightness is not None:
             self._effect = 'manual'
-            payload['4'] = round(brightness / 255 * 1000)
+            payload['4'] = brightness_to_device(brightness)
             self._attr_brightness = brightness
             count += 1
 
@@ -396,8 +473,8 @@ class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
             self._effect = 'manual'
             self._attr_color_mode = ColorMode.COLOR_TEMP
             self._attr_color_temp_kelvin = colortemp_kelvin
-            payload['3'] = round(
-                (colortemp_kelvin - self._attr_min_color_temp_kelvin) / self._kelvin_ratio)
+            payload['3'] = kelvin_to_device(
+                colortemp_kelvin, self._attr_min_color_temp_kelvin, self._attr_max_color_temp_kelvin)
             count += 1
 
         if hs_color is not None:
@@ -406,8 +483,7 @@ class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
             self._attr_hs_color = hs_color
             r, g, b = colorutil.color_hs_to_RGB(*hs_color)
             hs_color = colorutil.color_RGB_to_hs(r, g, b)
-            payload['5'] = round(hs_color[0])
-            payload['6'] = round(hs_color[1] * 10)
+            payload['5'], payload['6'] = hs_to_device(*hs_color)
             count += 1
 
         if count == 0:
@@ -416,13 +492,13 @@ class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
             if self._effect == 'natural':
                 if CIRCADIAN_BRIGHTNESS:
                     brightness = self.calc_brightness()
-                    payload['4'] = round(brightness / 255 * 1000)
+                    payload['4'] = brightness_to_device(brightness)
                     self._attr_brightness = brightness
                     self._attr_color_mode = ColorMode.COLOR_TEMP
                     colortemp_kelvin = self.calc_color_temp_kelvin()
                     self._attr_color_temp_kelvin = colortemp_kelvin
-                    payload['3'] = round(
-                        (colortemp_kelvin - self._attr_min_color_temp_kelvin) / self._kelvin_ratio)
+                    payload['3'] = kelvin_to_device(
+                        colortemp_kelvin, self._attr_min_color_temp_kelvin, self._attr_max_color_temp_kelvin)
                     if self._transitioning !=0:
                         return None
                     if transition is None:
@@ -431,7 +507,7 @@ class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
                     payload['4'] = 12
                     payload['3'] = 0
                     self._attr_color_mode = ColorMode.COLOR_TEMP
-                    self._attr_brightness = round(12 / 1000 * 255)
+                    self._attr_brightness = device_to_brightness(12)
                     self._attr_color_temp_kelvin = self._attr_min_color_temp_kelvin
             elif self._effect == 'study':
                     payload['4'] = 1000
@@ -446,10 +522,7 @@ class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
                     self._attr_brightness = 255
                     self._attr_color_temp_kelvin = self._attr_min_color_temp_kelvin
             elif self._effect == 'chrismas':
-                    payload['2'] = 1
-                    payload['4'] = 1000
-                    payload['8'] = 500
-                    payload['7'] = '03000003E8FFFF007803E8FFFF00F003E8FFFF003C03E8FFFF00B403E8FFFF010E03E8FFFF002603E8FFFF'
+                    payload.update(program_payload(CHRISMAS_STEPS))
 
         self._transitioning = 0
 
@@ -457,37 +530,36 @@ class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
             self._transitioning = time.time()
             now = self._transitioning
             if self._effect =='chrismas':
-                await self.hass.async_add_executor_job(self._tcp_client.control, payload)
+                await self._async_control(payload)
                 self._transitioning = 0
                 return None
             if brightness:
                 payloadtemp = {'1': 255, '2': 0}
-                p4i = round(originalbrightness / 255 * 1000)
+                p4i = brightness_to_device(originalbrightness)
                 p4f = payload['4']
-                p4steps = abs(round((p4i-p4f)/4))
+                p4steps = step_count(p4i, p4f, BRIGHTNESS_STEP)
             else:
                 p4steps = 0
             if self._attr_color_mode == ColorMode.COLOR_TEMP:
-                p3i = round((originalcolortemp_kelvin - self._attr_min_color_temp_kelvin) / self._kelvin_ratio)
+                p3i = kelvin_to_device(originalcolortemp_kelvin, self._attr_min_color_temp_kelvin,
+                                       self._attr_max_color_temp_kelvin)
                 p3steps = 0
                 if '3' in payload:
                     p3f = payload['3']
-                    p3steps = abs(round((p3i-p3f)/4))
+                    p3steps = step_count(p3i, p3f, TEMP_STEP)
                 steps = p3steps if p3steps > p4steps else p4steps
                 if steps <= 0:
                     self._transitioning = 0
                     return None
-                stepseconds = transition / steps
-                if stepseconds < MIN_INTERVAL:
-                    stepseconds = MIN_INTERVAL
-                    steps = round(transition / stepseconds)
-                    stepseconds = transition / steps
+                steps, stepseconds = frame_plan(steps, transition, self._tcp_client.min_interval)
                 for s in range(1,steps+1):
                     payloadtemp['4']= round(p4i + (p4f - p4i) * s / steps)
                     if p3steps != 0:
                         payloadtemp['3']= round(p3i + (p3f - p3i) * s / steps)
                     if now == self._transitioning:
-                        await self.hass.async_add_executor_job(self._tcp_client.control, payloadtemp)
+                        await self._async_io(self._tcp_client.control, payloadtemp, CALLER_TRANSITION,
+                                             max(stepseconds, FRAME_BUDGET), False,
+                                             priority=PRIORITY_TRANSITION)
                         if s<steps:
                             await asyncio.sleep(stepseconds)
                     else:
@@ -502,29 +574,28 @@ class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
                 if '5' in payload:
                     p5f = payload['5']
                     p6f = payload['6']
-                    p5steps = abs(round((p5i - p5f) / 3))
-                    p6steps = abs(round((p6i - p6f) / 10))
+                    p5steps = step_count(p5i, p5f, HUE_STEP)
+                    p6steps = step_count(p6i, p6f, SAT_STEP)
                 steps = max([p4steps, p5steps, p6steps])
                 if steps <= 0:
                     self._transitioning = 0
                     return None
-                stepseconds = transition / steps
-                if stepseconds < 4:
-                    steps = round(transition / stepseconds)
-                    stepseconds = transition / steps
+                steps, stepseconds = frame_plan(steps, transition, self._tcp_client.min_interval)
                 for s in range(steps):
                     payloadtemp['4']= round(p4i + (p4f - p4i) * s / steps)
                     if p5steps != 0:
                         payloadtemp['5']= round(p5i + (p5f - p5i) * s / steps)
                         payloadtemp['6']= round(p6i + (p6f - p6i) * s / steps)
                     if now == self._transitioning:
-                        await self.hass.async_add_executor_job(self._tcp_client.control, payloadtemp)
+                        await self._async_io(self._tcp_client.control, payloadtemp, CALLER_TRANSITION,
+                                             max(stepseconds, FRAME_BUDGET), False,
+                                             priority=PRIORITY_TRANSITION)
                         await asyncio.sleep(stepseconds)
                     else:
                         self._transitioning = 0
                         return None
         else:
-            await self.hass.async_add_executor_job(self._tcp_client.control, payload)
+            await self._async_control(payload)
         self._transitioning = 0
         return None
 
@@ -541,22 +612,20 @@ class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
             self._transitioning = time.time()
             now = self._transitioning
             payloadtemp = {'1': 255, '2': 0}
-            p4i = round(originalbrightness / 255 * 1000)
+            p4i = brightness_to_device(originalbrightness)
             p4f = 0
-            steps = abs(round((p4i-p4f)/4))
+            steps = step_count(p4i, p4f, BRIGHTNESS_STEP)
             if steps <= 0:
                 self._transitioning = 0
                 await super().async_turn_off()
                 return None
-            stepseconds = transition / steps
-            if stepseconds < MIN_INTERVAL:
-                stepseconds = MIN_INTERVAL
-                steps = round(transition / stepseconds)
-                stepseconds = transition / steps
+            steps, stepseconds = frame_plan(steps, transition, self._tcp_client.min_interval)
             for s in range(1+steps+1):
                 payloadtemp['4']= round(p4i + (p4f - p4i) * s / steps)
                 if now == self._transitioning:
-                    await self.hass.async_add_executor_job(self._tcp_client.control, payloadtemp)
+                    await self._async_io(self._tcp_client.control, payloadtemp, CALLER_TRANSITION,
+                                         max(stepseconds, FRAME_BUDGET), False,
+                                         priority=PRIORITY_TRANSITION)
                     if s<steps:
                         await asyncio.sleep(stepseconds)
                     else:
@@ -594,8 +663,6 @@ class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
         last_state = await self.async_get_last_state()
         if last_state and 'last_effect' in last_state.attributes:
             self._effect = last_state.attributes['last_effect']
-        # Query device for initial state
-        await self.hass.async_add_executor_job(self._refresh_state)
 
     @property
     def extra_state_attributes(self):
@@ -609,3 +676,200 @@ class CozyLifeLight(CozyLifeSwitchAsLight,RestoreEntity):
     def supported_features(self) -> LightEntityFeature:
         """Flag supported features."""
         return LightEntityFeature.EFFECT | LightEntityFeature.TRANSITION
+
+
+class CozyLifeGroupLight(LightEntity):
+    """Several CozyLife lights of one hub driven as one.
+
+    A command is turned into one payload per member and written to all of
+    them at once; transitions run every member on a shared frame clock so
+    they stay in step.  Member entities keep their own state, and the group
+    reports an aggregate of them, written once per command.
+    """
+
+    _attr_should_poll = False
+    _attr_supported_features = LightEntityFeature.TRANSITION
+
+    def __init__(self, hass, entry: ConfigEntry, name: str, dids: list[str]) -> None:
+        """Initialize."""
+        self.hass = hass
+        self._dids = set(dids)
+        self._attr_name = name
+        self._attr_unique_id = f"{entry.entry_id}_group_{name}"
+        # Bumped per command; a running transition stops when it changes
+        self._generation = 0
+        # Member updates are not echoed while a command writes them
+        self._applying = False
+
+    def _members(self) -> list[CozyLifeSwitchAsLight]:
+        return [
+            entity for entity in self.hass.data[DOMAIN].get(ENTITIES_KEY, {}).values()
+            if isinstance(entity, CozyLifeSwitchAsLight)
+            and entity._tcp_client.device_id in self._dids
+        ]
+
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+
+        @callback
+        def _async_member_changed(event) -> None:
+            if not self._applying:
+                self.async_write_ha_state()
+
+        # Member lights use the device id as unique id
+        registry = er.async_get(self.hass)
+        member_ids = [
+            entity_id for did in self._dids
+            if (entity_id := registry.async_get_entity_id("light", DOMAIN, did))
+        ]
+        self.async_on_remove(
+            async_track_state_change_event(self.hass, member_ids, _async_member_changed)
+        )
+
+    @property
+    def available(self) -> bool:
+        return any(member.available for member in self._members())
+
+    @property
+    def is_on(self) -> bool:
+        return any(member.is_on for member in self._members())
+
+    @property
+    def supported_color_modes(self) -> set[ColorMode]:
+        modes = set()
+        for member in self._members():
+            modes |= member.supported_color_modes or set()
+        # Like HA's light group: ONOFF and BRIGHTNESS only stand on their
+        # own, never next to a colour mode
+        return filter_supported_color_modes(modes) or {ColorMode.ONOFF}
+
+    @property
+    def color_mode(self) -> ColorMode:
+        on = [member.color_mode for member in self._members() if member.is_on]
+        modes = self.supported_color_modes
+        order = (ColorMode.HS, ColorMode.COLOR_TEMP, ColorMode.BRIGHTNESS)
+        for mode in order:
+            if mode in modes and mode in on:
+                return mode
+        # Members lit in a mode the group filtered out show as its first one
+        for mode in order:
+            if mode in modes:
+                return mode
+        return next(iter(modes))
+
+    def _lit(self, attr: str) -> list:
+        values = []
+        for member in self._members():
+            value = getattr(member, attr, None)
+            if member.is_on and value is not None:
+                values.append(value)
+        return values
+
+    @property
+    def brightness(self) -> int | None:
+        values = self._lit('_attr_brightness')
+        return round(sum(values) / len(values)) if values else None
+
+    @property
+    def color_temp_kelvin(self) -> int | None:
+        values = self._lit('_attr_color_temp_kelvin')
+        return round(sum(values) / len(values)) if values else None
+
+    @property
+    def min_color_temp_kelvin(self) -> int:
+        return DEFAULT_MIN_KELVIN
+
+    @property
+    def max_color_temp_kelvin(self) -> int:
+        return DEFAULT_MAX_KELVIN
+
+    @property
+    def hs_color(self) -> tuple[float, float] | None:
+        values = self._lit('_attr_hs_color')
+        return tuple(values[0]) if values else None
+
+    @property
+    def extra_state_attributes(self):
+        return {ATTR_ENTITY_ID: sorted(member.entity_id for member in self._members())}
+
+    async def async_turn_on(self, **kwargs: Any) -> None:
+        """Turn every member on in the same frame."""
+        target = {'state': 'on'}
+        for attr in (ATTR_BRIGHTNESS, ATTR_COLOR_TEMP_KELVIN, ATTR_HS_COLOR):
+            if kwargs.get(attr) is not None:
+                target[attr] = kwargs[attr]
+        await self._async_apply(target, kwargs.get(ATTR_TRANSITION))
+
+    async def async_turn_off(self, **kwargs: Any) -> None:
+        """Turn every member off in the same frame."""
+        await self._async_apply({'state': 'off'}, kwargs.get(ATTR_TRANSITION))
+
+    async def _async_apply(self, target: dict, transition: float | None) -> None:
+        self._generation += 1
+        generation = self._generation
+        members = self._members()
+        # Where each member is now, then where it is going; scene_payload
+        # also stops a member's own transition and sets it optimistically
+        starts = [member.device_values() for member in members]
+        payloads = [member.scene_payload(target) for member in members]
+
+        self._applying = True
+        try:
+            for member in members:
+                member.async_write_ha_state()
+        finally:
+            self._applying = False
+        self.async_write_ha_state()
+
+        if transition:
+            if not await self._async_run_frames(members, starts, payloads, transition, generation):
+                return
+        await self._async_send(members, payloads)
+
+    async def _async_run_frames(self, members, starts, payloads, transition, generation) -> bool:
+        """Run the members' transitions on one clock; False if superseded."""
+        plan = []
+        for member, start, payload in zip(members, starts, payloads):
+            end = payload
+            if payload.get('1') == 0 and '4' in start:
+                # Fade out, then switch off with the final payload
+                end = {'1': 255, '2': 0, '4': 0}
+            plan.append((member, start, end))
+        steps = max((payload_steps(start, end) for _, start, end in plan), default=0)
+        if steps <= 0:
+            return True
+        # The slowest member sets the pace for all of them
+        min_interval = max(member._tcp_client.min_interval for member in members)
+        steps, stepseconds = frame_plan(steps, transition, min_interval)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        inflight: dict[CozyLifeSwitchAsLight, asyncio.Future] = {}
+        for s in range(1, steps + 1):
+            if generation != self._generation:
+                return False
+            for member, start, end in plan:
+                pending = inflight.get(member)
+                if pending is not None and not pending.done():
+                    # Still busy with an earlier frame; skip this one
+                    continue
+                payload = frame_payload(start, end, s, steps)
+                inflight[member] = asyncio.ensure_future(member._async_io(
+                    member._tcp_client.control, payload, CALLER_TRANSITION,
+                    max(stepseconds, FRAME_BUDGET), False, priority=PRIORITY_TRANSITION))
+            await asyncio.sleep(max(0.0, started + s * stepseconds - loop.time()))
+        if inflight:
+            await asyncio.gather(*inflight.values(), return_exceptions=True)
+        return generation == self._generation
+
+    async def _async_send(self, members, payloads) -> None:
+        """Write every member's payload in the same frame."""
+        results = await self.hass.async_add_executor_job(
+            apply_payloads,
+            [(member._tcp_client, payload) for member, payload in zip(members, payloads)],
+            PREPARE_TIMEOUT,
+        )
+        for member, result in zip(members, results):
+            if not result["success"]:
+                # Replace the optimistic state with what the device reports
+                self.hass.async_create_task(member._async_reconcile())
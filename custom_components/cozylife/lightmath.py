@@ -0,0 +1,86 @@
+"""Pure light math shared by the CozyLife light entities.
+
+The device uses 0-1000 for brightness (dpid 4) and colour temperature
+(dpid 3, 0 = warmest), hue in degrees (dpid 5) and saturation 0-1000
+(dpid 6).  Home Assistant uses 0-255 brightness, kelvin and a 0-100
+saturation.
+"""
+from __future__ import annotations
+
+DEVICE_SCALE = 1000
+
+# Device units moved per transition frame, per dpid
+BRIGHTNESS_STEP = 4
+TEMP_STEP = 4
+HUE_STEP = 3
+SAT_STEP = 10
+
+
+def brightness_to_device(brightness: float) -> int:
+    """HA brightness (0-255) to device brightness (0-1000)."""
+    return round(brightness / 255 * DEVICE_SCALE)
+
+
+def device_to_brightness(value: float) -> int:
+    """Device brightness (0-1000) to HA brightness (0-255)."""
+    return round(value / DEVICE_SCALE * 255)
+
+
+def kelvin_to_device(kelvin: float, min_kelvin: int, max_kelvin: int) -> int:
+    """Colour temperature in kelvin to the device 0-1000 scale."""
+    return round((kelvin - min_kelvin) / ((max_kelvin - min_kelvin) / DEVICE_SCALE))
+
+
+def device_to_kelvin(value: float, min_kelvin: int, max_kelvin: int) -> int:
+    """Device colour temperature (0-1000) to kelvin."""
+    return round(min_kelvin + value * ((max_kelvin - min_kelvin) / DEVICE_SCALE))
+
+
+def hs_to_device(hue: float, saturation: float) -> tuple[int, int]:
+    """HA hue/saturation (0-360, 0-100) to device dpid 5/6 values."""
+    return round(hue), round(saturation * 10)
+
+
+def step_count(start: float, end: float, step: float) -> int:
+    """Number of transition frames to move from start to end by step units."""
+    return abs(round((start - end) / step))
+
+
+def frame_plan(steps: int, transition: float, min_interval: float) -> tuple[int, float]:
+    """Fit a transition of ``steps`` frames into ``transition`` seconds.
+
+    When the frames would come faster than ``min_interval`` (the device's
+    sustainable frame gap), fewer, evenly spaced frames are used instead.
+    Returns ``(steps, seconds_per_step)``.
+    """
+    stepseconds = transition / steps
+    if stepseconds < min_interval:
+        steps = max(1, round(transition / min_interval))
+        stepseconds = transition / steps
+    return steps, stepseconds
+
+
+# Frame size per interpolated dpid
+DPID_STEPS = {'3': TEMP_STEP, '4': BRIGHTNESS_STEP, '5': HUE_STEP, '6': SAT_STEP}
+
+
+def payload_steps(start: dict, end: dict) -> int:
+    """Frames needed to move every interpolated dpid from start to end."""
+    return max(
+        (step_count(start[dpid], end[dpid], step)
+         for dpid, step in DPID_STEPS.items() if dpid in start and dpid in end),
+        default=0,
+    )
+
+
+def frame_payload(start: dict, end: dict, step: int, steps: int) -> dict:
+    """Payload for frame ``step`` of ``steps`` on the way from start to end.
+
+    Interpolated dpids present in both move linearly; every other dpid of
+    ``end`` is sent as is.
+    """
+    payload = dict(end)
+    for dpid in DPID_STEPS:
+        if dpid in start and dpid in end:
+            payload[dpid] = round(start[dpid] + (end[dpid] - start[dpid]) * step / steps)
+    return payload
@@ -0,0 +1,110 @@
+"""Domain-wide ownership of device connections."""
+from __future__ import annotations
+
+from typing import Any, Callable
+
+# How long a client no hub uses keeps its socket, so a reloading hub can
+# take it over instead of reconnecting
+HANDOVER_GRACE = 60.0
+
+
+class ConnectionManager:
+    """Keep one client per device id across every hub entry.
+
+    Each hub acquires the devices it lists.  A device listed by two hubs
+    (e.g. after an interrupted migration) still gets a single client, so it
+    is polled and pushed to once.  The first hub to acquire a device owns
+    it: the client runs on that hub's pool, limiter and workers, and its
+    entities live there.  References are counted per hub; when the owner
+    lets go another referencing hub takes over, and the client is closed
+    only once no hub uses it.
+
+    A hub being reloaded parks its clients here with their sockets open;
+    the reloaded hub unparks them, so a reload neither reconnects nor
+    re-queries its devices.
+
+    Only used from the event loop, so there is no locking.
+    """
+
+    def __init__(self) -> None:
+        self._clients: dict[str, Any] = {}
+        # did -> ids of the entries using it, owner first
+        self._refs: dict[str, list[str]] = {}
+        # did -> client no hub uses right now, kept for a reloading hub
+        self._parked: dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def get(self, did: str) -> Any | None:
+        return self._clients.get(did)
+
+    def owner(self, did: str) -> str | None:
+        refs = self._refs.get(did)
+        return refs[0] if refs else None
+
+    def acquire(self, entry_id: str, did: str, create: Callable[[], Any]) -> tuple[Any, bool]:
+        """Reference ``did`` from ``entry_id``, creating its client if new.
+
+        Returns the client and whether ``entry_id`` owns it.
+        """
+        refs = self._refs.setdefault(did, [])
+        if entry_id not in refs:
+            refs.append(entry_id)
+        client = self._clients.get(did)
+        if client is None:
+            client = self._clients[did] = create()
+        return client, refs[0] == entry_id
+
+    def release(self, entry_id: str, did: str) -> tuple[Any | None, str | None]:
+        """Drop the reference of ``entry_id`` to ``did``.
+
+        Returns ``(client, new_owner)``: ``new_owner`` is the entry that now
+        owns the client if ownership moved, and None with a client when no
+        entry uses it any more and the caller should close it.  Returns
+        ``(None, None)`` when nothing changed hands.
+        """
+        refs = self._refs.get(did)
+        if not refs or entry_id not in refs:
+            return None, None
+        was_owner = refs[0] == entry_id
+        refs.remove(entry_id)
+        if not refs:
+            del self._refs[did]
+            return self._clients.pop(did, None), None
+        if was_owner:
+            return self._clients[did], refs[0]
+        return None, None
+
+    def release_entry(self, entry_id: str) -> tuple[list, dict[str, list]]:
+        """Drop every reference of ``entry_id``.
+
+        Returns the clients no entry uses any more, and the clients whose
+        ownership moved, by their new owner.
+        """
+        unused: list = []
+        moved: dict[str, list] = {}
+        for did in [did for did, refs in self._refs.items() if entry_id in refs]:
+            client, new_owner = self.release(entry_id, did)
+            if client is None:
+                continue
+            if new_owner is None:
+                unused.append(client)
+            else:
+                moved.setdefault(new_owner, []).append(client)
+        return unused, moved
+
+    def park(self, did: str, client: Any) -> None:
+        """Keep an unused client for a hub that may set up again shortly."""
+        self._parked[did] = client
+
+    def unpark(self, did: str) -> Any | None:
+        """Take the parked client of ``did``, if any."""
+        return self._parked.pop(did, None)
+
+    def discard(self, did: str, client: Any) -> bool:
+        """Forget ``client`` if it is still parked; True if the caller should close it."""
+        if self._parked.get(did) is client:
+            del self._parked[did]
+            return True
+        return False
@@ -0,0 +1,111 @@
+"""Idle-socket pool with a per-hub connection budget."""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 64
+DEFAULT_IDLE_TIMEOUT = 300
+
+
+def _close_if_unused(client) -> bool:
+    """Close a client's socket unless an exchange holds its I/O lock."""
+    if not client._io_lock.acquire(blocking=False):
+        return False
+    try:
+        client.disconnect()
+    finally:
+        client._io_lock.release()
+    return True
+
+
+class ConnectionPool:
+    """Track the open sockets of a hub's clients.
+
+    Clients connect lazily and check in here once their socket is open.  The
+    pool keeps them in least-recently-used order, closes sockets idle for
+    longer than ``idle_timeout`` and, when more than ``max_connections`` are
+    open, closes the least recently used one.  Pinned clients (devices that
+    must keep a socket for pushed updates) are never closed by the pool.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+    ) -> None:
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self._lock = threading.RLock()
+        # client -> last use (monotonic), oldest first
+        self._open: OrderedDict = OrderedDict()
+        self._pinned: set = set()
+
+    def __len__(self) -> int:
+        return len(self._open)
+
+    def checkin(self, client) -> None:
+        """Register a freshly opened socket, evicting the LRU client if over budget."""
+        with self._lock:
+            self._open[client] = time.monotonic()
+            self._open.move_to_end(client)
+            excess = len(self._open) - self.max_connections
+            candidates = [
+                other for other in self._open
+                if other is not client and other not in self._pinned
+            ] if excess > 0 else []
+        for other in candidates:
+            if excess <= 0:
+                break
+            # A client mid-exchange is skipped for the next least recently used
+            if _close_if_unused(other):
+                _LOGGER.debug('Pool full, closed least recently used ip=%s', other._ip)
+                excess -= 1
+
+    def touch(self, client) -> None:
+        """Mark a client as just used."""
+        with self._lock:
+            if client in self._open:
+                self._open[client] = time.monotonic()
+                self._open.move_to_end(client)
+
+    def release(self, client) -> None:
+        """Forget a client whose socket was closed."""
+        with self._lock:
+            self._open.pop(client, None)
+
+    def pin(self, client) -> None:
+        """Keep this client's socket open regardless of idle time and budget."""
+        with self._lock:
+            self._pinned.add(client)
+
+    def unpin(self, client) -> None:
+        with self._lock:
+            self._pinned.discard(client)
+
+    def close_idle(self) -> int:
+        """Close every unpinned socket idle for longer than the idle timeout."""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [
+                client for client, last_used in self._open.items()
+                if last_used < cutoff and client not in self._pinned
+            ]
+        closed = 0
+        for client in idle:
+            # Picked up by a worker since it was found idle; leave it open
+            if _close_if_unused(client):
+                _LOGGER.debug('Closed idle connection ip=%s', client._ip)
+                closed += 1
+        return closed
+
+    def close_all(self) -> None:
+        with self._lock:
+            clients = list(self._open)
+            self._pinned.clear()
+        for client in clients:
+            client.disconnect()
@@ -0,0 +1,156 @@
+"""Token-bucket rate limiting for command frames."""
+from __future__ import annotations
+
+import threading
+import time
+
+# Starting device rate; matches the historical 0.2 s transition frame interval
+DEFAULT_DEVICE_RATE = 5.0
+MIN_DEVICE_RATE = 1.0
+MAX_DEVICE_RATE = 20.0
+
+# Shared budget for all devices behind one hub (one access point)
+DEFAULT_HUB_RATE = 50.0
+
+# AIMD tuning: additive increase per clean ack, multiplicative decrease on
+# loss or on acks much slower than the best seen
+RATE_INCREASE = 0.25
+LOSS_DECREASE = 0.5
+SLOW_DECREASE = 0.8
+SLOW_FACTOR = 2.0
+LATENCY_FLOOR = 0.05
+
+
+class TokenBucket:
+    """A thread-safe token bucket.
+
+    ``rate`` tokens are added per second up to ``burst``; ``acquire`` blocks
+    the calling (executor) thread until a token is available.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None) -> None:
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self._burst
+        self._stamp = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def set_rate(self, rate: float) -> None:
+        with self._lock:
+            self._refill()
+            self._rate = rate
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._stamp) * self._rate)
+        self._stamp = now
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        """Take one token, waiting for it if needed.
+
+        Returns False without taking a token if it would take longer than
+        ``timeout`` seconds.
+        """
+        with self._lock:
+            self._refill()
+            wait = (1 - self._tokens) / self._rate if self._tokens < 1 else 0.0
+            if timeout is not None and wait > timeout:
+                return False
+            # Reserve the token now so concurrent callers queue behind us
+            self._tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def release(self) -> None:
+        """Give back a token taken by ``acquire`` that went unused."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._burst, self._tokens + 1)
+
+
+class AdaptiveLimiter(TokenBucket):
+    """Per-device bucket that learns the sustainable command rate.
+
+    Every acknowledged frame nudges the rate up; a lost frame halves it and
+    an ack much slower than the best one seen cuts it back, so cheap
+    firmware settles at a rate it can keep up with.
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_DEVICE_RATE,
+        min_rate: float = MIN_DEVICE_RATE,
+        max_rate: float = MAX_DEVICE_RATE,
+    ) -> None:
+        super().__init__(rate, burst=1.0)
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._best_latency: float | None = None
+
+    @property
+    def min_interval(self) -> float:
+        """Shortest gap between frames at the current rate, in seconds."""
+        return 1 / self._rate
+
+    def record(self, latency: float | None) -> None:
+        """Feed back the ack latency of one frame, or None if it was lost."""
+        if latency is None:
+            rate = self._rate * LOSS_DECREASE
+        else:
+            if self._best_latency is None or latency < self._best_latency:
+                self._best_latency = latency
+            if latency > SLOW_FACTOR * max(self._best_latency, LATENCY_FLOOR):
+                rate = self._rate * SLOW_DECREASE
+            else:
+                rate = self._rate + RATE_INCREASE
+        self.set_rate(min(self._max_rate, max(self._min_rate, rate)))
+
+
+# Retransmission timeout bounds for acknowledged control frames (seconds)
+INITIAL_RTO = 0.5
+MIN_RTO = 0.1
+MAX_RTO = 1.0
+# RFC 6298 smoothing gains and variance multiplier
+RTT_ALPHA = 0.125
+RTT_BETA = 0.25
+RTT_K = 4
+
+
+class RttEstimator:
+    """Smoothed round-trip time and retransmission timeout of one device.
+
+    Follows RFC 6298: the timeout is the smoothed RTT plus four deviations,
+    clamped to a range that suits a LAN, and doubles after every
+    retransmission until a fresh sample arrives.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._srtt: float | None = None
+        self._rttvar = 0.0
+        self._rto = INITIAL_RTO
+
+    @property
+    def rto(self) -> float:
+        return self._rto
+
+    def record(self, rtt: float) -> None:
+        """Feed back the ack time of a frame that was sent only once."""
+        with self._lock:
+            if self._srtt is None:
+                self._srtt = rtt
+                self._rttvar = rtt / 2
+            else:
+                self._rttvar = (1 - RTT_BETA) * self._rttvar + RTT_BETA * abs(self._srtt - rtt)
+                self._srtt = (1 - RTT_ALPHA) * self._srtt + RTT_ALPHA * rtt
+            self._rto = min(MAX_RTO, max(MIN_RTO, self._srtt + RTT_K * self._rttvar))
+
+    def backoff(self) -> None:
+        """Double the timeout after a retransmission."""
+        with self._lock:
+            self._rto = min(MAX_RTO, self._rto * 2)
@@ -0,0 +1,237 @@
+"""Hub-wide recovery from mass outages.
+
+After a power cut or an access-point reboot every device of a hub loses its
+socket at once, and each would try to reconnect on its next poll.  That herd
+of simultaneous connects overloads the access point and the bulbs' small TCP
+stacks.  The ``RecoveryCoordinator`` notices when most devices fail
+together, holds back their own reconnect attempts and brings them back in
+small waves instead, with jittered start times and a gap between waves that
+grows while nothing comes back.
+"""
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable
+
+_LOGGER = logging.getLogger(__name__)
+
+# An outage is declared when this share of the hub's devices, and at least
+# RECOVERY_MIN_DEVICES of them, failed to connect within OUTAGE_WINDOW seconds
+OUTAGE_FRACTION = 0.5
+RECOVERY_MIN_DEVICES = 3
+OUTAGE_WINDOW = 30.0
+
+# Devices released per wave, and the gap between waves; the gap doubles up
+# to MAX_WAVE_INTERVAL while probes keep failing
+WAVE_SIZE = 4
+WAVE_INTERVAL = 2.0
+MAX_WAVE_INTERVAL = 30.0
+# Connects of one wave are spread over this many seconds
+WAVE_JITTER = 1.0
+# A released device that has not reported back by then counts as failed
+PROBE_TIMEOUT = 10.0
+# Probes per device before it is left to reconnect on its own
+RECOVERY_TRIES = 3
+
+
+class RecoveryCoordinator:
+    """Detect hub-wide outages and reconnect the devices in waves.
+
+    Clients report every connect attempt through ``report`` and ask
+    ``may_connect`` before opening a socket.  Outside an outage every
+    connect is allowed.  During one, only devices released by the current
+    wave may connect; the rest are queued and ``probe(client)`` is called
+    for each when its turn comes.  ``probe`` should only queue the connect
+    (e.g. on the hub's scheduler), not perform it.
+    """
+
+    def __init__(
+        self,
+        probe: Callable[[Any], Any],
+        wave_size: int = WAVE_SIZE,
+        wave_interval: float = WAVE_INTERVAL,
+        jitter: float = WAVE_JITTER,
+        name: str = 'cozylife',
+    ) -> None:
+        self._probe = probe
+        self.wave_size = wave_size
+        self.wave_interval = wave_interval
+        self.jitter = jitter
+        self._name = name
+        self._cond = threading.Condition()
+        self._clients: set = set()
+        # client -> when its current run of failed connects began
+        self._down: dict[Any, float] = {}
+        self._thread: threading.Thread | None = None
+        self._closed = False
+        self._recovering = False
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pending: deque = deque()
+        # (release time, client) of the current wave, soonest first
+        self._scheduled: list[tuple[float, Any]] = []
+        # client -> when it was released to connect
+        self._released: dict[Any, float] = {}
+        self._tries: dict[Any, int] = {}
+        self._given_up: set = set()
+        self._recovered = 0
+        self._interval = self.wave_interval
+        self._next_wave = 0.0
+        self._started = 0.0
+
+    def register(self, client: Any) -> None:
+        with self._cond:
+            self._clients.add(client)
+
+    def unregister(self, client: Any) -> None:
+        with self._cond:
+            self._clients.discard(client)
+            self._down.pop(client, None)
+
+    @property
+    def recovering(self) -> bool:
+        return self._recovering
+
+    def may_connect(self, client: Any) -> bool:
+        """Whether ``client`` may open a socket now; queues it if not."""
+        with self._cond:
+            if not self._recovering or client in self._released or client in self._given_up:
+                return True
+            if client not in self._pending and all(c is not client for _, c in self._scheduled):
+                self._pending.append(client)
+                self._cond.notify()
+            return False
+
+    def report(self, client: Any, ok: bool) -> None:
+        """Record the result of a connect attempt by ``client``."""
+        now = time.monotonic()
+        with self._cond:
+            if ok:
+                self._down.pop(client, None)
+            else:
+                self._down.setdefault(client, now)
+            if self._recovering:
+                self._report_probe(client, ok)
+            elif not ok and self._outage(now):
+                self._start(now)
+
+    def _outage(self, now: float) -> bool:
+        # Caller holds the lock
+        recent = sum(1 for since in self._down.values() if now - since <= OUTAGE_WINDOW)
+        return recent >= RECOVERY_MIN_DEVICES and recent >= OUTAGE_FRACTION * len(self._clients)
+
+    def _start(self, now: float) -> None:
+        # Caller holds the lock
+        self._reset()
+        self._recovering = True
+        self._started = now
+        down = list(self._down)
+        random.shuffle(down)
+        self._pending.extend(down)
+        _LOGGER.warning(
+            '%d of %d devices lost their connection together; reconnecting in waves of %d',
+            len(down), len(self._clients), self.wave_size,
+        )
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(
+                target=self._run, name=f'{self._name}-recovery', daemon=True
+            )
+            self._thread.start()
+
+    def _report_probe(self, client: Any, ok: bool) -> None:
+        # Caller holds the lock
+        if self._released.pop(client, None) is None:
+            return
+        self._cond.notify()
+        if ok:
+            self._recovered += 1
+            self._interval = self.wave_interval
+            return
+        self._interval = min(self._interval * 2, MAX_WAVE_INTERVAL)
+        self._tries[client] = self._tries.get(client, 0) + 1
+        if self._tries[client] >= RECOVERY_TRIES:
+            # Likely off or gone for good; stop holding it back
+            self._given_up.add(client)
+        else:
+            self._pending.append(client)
+
+    def _next(self) -> tuple[list, float | None]:
+        """Clients due for a probe now, and how long to wait for the next."""
+        with self._cond:
+            now = time.monotonic()
+            for client, released in list(self._released.items()):
+                if now - released >= PROBE_TIMEOUT:
+                    self._report_probe(client, False)
+            if now >= self._next_wave and self._pending:
+                spread = min(self.jitter, self._interval)
+                for _ in range(min(self.wave_size, len(self._pending))):
+                    client = self._pending.popleft()
+                    self._scheduled.append((now + random.uniform(0, spread), client))
+                self._scheduled.sort(key=lambda item: item[0])
+                self._next_wave = now + self._interval
+                _LOGGER.info('Recovery: %s', self._progress())
+            due = []
+            while self._scheduled and self._scheduled[0][0] <= now:
+                _, client = self._scheduled.pop(0)
+                self._released[client] = now
+                due.append(client)
+            if not (self._pending or self._scheduled or self._released or due):
+                _LOGGER.info(
+                    'Recovery finished after %.1fs: %d devices back, %d still unreachable',
+                    now - self._started, self._recovered, len(self._given_up),
+                )
+                self._recovering = False
+                return due, None
+            wake = [min(self._released.values()) + PROBE_TIMEOUT] if self._released else []
+            if self._scheduled:
+                wake.append(self._scheduled[0][0])
+            if self._pending:
+                wake.append(self._next_wave)
+            return due, max(0.0, min(wake) - now)
+
+    def _run(self) -> None:
+        while True:
+            due, wait = self._next()
+            for client in due:
+                try:
+                    self._probe(client)
+                except Exception:  # noqa: BLE001 - e.g. the scheduler shut down
+                    _LOGGER.debug('Could not queue recovery probe', exc_info=True)
+            with self._cond:
+                # Checked under the lock, so an outage starting right after
+                # the last one finished keeps this thread
+                if self._closed or not self._recovering:
+                    self._thread = None
+                    return
+                if not due:
+                    self._cond.wait(wait)
+
+    def _progress(self) -> dict:
+        # Caller holds the lock
+        return {
+            'recovering': self._recovering,
+            'devices': len(self._clients),
+            'down': len(self._down),
+            'waiting': len(self._pending) + len(self._scheduled),
+            'probing': len(self._released),
+            'recovered': self._recovered,
+            'given_up': len(self._given_up),
+            'elapsed': round(time.monotonic() - self._started, 1) if self._recovering else 0.0,
+        }
+
+    def progress(self) -> dict:
+        """Recovery progress, for logs and diagnostics."""
+        with self._cond:
+            return self._progress()
+
+    def shutdown(self) -> None:
+        """Stop the recovery thread and stop holding clients back."""
+        with self._cond:
+            self._closed = True
+            self._recovering = False
+            self._cond.notify_all()
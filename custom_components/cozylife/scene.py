@@ -0,0 +1,102 @@
+"""Synchronized multi-device scene application for CozyLife."""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .tcp_client import tcp_client, CMD_SET
+    from .cmdtrace import CALLER_SCENE
+    from .deadline import Deadline
+except ImportError:
+    from tcp_client import tcp_client, CMD_SET
+    from cmdtrace import CALLER_SCENE
+    from deadline import Deadline
+
+_LOGGER = logging.getLogger(__name__)
+
+# How long the slowest device may take to connect before the others are
+# released without it.
+PREPARE_TIMEOUT = 3.0
+
+
+def apply_payloads(
+    targets: list[tuple[tcp_client, dict]],
+    prepare_timeout: float = PREPARE_TIMEOUT,
+    reliable: bool | None = None,
+) -> list[dict]:
+    """Send one control payload to each client, released at the same instant.
+
+    Every worker first makes sure its socket is open and encodes its package,
+    then waits on a shared barrier.  Once all workers are ready (or the
+    prepare timeout expires) the packages are written together, so lights
+    across the hub change in the same frame.  Each worker holds its
+    client's I/O lock throughout, so scheduled polls and frames for the
+    device wait for the scene instead of sharing the socket with it.
+
+    With ``reliable`` (default: each client's own setting) a device counts
+    as done only once it acknowledges, and is retransmitted to otherwise.
+
+    Returns one result dict per target, in order, with ``success`` and
+    ``latency_ms`` (time from release to the package being written, or
+    acknowledged when reliable), plus ``attempts`` when reliable.
+    """
+    if not targets:
+        return []
+
+    barrier = threading.Barrier(len(targets))
+    prepare_deadline = Deadline(prepare_timeout)
+
+    def _worker(client: tcp_client, payload: dict) -> dict:
+        # Hold the device's I/O lock from prepare to send, so a poll or a
+        # transition frame on the scheduler cannot take the socket, sn or
+        # reply in between
+        locked = client._io_lock.acquire(timeout=max(0.0, prepare_deadline.remaining()))
+        try:
+            return _prepare_and_send(client, payload, locked)
+        finally:
+            if locked:
+                client._io_lock.release()
+
+    def _prepare_and_send(client: tcp_client, payload: dict, locked: bool) -> dict:
+        package = sn = None
+        try:
+            if locked and client._ensure_connected(prepare_deadline):
+                package = client._get_package(CMD_SET, payload)
+                sn = client._sn
+                # Take the rate-limit slot now so the release is not staggered
+                client._pace(prepare_deadline)
+        except Exception:
+            _LOGGER.debug("Failed to prepare scene for %s", client._ip)
+            package = None
+
+        try:
+            barrier.wait(max(0.0, prepare_deadline.remaining()))
+        except threading.BrokenBarrierError:
+            # Someone timed out preparing; send what we have anyway.
+            pass
+
+        if package is None:
+            return {"success": False, "latency_ms": None, "error": "unreachable"}
+
+        released = time.monotonic()
+        if client.reliable if reliable is None else reliable:
+            result = client._send_reliable(package, sn, CALLER_SCENE, Deadline(client.timeout), pace=False)
+            latency_ms = round((time.monotonic() - released) * 1000, 2)
+            if not result:
+                return {"success": False, "latency_ms": latency_ms, "attempts": result.attempts,
+                        "error": "timeout" if result.timed_out else "no_ack"}
+            return {"success": True, "latency_ms": latency_ms, "attempts": result.attempts}
+
+        ok = client._send_package(package, sn, pace=False, caller=CALLER_SCENE,
+                                  deadline=Deadline(client.timeout))
+        latency_ms = round((time.monotonic() - released) * 1000, 2)
+        if not ok:
+            return {"success": False, "latency_ms": latency_ms, "error": "send_failed"}
+        return {"success": True, "latency_ms": latency_ms}
+
+    with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+        futures = [pool.submit(_worker, client, payload) for client, payload in targets]
+        return [future.result() for future in futures]
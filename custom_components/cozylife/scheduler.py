@@ -0,0 +1,204 @@
+"""Per-device fair scheduling of blocking device I/O."""
+from __future__ import annotations
+
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
+
+_LOGGER = logging.getLogger(__name__)
+
+# Worker threads per hub; device I/O is socket-bound, so a few suffice
+DEFAULT_WORKERS = 8
+# Jobs of one device that may run at once; one keeps its socket unshared
+DEFAULT_PER_DEVICE = 1
+
+# Priority lanes, most urgent first
+PRIORITY_INTERACTIVE = 0  # service calls a user is waiting on
+PRIORITY_TRANSITION = 1  # frames of a running transition
+PRIORITY_EFFECT = 2  # background effects such as the circadian update
+PRIORITY_POLL = 3  # state polls
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_TRANSITION, PRIORITY_EFFECT, PRIORITY_POLL)
+
+
+class DeviceScheduler:
+    """Run blocking jobs on a private thread pool, queued per device.
+
+    Each device has one FIFO queue per priority lane and always runs its
+    most urgent queued job next.  Workers serve the devices with queued work
+    round-robin, one job per turn, devices with more urgent work first, and
+    never run more than ``per_device`` jobs of one device at once.  A device
+    that stops answering therefore ties up at most ``per_device`` workers
+    and only delays its own queue; everything else keeps flowing.
+
+    A job may be submitted with a ``preempt`` callable.  It is called when
+    more urgent work arrives for the same device, or when every worker is
+    busy, so the job (typically a poll) can give up early; the caller is
+    expected to resubmit it.
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        per_device: int = DEFAULT_PER_DEVICE,
+        name: str = 'cozylife',
+    ) -> None:
+        self._workers = workers
+        self._per_device = per_device
+        self._name = name
+        self._cond = threading.Condition()
+        # key -> one deque of (future, func, args, preempt) per priority
+        self._queues: dict[Hashable, list[deque]] = {}
+        self._running: dict[Hashable, int] = {}
+        # key -> [priority, preempt] of each running job
+        self._active: dict[Hashable, list[list]] = {}
+        # devices with queued work and spare capacity, in service order, by
+        # the priority of their most urgent job.  _in_ready maps each device
+        # to its lane and current entry; any other entry of it is stale.
+        self._ready: tuple[deque, ...] = tuple(deque() for _ in PRIORITIES)
+        self._in_ready: dict[Hashable, tuple[int, list]] = {}
+        self._threads: list[threading.Thread] = []
+        self._idle = 0
+        self._closed = False
+
+    def submit(
+        self,
+        key: Hashable,
+        func: Callable[..., Any],
+        *args: Any,
+        priority: int = PRIORITY_INTERACTIVE,
+        preempt: Callable[[], Any] | None = None,
+    ) -> Future:
+        """Queue ``func(*args)`` for device ``key``; returns its Future."""
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('scheduler is shut down')
+            queues = self._queues.get(key)
+            if queues is None:
+                queues = self._queues[key] = [deque() for _ in PRIORITIES]
+            queues[priority].append((future, func, args, preempt))
+            self._mark_ready(key)
+            self._preempt_for(key, priority)
+            if self._idle == 0 and len(self._threads) < self._workers:
+                thread = threading.Thread(
+                    target=self._work, name=f'{self._name}-io-{len(self._threads)}', daemon=True
+                )
+                self._threads.append(thread)
+                thread.start()
+            else:
+                self._cond.notify()
+        return future
+
+    def _head(self, key: Hashable) -> int | None:
+        # Caller holds the lock
+        for priority, queue in enumerate(self._queues.get(key) or ()):
+            if queue:
+                return priority
+        return None
+
+    def _mark_ready(self, key: Hashable) -> None:
+        # Caller holds the lock
+        head = self._head(key)
+        if head is None or self._running.get(key, 0) >= self._per_device:
+            return
+        current = self._in_ready.get(key)
+        if current is None or head < current[0]:
+            entry = [key]
+            self._ready[head].append(entry)
+            self._in_ready[key] = (head, entry)
+
+    def _preempt_for(self, key: Hashable, priority: int) -> None:
+        # Caller holds the lock
+        victims = [job for job in self._active.get(key, ()) if job[0] > priority]
+        if not victims and self._idle == 0 and len(self._threads) >= self._workers:
+            # Every worker is busy: free the least urgent one anywhere
+            victims = [max(
+                (job for jobs in self._active.values() for job in jobs if job[1] is not None),
+                key=lambda job: job[0],
+                default=None,
+            )]
+            if victims[0] is None or victims[0][0] <= priority:
+                victims = []
+        for job in victims:
+            if job[1] is not None:
+                job[1]()
+                job[1] = None
+
+    def _next(self) -> tuple[Hashable, Future, Callable, tuple, list] | None:
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                for ready in self._ready:
+                    while ready:
+                        entry = ready.popleft()
+                        key = entry[0]
+                        if self._in_ready.get(key, (None, None))[1] is entry:
+                            break
+                    else:
+                        continue
+                    break
+                else:
+                    self._idle += 1
+                    self._cond.wait()
+                    self._idle -= 1
+                    continue
+                del self._in_ready[key]
+                queues = self._queues[key]
+                priority = self._head(key)
+                future, func, args, preempt = queues[priority].popleft()
+                self._running[key] = self._running.get(key, 0) + 1
+                job = [priority, preempt]
+                self._active.setdefault(key, []).append(job)
+                # Back of the line, so other devices get their turn first
+                self._mark_ready(key)
+                return key, future, func, args, job
+
+    def _work(self) -> None:
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            key, future, func, args, job = item
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args))
+                except BaseException as exc:  # noqa: BLE001 - handed to the awaiting caller
+                    future.set_exception(exc)
+            with self._cond:
+                self._running[key] -= 1
+                self._active[key].remove(job)
+                if self._head(key) is None and not self._running[key]:
+                    del self._queues[key]
+                    del self._running[key]
+                    del self._active[key]
+                else:
+                    self._mark_ready(key)
+                    self._cond.notify()
+
+    def stats(self) -> dict:
+        """Queued and running jobs per device, for diagnostics."""
+        with self._cond:
+            return {
+                str(key): {
+                    'queued': sum(len(queue) for queue in queues),
+                    'running': self._running.get(key, 0),
+                }
+                for key, queues in self._queues.items()
+            }
+
+    def shutdown(self) -> None:
+        """Cancel queued jobs and let the workers exit after their current one."""
+        with self._cond:
+            self._closed = True
+            for queues in self._queues.values():
+                for queue in queues:
+                    for future, _, _, _ in queue:
+                        future.cancel()
+                    queue.clear()
+            for ready in self._ready:
+                ready.clear()
+            self._in_ready.clear()
+            self._cond.notify_all()
@@ -0,0 +1,67 @@
+"""Persistent cache of the last known CozyLife device state."""
+from __future__ import annotations
+
+import time
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+
+STORAGE_VERSION = 1
+STORAGE_KEY = f"{DOMAIN}.state_cache"
+
+# Batch writes so a poll cycle across the hub costs one disk write
+SAVE_DELAY = 30
+
+
+class DeviceStateCache:
+    """Last known dpid state and CMD_INFO data per device, keyed by did.
+
+    Entities publish the cached state as soon as they are added and then
+    reconcile with the device in the background, so startup time does not
+    depend on how quickly the bulbs answer.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._store: Store[dict[str, dict]] = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._devices: dict[str, dict] = {}
+
+    async def async_load(self) -> None:
+        """Load the cache from disk."""
+        self._devices = await self._store.async_load() or {}
+
+    def get_state(self, did: str) -> dict | None:
+        """Return the last known dpid state for a device."""
+        return self._devices.get(did, {}).get("state")
+
+    def get_info(self, did: str) -> dict | None:
+        """Return the last known device info for a device."""
+        return self._devices.get(did, {}).get("info")
+
+    @callback
+    def async_update_state(self, did: str, state: dict) -> None:
+        """Merge a fresh query result into the cache."""
+        entry = self._devices.setdefault(did, {})
+        entry["state"] = {**entry.get("state", {}), **state}
+        entry["updated"] = time.time()
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    @callback
+    def async_update_info(self, did: str, info: dict) -> None:
+        """Store the device info (ip, pid, model name, dpids)."""
+        entry = self._devices.setdefault(did, {})
+        if entry.get("info") == info:
+            return
+        entry["info"] = dict(info)
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    @callback
+    def async_remove(self, did: str) -> None:
+        """Forget a device."""
+        if self._devices.pop(did, None) is not None:
+            self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    @callback
+    def _data_to_save(self) -> dict[str, dict]:
+        return self._devices
@@ -2,21 +2,20 @@
 from __future__ import annotations
 import logging
 from .tcp_client import tcp_client
+from .entity import CozyLifeDeviceMixin
 from datetime import timedelta
-import asyncio
 
 from homeassistant.components.switch import SwitchEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 
-from typing import Any
 from .const import (
     DOMAIN,
     SWITCH_TYPE_CODE,
     CONF_DEVICE_TYPE_CODE,
+    CONF_DEVICES,
 )
 
 import voluptuous as vol
@@ -50,22 +49,22 @@ async def async_setup_entry(
 ) -> None:
     """Set up CozyLife switches from a hub config entry."""
     entry_data = hass.data[DOMAIN][entry.entry_id]
-    clients = entry_data["clients"]
-    devices = entry_data["devices"]
 
-    entities = []
-    for dev in devices:
-        device_type = dev.get(CONF_DEVICE_TYPE_CODE, "01")
-        if device_type != SWITCH_TYPE_CODE:
-            continue
-        client = clients.get(dev["did"])
-        if client is None:
-            continue
-        entity = CozyLifeSwitch(client, hass)
-        entities.append(entity)
+    @callback
+    def _async_add_clients(clients) -> None:
+        entities = []
+        for client in clients:
+            if client.device_type_code != SWITCH_TYPE_CODE:
+                continue
+            entity = CozyLifeSwitch(client, hass)
+            entities.append(entity)
 
-    if entities:
-        async_add_entities(entities)
+        if entities:
+            async_add_entities(entities)
+
+    _async_add_clients(list(entry_data["clients"].values()))
+    # Devices added to the running hub later come through here
+    entry_data["adders"].append(_async_add_clients)
 
 
 async def async_setup_platform(
@@ -79,8 +78,8 @@ async def async_setup_platform(
         "Configuration of CozyLife switches via YAML is deprecated. "
         "Your YAML config has been imported. Please remove it."
     )
-    for item in config.get('switches', []):
-        import_data = {
+    devices = [
+        {
             "ip": item["ip"],
             "did": item["did"],
             "pid": item.get("pid", "p93sfg"),
@@ -88,86 +87,22 @@ async def async_setup_platform(
             "dpid": item.get("dpid", [1]),
             CONF_DEVICE_TYPE_CODE: SWITCH_TYPE_CODE,
         }
+        for item in config.get('switches', [])
+    ]
+    if devices:
+        # One flow for the whole list, so the hub entry is written once
         hass.async_create_task(
             hass.config_entries.flow.async_init(
                 DOMAIN,
                 context={"source": "import"},
-                data=import_data,
+                data={CONF_DEVICES: devices},
             )
         )
 
 
-class CozyLifeSwitch(SwitchEntity):
-    _tcp_client = None
-    _attr_is_on = True
+class CozyLifeSwitch(CozyLifeDeviceMixin, SwitchEntity):
 
     def __init__(self, tcp_client: tcp_client, hass) -> None:
         """Initialize."""
-        self.hass = hass
-        self._tcp_client = tcp_client
-        self._unique_id = tcp_client.device_id
-        self._name = getattr(tcp_client, 'name', None) or tcp_client.device_id[-4:]
-
-    @property
-    def device_info(self) -> DeviceInfo:
-        """Return device info for device registry."""
-        return DeviceInfo(
-            identifiers={(DOMAIN, self._unique_id)},
-            name=self._tcp_client._device_model_name,
-            manufacturer="CozyLife",
-            model=self._tcp_client._pid,
-        )
-
-    @property
-    def unique_id(self) -> str | None:
-        """Return a unique ID."""
-        return self._unique_id
-
-    async def async_added_to_hass(self):
-        await super().async_added_to_hass()
-        await self.hass.async_add_executor_job(self._refresh_state)
-
-    async def async_update(self):
-        await self.hass.async_add_executor_job(self._refresh_state)
-
-    def _refresh_state(self):
-        self._state = self._tcp_client.query()
-        if self._state:
-            self._attr_is_on = 0 < self._state['1']
-
-    @property
-    def name(self) -> str:
-        return 'cozylife:' + self._name
-
-    @property
-    def available(self) -> bool:
-        """Return if the device is available."""
-        if self._tcp_client._connect:
-            return True
-        else:
-            return False
-
-    @property
-    def is_on(self) -> bool:
-        """Return True if entity is on."""
-        return self._attr_is_on
-
-    async def async_turn_on(self, **kwargs: Any) -> None:
-        """Turn the entity on."""
-        self._attr_is_on = True
-
-        await self.hass.async_add_executor_job(self._tcp_client.control, {
-            '1': 1
-        })
-
-        return None
-
-    async def async_turn_off(self, **kwargs: Any) -> None:
-        """Turn the entity off."""
-        self._attr_is_on = False
-
-        await self.hass.async_add_executor_job(self._tcp_client.control, {
-            '1': 0
-        })
-
-        return None
+        super().__init__(tcp_client, hass)
+        self._name = getattr(tcp_client, 'name', None) or self._name
@@ -1,21 +1,76 @@
 # -*- coding: utf-8 -*-
+import functools
 import json
 import socket
+import threading
 import time
-from typing import Optional, Union, Any
+from typing import Iterable, Optional, Union, Any
 import logging
 try:
-  from .utils import get_pid_list, get_sn
+  from .utils import get_product, get_sn
+  from .device import DeviceDescriptor, intern_product
+  from .ratelimit import AdaptiveLimiter, RttEstimator
+  from .cmdtrace import (CommandTrace, CALLER_DISCOVERY, OUTCOME_OK, OUTCOME_SENT,
+                      OUTCOME_SEND_FAILED, OUTCOME_NO_REPLY, OUTCOME_TIMEOUT)
+  from .deadline import (Deadline, DeadlineExceeded, OpResult, RESULT_OK, RESULT_TIMEOUT,
+                      RESULT_FAILED, STAGE_CONNECT, STAGE_PACE, STAGE_SEND, STAGE_RECV, STAGE_ACK,
+                      STAGE_PREEMPTED)
 except:
-  from utils import get_pid_list, get_sn
+  from utils import get_product, get_sn
+  from device import DeviceDescriptor, intern_product
+  from ratelimit import AdaptiveLimiter, RttEstimator
+  from cmdtrace import (CommandTrace, CALLER_DISCOVERY, OUTCOME_OK, OUTCOME_SENT,
+                     OUTCOME_SEND_FAILED, OUTCOME_NO_REPLY, OUTCOME_TIMEOUT)
+  from deadline import (Deadline, DeadlineExceeded, OpResult, RESULT_OK, RESULT_TIMEOUT,
+                     RESULT_FAILED, STAGE_CONNECT, STAGE_PACE, STAGE_SEND, STAGE_RECV, STAGE_ACK,
+                     STAGE_PREEMPTED)
 
 CMD_INFO = 0
 CMD_QUERY = 2
 CMD_SET = 3
 CMD_LIST = [CMD_INFO, CMD_QUERY, CMD_SET]
+# Overall budget of an operation without an explicit deadline, in multiples
+# of the socket timeout: one connect plus one reply
+BUDGET_FACTOR = 2
+# Transmissions of one reliable control command before giving up
+RELIABLE_TRIES = 3
+# A successful query answers later state reads of the same dpids for this
+# long, in seconds, instead of another round trip
+QUERY_FRESHNESS = 0.5
 _LOGGER = logging.getLogger(__name__)
 
 
+class _Flight(object):
+    """
+    a query on the wire that concurrent state reads wait for
+    """
+
+    def __init__(self, attrs: tuple):
+        self.attrs = attrs
+        self.done = threading.Event()
+        self.result = None
+
+
+def _exclusive(method):
+    """
+    run a socket exchange holding the client's I/O lock, so callers outside
+    the device's scheduler (e.g. scenes) never interleave with it
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._io_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _covers(have: tuple, want: tuple) -> bool:
+    """
+    whether a query for the dpids have answers a read of the dpids want;
+    an empty tuple stands for all of them
+    """
+    return not have or (bool(want) and set(want) <= set(have))
+
+
 class tcp_client(object):
     """
     Represents a device
@@ -35,20 +90,36 @@ class tcp_client(object):
     _ip = str
     _port = 5555
     _connect = None  # socket
+    _pool = None  # ConnectionPool, if the hub budgets sockets
+    _available = True  # False after a failed connect, until one succeeds
+    _hub_limiter = None  # TokenBucket shared by every device of the hub
+    _scheduler = None  # DeviceScheduler that runs this device's I/O
+    _recovery = None  # RecoveryCoordinator that paces reconnects after an outage
+    reliable = False  # wait for the cmd 3 ack and retransmit control commands
+    _handed_over = False  # kept its socket and state across a hub reload
 
-    _device_id = str  # str
-    # _device_key = str
-    _pid = str
-    _device_type_code = str
-    _icon = str
-    _device_model_name = str
-    _dpid = []
     # last sn
     _sn = str
 
-    def __init__(self, ip, timeout=3):
+    def __init__(self, ip, timeout=3, descriptor: Optional[DeviceDescriptor] = None):
         self._ip = ip
         self.timeout = timeout
+        # identity and product data; None until known from config or CMD_INFO
+        self.descriptor = descriptor
+        self._limiter = AdaptiveLimiter()
+        self._trace = CommandTrace()
+        self._rtt = RttEstimator()
+        # bytes received but not yet returned by _recv_message
+        self._rbuf = b''
+        # held for a whole exchange (sn, send and reply), see _exclusive
+        self._io_lock = threading.RLock()
+        # single-flight state reads: the query on the wire, and the time,
+        # dpids and result of the last one that succeeded
+        self._query_lock = threading.Lock()
+        self._flight = None
+        self._fresh = None
+        # CMD_SET packages built so far, to tell a query overtaken by one
+        self._sets = 0
 
     def disconnect(self):
         if self._connect:
@@ -57,19 +128,100 @@ class tcp_client(object):
             except:
                 pass
         self._connect = None
+        self._rbuf = b''
+        if self._pool is not None:
+            self._pool.release(self)
 
     def __del__(self):
         self.disconnect()
 
-    def _initSocket(self):
+    def _initSocket(self, deadline: Optional[Deadline] = None):
+        if self._recovery is not None and not self._recovery.may_connect(self):
+            # the hub is recovering from an outage and will call reconnect()
+            # when it is this device's turn
+            return
+        timeout = self.timeout if deadline is None else deadline.timeout(self.timeout, STAGE_CONNECT)
         try:
             s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.settimeout(self.timeout)
+            s.settimeout(timeout)
             s.connect((self._ip, self._port))
             self._connect = s
+            self._available = True
+            if self._pool is not None:
+                self._pool.checkin(self)
         except:
+            if timeout < self.timeout and deadline.expired:
+                # the budget, not the device, cut the connect short
+                self.disconnect()
+                raise DeadlineExceeded(STAGE_CONNECT)
             _LOGGER.debug('Connection failed for ip=%s', self._ip)
+            self._available = False
             self.disconnect()
+        if self._recovery is not None:
+            self._recovery.report(self, self._connect is not None)
+
+    def reconnect(self) -> bool:
+        """
+        open a socket now unless one is open, e.g. when the hub's recovery
+        coordinator releases this device after an outage
+        :return: True if connected
+        """
+        return self._ensure_connected()
+
+    def _ensure_connected(self, deadline: Optional[Deadline] = None) -> bool:
+        """
+        open the socket on first use, and mark it used for the idle pool
+        :param deadline: bounds the connect, if one is needed
+        :return: True if a socket is open
+        """
+        if not self._connect:
+            self._initSocket(deadline)
+        elif self._pool is not None:
+            self._pool.touch(self)
+        return self._connect is not None
+
+    def _pace(self, deadline: Optional[Deadline] = None) -> None:
+        """
+        wait for a frame slot from the hub and device rate limiters
+        :param deadline: raise DeadlineExceeded rather than wait past it
+        :return:
+        """
+        timeout = None if deadline is None else max(0.0, deadline.remaining())
+        if self._hub_limiter is not None and not self._hub_limiter.acquire(timeout):
+            raise DeadlineExceeded(STAGE_PACE)
+        if deadline is not None:
+            timeout = max(0.0, deadline.remaining())
+        if not self._limiter.acquire(timeout):
+            # no frame goes out, so the hub slot goes back to the other devices
+            if self._hub_limiter is not None:
+                self._hub_limiter.release()
+            raise DeadlineExceeded(STAGE_PACE)
+
+    def _arm(self, deadline: Optional[Deadline], stage: str) -> float:
+        """
+        set the socket timeout for the next call, capped by the deadline
+        :return: the timeout set
+        """
+        timeout = self.timeout if deadline is None else deadline.timeout(self.timeout, stage)
+        self._connect.settimeout(timeout)
+        return timeout
+
+    @property
+    def min_interval(self) -> float:
+        """
+        shortest sustainable gap between frames to this device, in seconds
+        :return:
+        """
+        return self._limiter.min_interval
+
+    @property
+    def available(self) -> bool:
+        """
+        False only after the last connect attempt failed; a socket closed
+        because it was idle does not make the device unavailable
+        :return:
+        """
+        return self._available
 
     @property
     def check(self) -> bool:
@@ -80,38 +232,51 @@ class tcp_client(object):
         return True
 
     @property
-    def dpid(self):
-        return self._dpid
+    def dpid(self) -> tuple:
+        return self.descriptor.dpid if self.descriptor else ()
 
     @property
-    def device_model_name(self):
-        return self._device_model_name
+    def device_model_name(self) -> Optional[str]:
+        return self.descriptor.model_name if self.descriptor else None
 
     @property
-    def icon(self):
-        return self._icon
+    def icon(self) -> Optional[str]:
+        return self.descriptor.product.icon if self.descriptor else None
 
     @property
-    def device_type_code(self) -> str:
-        return self._device_type_code
+    def device_type_code(self) -> Optional[str]:
+        return self.descriptor.device_type_code if self.descriptor else None
 
     @property
-    def device_id(self):
-        return self._device_id
+    def device_id(self) -> Optional[str]:
+        return self.descriptor.did if self.descriptor else None
 
-    def _device_info(self) -> None:
+    @property
+    def pid(self) -> Optional[str]:
+        return self.descriptor.pid if self.descriptor else None
+
+    @_exclusive
+    def _device_info(self, deadline: Union[Deadline, float, None] = None) -> None:
         """
         get info for device model
+        :param deadline: overall budget, a Deadline or seconds
         :return:
         """
-        self._only_send(CMD_INFO, {})
+        deadline = Deadline.coerce(deadline, self.timeout * BUDGET_FACTOR)
         try:
-            try:
-                resp = self._connect.recv(1024)
-            except:
-                self.disconnect()
-                self._initSocket()
+            if not self._ensure_connected(deadline):
+                return None
+            if not self._only_send(CMD_INFO, {}, CALLER_DISCOVERY, deadline):
                 return None
+            resp = self._recv_message(deadline)
+        except DeadlineExceeded as e:
+            _LOGGER.debug('Device info from ip=%s timed out during %s', self._ip, e.stage)
+            self.disconnect()
+            return None
+        except:
+            self.disconnect()
+            return None
+        try:
             resp_json = json.loads(resp.strip())
         except:
             _LOGGER.debug('Failed to parse device info response')
@@ -122,40 +287,33 @@ class tcp_client(object):
 
         if resp_json['msg'].get('did') is None:
             return None
-        self._device_id = resp_json['msg']['did']
+        did = resp_json['msg']['did']
 
         if resp_json['msg'].get('pid') is None:
             return None
 
-        self._pid = resp_json['msg']['pid']
-
-        pid_list = get_pid_list()
-        for item in pid_list:
-            match = False
-            for item1 in item['device_model']:
-                if item1['device_product_id'] == self._pid:
-                    match = True
-                    self._icon = item1['icon']
-                    self._device_model_name = item1['device_model_name']
-                    self._dpid = item1['dpid']
-                    break
-
-            if match:
-                self._device_type_code = item['device_type_code']
-                break
+        pid = resp_json['msg']['pid']
+        # products missing from the catalog get an empty shared record
+        product = get_product(pid) or intern_product(pid, None, None, ())
+        self.descriptor = DeviceDescriptor(did, self._ip, product)
 
         _LOGGER.debug('Device discovered: did=%s, pid=%s, type=%s',
-                      self._device_id, self._pid, self._device_type_code)
+                      did, pid, product.device_type_code)
 
-    def _get_package(self, cmd: int, payload: dict) -> bytes:
+    def _get_package(self, cmd: int, payload) -> bytes:
         """
         package message
         :param cmd:int:
-        :param payload:
+        :param payload: dpid data for CMD_SET; for CMD_QUERY the dpids to
+            read, all of them if empty
         :return:
         """
         self._sn = get_sn()
         if CMD_SET == cmd:
+            # the state is about to change; stop answering reads from the
+            # last query, or from one still on the wire
+            self._fresh = None
+            self._sets += 1
             message = {
                 'pv': 0,
                 'cmd': cmd,
@@ -171,7 +329,7 @@ class tcp_client(object):
                 'cmd': cmd,
                 'sn': self._sn,
                 'msg': {
-                    'attr': [0],
+                    'attr': [int(item) for item in payload] or [0],
                 }
             }
         elif CMD_INFO == cmd:
@@ -187,77 +345,376 @@ class tcp_client(object):
         payload_str = json.dumps(message, separators=(',', ':',))
         return bytes(payload_str + "\r\n", encoding='utf8')
 
-    def _send_receiver(self, cmd: int, payload: dict) -> Union[dict, Any]:
+    def _recv_message(self, deadline: Optional[Deadline] = None) -> bytes:
         """
-        send & receiver
-        :param cmd:
-        :param payload:
+        read one message; the device ends each with \r\n but several may
+        arrive in one segment (e.g. a cmd 3 ack, its cmd 10 push and the
+        next reply), so the remainder is kept for the next call
+        :param deadline: raise DeadlineExceeded rather than wait past it
         :return:
         """
+        while True:
+            if b'\n' in self._rbuf:
+                message, _, self._rbuf = self._rbuf.partition(b'\n')
+                return message
+            if self._rbuf:
+                # tolerate firmware that does not terminate the last message
+                try:
+                    json.loads(self._rbuf)
+                    message, self._rbuf = self._rbuf, b''
+                    return message
+                except ValueError:
+                    pass
+            armed = self._arm(deadline, STAGE_RECV)
+            try:
+                chunk = self._connect.recv(1024)
+            except socket.timeout:
+                if deadline is not None and deadline.expired:
+                    raise DeadlineExceeded(STAGE_RECV)
+                if armed < self.timeout:
+                    # a preemptible deadline waits in short slices
+                    continue
+                raise
+            if not chunk:
+                raise ConnectionError('connection closed by device')
+            self._rbuf += chunk
+
+    def _write(self, package: bytes, deadline: Optional[Deadline] = None) -> bool:
+        """
+        write a package, reconnecting once if the socket is broken
+        :return: True if the package was written
+        """
         try:
-            self._connect.send(self._get_package(cmd, payload))
+            self._arm(deadline, STAGE_SEND)
+            self._connect.sendall(package)
+            return True
+        except DeadlineExceeded:
+            raise
         except:
-            try:
-                self.disconnect()
-                self._initSocket()
-                self._connect.send(self._get_package(cmd, payload))
-            except:
-                pass
+            self.disconnect()
+        self._initSocket(deadline)
+        if not self._connect:
+            return False
         try:
-            i = 10
-            while i > 0:
-                res = self._connect.recv(1024)
-                i -= 1
-                # only allow same sn
-                if self._sn in str(res):
-                    payload = json.loads(res.strip())
-                    if payload is None or len(payload) == 0:
-                        return None
+            self._arm(deadline, STAGE_SEND)
+            self._connect.sendall(package)
+            return True
+        except DeadlineExceeded:
+            raise
+        except:
+            self.disconnect()
+            return False
 
-                    if payload.get('msg') is None or type(payload['msg']) is not dict:
-                        return None
+    def _await_reply(self, cmd: int, sn: str, deadline: Optional[Deadline] = None) -> Optional[dict]:
+        """
+        read messages until the reply to cmd/sn arrives; acks and pushes
+        left over from earlier fire-and-forget commands are skipped, however
+        many there are, until the deadline runs out
+        :param deadline: bounds the wait; one socket timeout if None
+        :return: the reply
+        """
+        deadline = Deadline.coerce(deadline, self.timeout)
+        while True:
+            res = self._recv_message(deadline)
+            try:
+                payload = json.loads(res.strip())
+            except ValueError:
+                continue
+            # only allow same sn and cmd; the sn is a millisecond stamp, so a
+            # cmd 10 push can carry the same one as our query
+            if type(payload) is dict and str(payload.get('sn')) == sn and payload.get('cmd') == cmd:
+                return payload
+
+    @staticmethod
+    def _reply_data(payload: dict) -> Optional[dict]:
+        """
+        the dpid data of a reply, if it has any
+        :return:
+        """
+        if payload.get('msg') is None or type(payload['msg']) is not dict:
+            return None
 
-                    if payload['msg'].get('data') is None or type(payload['msg']['data']) is not dict:
-                        return None
+        if payload['msg'].get('data') is None or type(payload['msg']['data']) is not dict:
+            return None
 
-                    return payload['msg']['data']
+        return payload['msg']['data']
 
-            return None
+    @_exclusive
+    def _send_receiver(self, cmd: int, payload: dict, caller: Optional[str] = None,
+                       deadline: Union[Deadline, float, None] = None) -> OpResult:
+        """
+        send & receiver
+        :param cmd:
+        :param payload:
+        :param caller: who asked, for the command trace
+        :param deadline: overall budget covering connect, pacing, send and
+            every read; a Deadline or seconds
+        :return: OpResult whose data is the reply's dpid data
+        """
+        started = time.monotonic()
+        deadline = Deadline.coerce(deadline, self.timeout * BUDGET_FACTOR)
+        trace = None
+        stage = STAGE_CONNECT
+        try:
+            if not self._ensure_connected(deadline):
+                return OpResult(RESULT_FAILED, stage=stage, elapsed=time.monotonic() - started)
+            stage = STAGE_PACE
+            self._pace(deadline)
+            package = self._get_package(cmd, payload)
+            sn = self._sn
+            trace = self._trace.start(cmd, sn, len(package), caller)
+            sent = time.monotonic()
+            stage = STAGE_SEND
+            if not self._write(package, deadline):
+                self._limiter.record(None)
+                self._trace.finish(trace, OUTCOME_SEND_FAILED)
+                return OpResult(RESULT_FAILED, stage=stage, elapsed=time.monotonic() - started)
+            stage = STAGE_RECV
+            reply = self._await_reply(cmd, sn, deadline)
+            if reply is not None:
+                latency = time.monotonic() - sent
+                self._limiter.record(latency)
+                self._rtt.record(latency)
+                self._trace.finish(trace, OUTCOME_OK, replied=True)
+                return OpResult(RESULT_OK, self._reply_data(reply), elapsed=time.monotonic() - started)
+
+            self._limiter.record(None)
+            self._trace.finish(trace, OUTCOME_NO_REPLY)
+            return OpResult(RESULT_FAILED, stage=stage, elapsed=time.monotonic() - started)
+
+        except DeadlineExceeded as e:
+            # a preempted poll says nothing about the device's health
+            stage = STAGE_PREEMPTED if deadline.preempted else e.stage
+            _LOGGER.debug('cmd %s to ip=%s timed out during %s', cmd, self._ip, stage)
+            if stage == STAGE_RECV:
+                self._limiter.record(None)
+            if trace is not None:
+                self._trace.finish(trace, OUTCOME_TIMEOUT)
+            return OpResult(RESULT_TIMEOUT, stage=stage, elapsed=time.monotonic() - started)
 
         except Exception as e:
             _LOGGER.debug('recv error: %s', e)
-            return None
-
-    def _only_send(self, cmd: int, payload: dict) -> None:
+            self._limiter.record(None)
+            if trace is not None:
+                self._trace.finish(trace, OUTCOME_NO_REPLY)
+            return OpResult(RESULT_FAILED, stage=stage, elapsed=time.monotonic() - started)
+
+    @_exclusive
+    def _send_package(self, package: bytes, sn: str, pace: bool = True, cmd: int = CMD_SET,
+                      caller: Optional[str] = None, deadline: Optional[Deadline] = None) -> bool:
+        """
+        send a prebuilt package, reconnecting once on failure
+        :param package: built by _get_package
+        :param sn: the sn in the package, for the command trace
+        :param pace: wait for the rate limiters; False if the caller already did
+        :param cmd: command in the package, for the command trace
+        :param caller: who asked, for the command trace
+        :param deadline: overall budget, or None for the plain socket timeouts
+        :return: True if the package was written to the socket
+        """
+        trace = None
+        try:
+            if not self._ensure_connected(deadline):
+                return False
+            if pace:
+                self._pace(deadline)
+            trace = self._trace.start(cmd, sn, len(package), caller)
+            if self._write(package, deadline):
+                self._trace.finish(trace, OUTCOME_SENT)
+                return True
+            self._trace.finish(trace, OUTCOME_SEND_FAILED)
+            return False
+        except DeadlineExceeded:
+            if trace is not None:
+                self._trace.finish(trace, OUTCOME_TIMEOUT)
+            return False
+
+    @_exclusive
+    def _only_send(self, cmd: int, payload: dict, caller: Optional[str] = None,
+                   deadline: Optional[Deadline] = None) -> OpResult:
         """
         send but not receiver
         :param cmd:
         :param payload:
+        :param caller: who asked, for the command trace
+        :param deadline: overall budget covering connect, pacing and send
         :return:
         """
+        started = time.monotonic()
+        trace = None
         try:
-            self._connect.send(self._get_package(cmd, payload))
-        except:
-            self._connect.send(self._get_package(cmd, payload))
+            if not self._ensure_connected(deadline):
+                return OpResult(RESULT_FAILED, stage=STAGE_CONNECT, elapsed=time.monotonic() - started)
+            self._pace(deadline)
+            package = self._get_package(cmd, payload)
+            trace = self._trace.start(cmd, self._sn, len(package), caller)
+            if self._write(package, deadline):
+                self._trace.finish(trace, OUTCOME_SENT)
+                return OpResult(RESULT_OK, elapsed=time.monotonic() - started)
+            self._limiter.record(None)
+            self._trace.finish(trace, OUTCOME_SEND_FAILED)
+            return OpResult(RESULT_FAILED, stage=STAGE_SEND, elapsed=time.monotonic() - started)
+        except DeadlineExceeded as e:
+            if trace is not None:
+                self._trace.finish(trace, OUTCOME_TIMEOUT)
+            return OpResult(RESULT_TIMEOUT, stage=e.stage, elapsed=time.monotonic() - started)
+
+    @_exclusive
+    def _send_reliable(self, package: bytes, sn: str, caller: Optional[str] = None,
+                       deadline: Optional[Deadline] = None, pace: bool = True) -> OpResult:
+        """
+        send a CMD_SET package until its cmd 3 ack arrives, retransmitting
+        after the adaptive timeout; every copy carries the same sn, so a late
+        ack of an earlier copy also counts
+        :param package: built by _get_package
+        :param sn: the sn in the package
+        :param caller: who asked, for the command trace
+        :param deadline: overall budget for all tries
+        :param pace: wait for the rate limiters before the first try;
+            retransmissions are always paced
+        :return: OpResult with the number of transmissions
+        """
+        started = time.monotonic()
+        deadline = Deadline.coerce(deadline, self.timeout * BUDGET_FACTOR)
+        stage = STAGE_CONNECT
+        for attempt in range(1, RELIABLE_TRIES + 1):
+            trace = None
             try:
+                stage = STAGE_CONNECT
+                if not self._ensure_connected(deadline):
+                    return OpResult(RESULT_FAILED, stage=stage, elapsed=time.monotonic() - started,
+                                    attempts=attempt)
+                if pace or attempt > 1:
+                    stage = STAGE_PACE
+                    self._pace(deadline)
+                trace = self._trace.start(CMD_SET, sn, len(package), caller)
+                sent = time.monotonic()
+                stage = STAGE_SEND
+                if not self._write(package, deadline):
+                    self._limiter.record(None)
+                    self._trace.finish(trace, OUTCOME_SEND_FAILED)
+                    continue
+                stage = STAGE_ACK
+                attempt_deadline = Deadline(min(self._rtt.rto, deadline.remaining()))
+                reply = self._await_reply(CMD_SET, sn, attempt_deadline)
+                if reply is not None:
+                    if attempt == 1:
+                        # Karn: an ack after a retransmission is no RTT sample
+                        self._rtt.record(time.monotonic() - sent)
+                        self._limiter.record(time.monotonic() - sent)
+                    self._trace.finish(trace, OUTCOME_OK, replied=True)
+                    return OpResult(RESULT_OK, self._reply_data(reply),
+                                    elapsed=time.monotonic() - started, attempts=attempt)
+                self._trace.finish(trace, OUTCOME_NO_REPLY)
+            except DeadlineExceeded as e:
+                if deadline.expired or e.stage != STAGE_RECV:
+                    if trace is not None:
+                        self._trace.finish(trace, OUTCOME_TIMEOUT)
+                    return OpResult(RESULT_TIMEOUT, stage=e.stage if e.stage != STAGE_RECV else STAGE_ACK,
+                                    elapsed=time.monotonic() - started, attempts=attempt)
+                self._trace.finish(trace, OUTCOME_NO_REPLY)
+            except Exception as e:
+                _LOGGER.debug('reliable send error: %s', e)
                 self.disconnect()
-                self._initSocket()
-                self._connect.send(self._get_package(cmd, payload))
-            except:
-                self.disconnect()
-
-    def control(self, payload: dict) -> bool:
+                if trace is not None:
+                    self._trace.finish(trace, OUTCOME_NO_REPLY)
+            if stage == STAGE_ACK:
+                _LOGGER.debug('No ack for sn=%s from ip=%s, try %d', sn, self._ip, attempt)
+                self._limiter.record(None)
+                self._rtt.backoff()
+        return OpResult(RESULT_FAILED, stage=stage, elapsed=time.monotonic() - started,
+                        attempts=RELIABLE_TRIES)
+
+    @_exclusive
+    def control(self, payload: dict, caller: Optional[str] = None,
+                deadline: Union[Deadline, float, None] = None,
+                reliable: Optional[bool] = None) -> OpResult:
         """
         control use dpid
         :param payload:
-        :return:
+        :param caller: who asked, for the command trace
+        :param deadline: overall budget, a Deadline or seconds
+        :param reliable: wait for the ack and retransmit; defaults to
+            self.reliable
+        :return: OpResult, truthy if the command was written (or, when
+            reliable, acknowledged)
         """
-        self._only_send(CMD_SET, payload)
-        return True
-
-    def query(self) -> dict:
+        deadline = Deadline.coerce(deadline, self.timeout * BUDGET_FACTOR)
+        if not (self.reliable if reliable is None else reliable):
+            return self._only_send(CMD_SET, payload, caller, deadline)
+        # built and sent under the I/O lock, so no other exchange can
+        # replace self._sn before it is read
+        package = self._get_package(CMD_SET, payload)
+        return self._send_reliable(package, self._sn, caller, deadline)
+
+    def query_result(self, caller: Optional[str] = None,
+                     deadline: Union[Deadline, float, None] = None,
+                     attrs: Optional[Iterable] = None,
+                     max_age: float = QUERY_FRESHNESS) -> OpResult:
+        """
+        query device state, reporting why it failed or timed out
+        :param caller: who asked, for the command trace
+        :param deadline: overall budget, a Deadline or seconds
+        :param attrs: dpids to read; all of them (attr 0) if None
+        :param max_age: reuse a successful query of these dpids up to this
+            many seconds old; 0 always asks the device
+        :return: OpResult whose data may hold more dpids than asked for
+
+        Concurrent reads share one query: a read that finds a query of
+        the same (or more) dpids on the wire waits for its result instead
+        of sending its own, and any other waits for it to finish first, so
+        replies are never picked up by the wrong caller.
+        """
+        attrs = tuple(str(item) for item in attrs or ())
+        deadline = Deadline.coerce(deadline, self.timeout * BUDGET_FACTOR)
+        while True:
+            with self._query_lock:
+                fresh = self._fresh
+                if (fresh is not None and time.monotonic() - fresh[0] <= max_age
+                        and _covers(fresh[1], attrs)):
+                    return fresh[2]
+                flight = self._flight
+                if flight is None:
+                    flight = self._flight = _Flight(attrs)
+                    sets = self._sets
+                    break
+            try:
+                while not flight.done.wait(deadline.timeout(self.timeout, STAGE_RECV)):
+                    pass
+            except DeadlineExceeded:
+                stage = STAGE_PREEMPTED if deadline.preempted else STAGE_RECV
+                return OpResult(RESULT_TIMEOUT, stage=stage)
+            result = flight.result
+            # a preempted query was cut short for its own caller only
+            if _covers(flight.attrs, attrs) and result.stage != STAGE_PREEMPTED:
+                return result
+        result = OpResult(RESULT_FAILED, stage=STAGE_CONNECT)
+        try:
+            result = self._send_receiver(CMD_QUERY, attrs, caller, deadline)
+        finally:
+            with self._query_lock:
+                if result and sets == self._sets:
+                    self._fresh = (time.monotonic(), attrs, result)
+                self._flight = None
+            flight.result = result
+            flight.done.set()
+        return result
+
+    def query(self, caller: Optional[str] = None,
+              deadline: Union[Deadline, float, None] = None,
+              attrs: Optional[Iterable] = None) -> dict:
         """
         query device state
+        :param caller: who asked, for the command trace
+        :param deadline: overall budget, a Deadline or seconds
+        :param attrs: dpids to read; all of them (attr 0) if None
+        :return: dpid data, or None
+        """
+        return self.query_result(caller, deadline, attrs).data
+
+    def trace(self) -> list:
+        """
+        recent commands to this device, oldest first
         :return:
         """
-        return self._send_receiver(CMD_QUERY, {})
+        return self._trace.dump()
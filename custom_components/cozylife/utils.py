@@ -1,7 +1,14 @@
 import json
+import os
+import threading
 import time
 import requests
 import logging
+from typing import Optional
+try:
+  from .device import Product, compact_catalog, intern_product
+except ImportError:
+  from device import Product, compact_catalog, intern_product
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -12,19 +19,28 @@ def get_sn() -> str:
     """
     return str(int(round(time.time() * 1000)))
 
-# cache get_pid_list result for many calls
-_CACHE_PID = []
+# catalog considered fresh for this long, in seconds
+CATALOG_TTL = 7 * 24 * 3600
+# after a failed fetch, wait this long before asking the cloud again
+CATALOG_RETRY = 300
+CATALOG_VERSION = 1
+
+# compact product catalog, pid -> Product; the raw catalog is not kept
+_CATALOG = {}
+_CATALOG_FETCHED = 0.0  # wall-clock time the cloud returned _CATALOG
+_CATALOG_RETRY_AT = 0.0  # monotonic time before which no fetch is tried
+_CATALOG_PATH = None  # on-disk copy, set by set_catalog_path
+_CATALOG_LOADED = False
+# held by the one fetch in flight; everyone else waits for its result
+_CATALOG_LOCK = threading.Lock()
 
 def get_pid_list(lang='en') -> list:
     """
+    fetch the raw product catalog; not cached, use get_catalog
     http://doc.doit/project-12/doc-95/
     :param lang:
     :return:
     """
-    global _CACHE_PID
-    if len(_CACHE_PID) != 0:
-        return _CACHE_PID
-
     domain = 'api-us.doiting.com'
     protocol = 'http'
     url_prefix = protocol + '://' + domain
@@ -50,5 +66,125 @@ def get_pid_list(lang='en') -> list:
         _LOGGER.warning('get_pid_list: unexpected response structure')
         return []
 
-    _CACHE_PID = info['list']
-    return _CACHE_PID
+    return info['list']
+
+
+def set_catalog_path(path: Optional[str]) -> None:
+    """
+    keep an on-disk copy of the catalog at path, so it survives restarts
+    and outages of the cloud API
+    :param path:
+    :return:
+    """
+    global _CATALOG_PATH, _CATALOG_LOADED
+    _CATALOG_PATH = path
+    _CATALOG_LOADED = False
+
+
+def _load_catalog() -> None:
+    global _CATALOG, _CATALOG_FETCHED, _CATALOG_LOADED
+    _CATALOG_LOADED = True
+    if _CATALOG_PATH is None or not os.path.exists(_CATALOG_PATH):
+        return
+    try:
+        with open(_CATALOG_PATH, encoding='utf-8') as file:
+            data = json.load(file)
+        if data.get('version') != CATALOG_VERSION:
+            return
+        _CATALOG = {
+            pid: intern_product(pid, *fields)
+            for pid, fields in data['products'].items()
+        }
+        _CATALOG_FETCHED = data['fetched']
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        _LOGGER.warning('Ignoring unreadable catalog cache %s: %s', _CATALOG_PATH, e)
+
+
+def _save_catalog() -> None:
+    if _CATALOG_PATH is None:
+        return
+    data = {
+        'version': CATALOG_VERSION,
+        'fetched': _CATALOG_FETCHED,
+        'products': {
+            pid: [p.device_type_code, p.model_name, list(p.dpid), p.icon]
+            for pid, p in _CATALOG.items()
+        },
+    }
+    tmp = _CATALOG_PATH + '.tmp'
+    try:
+        os.makedirs(os.path.dirname(_CATALOG_PATH) or '.', exist_ok=True)
+        with open(tmp, 'w', encoding='utf-8') as file:
+            json.dump(data, file, separators=(',', ':'))
+        os.replace(tmp, _CATALOG_PATH)
+    except OSError as e:
+        _LOGGER.warning('Could not save catalog cache %s: %s', _CATALOG_PATH, e)
+
+
+def _catalog_fresh() -> bool:
+    return len(_CATALOG) != 0 and time.time() - _CATALOG_FETCHED < CATALOG_TTL
+
+
+def refresh_catalog(lang='en') -> dict:
+    """
+    fetch the catalog from the cloud, single-flight: concurrent callers
+    wait for the one request in flight and share its result; a failure
+    keeps the last good copy and holds off retries for CATALOG_RETRY
+    :param lang:
+    :return: pid -> Product
+    """
+    global _CATALOG, _CATALOG_FETCHED, _CATALOG_RETRY_AT
+    with _CATALOG_LOCK:
+        if not _CATALOG_LOADED:
+            _load_catalog()
+        # refreshed by the request we were waiting for
+        if _catalog_fresh() or time.monotonic() < _CATALOG_RETRY_AT:
+            return _CATALOG
+        pid_list = get_pid_list(lang)
+        if len(pid_list) == 0:
+            _CATALOG_RETRY_AT = time.monotonic() + CATALOG_RETRY
+            return _CATALOG
+        _CATALOG = compact_catalog(pid_list)
+        _CATALOG_FETCHED = time.time()
+        _CATALOG_RETRY_AT = 0.0
+        _save_catalog()
+        return _CATALOG
+
+
+def refresh_catalog_in_background(lang='en') -> None:
+    """
+    start a refresh on a daemon thread unless one is already in flight
+    :param lang:
+    :return:
+    """
+    if not _CATALOG_LOCK.locked():
+        threading.Thread(target=refresh_catalog, args=(lang,), name='cozylife-catalog',
+                         daemon=True).start()
+
+
+def get_catalog(lang='en') -> dict:
+    """
+    compact product catalog; blocks on the cloud only when there is no copy
+    at all, otherwise a stale copy is returned and refreshed in the background
+    :param lang:
+    :return: pid -> Product
+    """
+    if not _CATALOG_LOADED:
+        with _CATALOG_LOCK:
+            if not _CATALOG_LOADED:
+                _load_catalog()
+    if len(_CATALOG) == 0:
+        return refresh_catalog(lang)
+    if not _catalog_fresh():
+        refresh_catalog_in_background(lang)
+    return _CATALOG
+
+
+def get_product(pid: str) -> Optional[Product]:
+    """
+    catalog entry for a product id; never fetches, so it is safe on the
+    probe path (discovery loads the catalog once before probing)
+    :param pid:
+    :return: Product, or None if the catalog does not know it
+    """
+    return _CATALOG.get(pid)
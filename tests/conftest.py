@@ -0,0 +1,93 @@
+"""Shared fixtures for the CozyLife test suite.
+
+The protocol and light-math modules are imported straight from the
+integration folder, the same way the command-line tool runs them, so most
+tests need neither Home Assistant nor a real device.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import timeit
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+COMPONENT = ROOT / "custom_components" / "cozylife"
+sys.path.insert(0, str(COMPONENT))
+# For tests that import the integration as a package next to Home Assistant
+sys.path.insert(1, str(ROOT))
+
+from emulator import EmulatedDevice  # noqa: E402
+from ratelimit import AdaptiveLimiter  # noqa: E402
+from tcp_client import tcp_client  # noqa: E402
+
+PERF_BASELINE = Path(__file__).parent / "perf_baseline.json"
+# A measurement fails when it is this many times slower than the baseline
+PERF_THRESHOLD = float(os.environ.get("COZYLIFE_PERF_THRESHOLD", "3.0"))
+# Set to 1 to rewrite perf_baseline.json from this run
+PERF_UPDATE = os.environ.get("COZYLIFE_PERF_UPDATE") == "1"
+# Optional path to write this run's timings to, as JSON
+PERF_OUTPUT = os.environ.get("COZYLIFE_PERF_OUTPUT")
+
+_UNPACED_RATE = 1e9
+
+
+@pytest.fixture
+def device():
+    """An emulated bulb on a free loopback port."""
+    with EmulatedDevice() as emulated:
+        yield emulated
+
+
+def make_client(emulated: EmulatedDevice, timeout: float = 1.0, paced: bool = False) -> tcp_client:
+    host, port = emulated.address
+    client = tcp_client(host, timeout=timeout)
+    client._port = port
+    if not paced:
+        client._limiter = AdaptiveLimiter(_UNPACED_RATE, _UNPACED_RATE, _UNPACED_RATE)
+    return client
+
+
+@pytest.fixture
+def client(device):
+    """An unpaced tcp_client connected to the emulated bulb."""
+    connected = make_client(device)
+    yield connected
+    connected.disconnect()
+
+
+class PerfRecorder:
+    """Time hot paths and compare them with the committed baseline."""
+
+    def __init__(self) -> None:
+        self.results: dict[str, float] = {}
+        try:
+            self.baseline: dict[str, float] = json.loads(PERF_BASELINE.read_text())
+        except FileNotFoundError:
+            self.baseline = {}
+
+    def measure(self, name: str, func, number: int = 1000, repeat: int = 5) -> float:
+        """Return the best seconds per call of func, failing on a regression."""
+        per_call = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+        self.results[name] = per_call
+        baseline = self.baseline.get(name)
+        if baseline is not None and not PERF_UPDATE:
+            assert per_call <= baseline * PERF_THRESHOLD, (
+                f"{name} regressed: {per_call * 1e6:.2f} us/call, "
+                f"baseline {baseline * 1e6:.2f} us/call (threshold x{PERF_THRESHOLD})"
+            )
+        return per_call
+
+
+@pytest.fixture(scope="session")
+def perf():
+    recorder = PerfRecorder()
+    yield recorder
+    if PERF_OUTPUT:
+        Path(PERF_OUTPUT).write_text(json.dumps(recorder.results, indent=2, sort_keys=True) + "\n")
+    if PERF_UPDATE:
+        merged = {**recorder.baseline, **recorder.results}
+        PERF_BASELINE.write_text(json.dumps(merged, indent=2, sort_keys=True) + "\n")
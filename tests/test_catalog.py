@@ -0,0 +1,96 @@
+"""Tests for the single-flight, disk-backed product catalog."""
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+import pytest
+
+import utils
+
+RAW_CATALOG = [
+    {
+        "device_type_code": "01",
+        "device_model": [
+            {"device_product_id": "p93sfg", "device_model_name": "Smart Bulb Light",
+             "icon": "bulb.png", "dpid": [1, 2, 3, 4, 5, 6]},
+        ],
+    },
+]
+
+
+class FakeCloud:
+    """Counts catalog fetches; ``fail`` makes them return nothing."""
+
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self.fail = False
+
+    def __call__(self, lang="en"):
+        self.calls += 1
+        time.sleep(self.delay)
+        return [] if self.fail else RAW_CATALOG
+
+
+@pytest.fixture
+def cloud(monkeypatch, tmp_path):
+    fake = FakeCloud()
+    monkeypatch.setattr(utils, "get_pid_list", fake)
+    monkeypatch.setattr(utils, "_CATALOG", {})
+    monkeypatch.setattr(utils, "_CATALOG_FETCHED", 0.0)
+    monkeypatch.setattr(utils, "_CATALOG_RETRY_AT", 0.0)
+    utils.set_catalog_path(str(tmp_path / "catalog.json"))
+    yield fake
+    utils.set_catalog_path(None)
+
+
+def test_concurrent_callers_share_one_fetch(cloud):
+    cloud.delay = 0.2
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(utils.get_catalog())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cloud.calls == 1
+    assert all(result["p93sfg"].model_name == "Smart Bulb Light" for result in results)
+
+
+def test_catalog_is_saved_and_reloaded(cloud, tmp_path):
+    utils.get_catalog()
+    saved = json.loads((tmp_path / "catalog.json").read_text())
+    assert saved["products"]["p93sfg"][0] == "01"
+
+    utils._CATALOG = {}
+    utils.set_catalog_path(str(tmp_path / "catalog.json"))
+    assert utils.get_catalog()["p93sfg"].dpid == (1, 2, 3, 4, 5, 6)
+    assert cloud.calls == 1
+
+
+def test_failure_keeps_last_good_copy_and_backs_off(cloud):
+    utils.get_catalog()
+    cloud.fail = True
+    utils._CATALOG_FETCHED = 0.0  # stale
+    assert utils.refresh_catalog()["p93sfg"].model_name == "Smart Bulb Light"
+    assert utils.refresh_catalog()["p93sfg"].model_name == "Smart Bulb Light"
+    assert cloud.calls == 2
+
+
+def test_stale_copy_is_refreshed_in_background(cloud):
+    utils.get_catalog()
+    utils._CATALOG_FETCHED = 0.0
+    cloud.delay = 0.2
+    started = time.monotonic()
+    assert "p93sfg" in utils.get_catalog()
+    assert time.monotonic() - started < 0.1
+    deadline = time.monotonic() + 2
+    while cloud.calls < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cloud.calls == 2
+
+
+def test_get_product_never_fetches(cloud):
+    assert utils.get_product("p93sfg") is None
+    assert cloud.calls == 0
@@ -0,0 +1,72 @@
+"""Tests for the compact device records and catalog."""
+from __future__ import annotations
+
+from device import DeviceDescriptor, compact_catalog, intern_product
+
+RAW_CATALOG = [
+    {
+        "device_type_code": "01",
+        "device_type_name": "Light",
+        "device_model": [
+            {
+                "device_product_id": "p93sfg",
+                "device_model_name": "Smart Bulb Light",
+                "icon": "https://example.invalid/bulb.png",
+                "dpid": [1, 2, 3, 4, 5, 6],
+                "mpass": {"lang": {"en": "x" * 512}},
+            },
+            {
+                "device_product_id": "e2s64v",
+                "device_model_name": "Smart Bulb Light",
+                "icon": "https://example.invalid/bulb.png",
+                "dpid": [1, 2, 3, 4, 5, 6],
+            },
+        ],
+    },
+    {"device_type_code": "00", "device_model": [{"device_product_id": "sw1", "dpid": [1]}]},
+]
+
+DEVICE = {
+    "ip": "192.168.1.20",
+    "did": "0123456789abcdef0123",
+    "pid": "p93sfg",
+    "dmn": "Smart Bulb Light",
+    "dpid": [1, 2, 3, 4, 5, 6],
+    "device_type_code": "01",
+}
+
+
+def test_compact_catalog_keeps_used_fields():
+    catalog = compact_catalog(RAW_CATALOG)
+    assert set(catalog) == {"p93sfg", "e2s64v", "sw1"}
+    product = catalog["p93sfg"]
+    assert product.device_type_code == "01"
+    assert product.model_name == "Smart Bulb Light"
+    assert product.dpid == (1, 2, 3, 4, 5, 6)
+    assert product.icon == "https://example.invalid/bulb.png"
+    assert catalog["sw1"].device_type_code == "00"
+
+
+def test_products_are_shared_by_pid():
+    first = DeviceDescriptor.from_dict(DEVICE)
+    second = DeviceDescriptor.from_dict({**DEVICE, "did": "f" * 20, "ip": "192.168.1.21"})
+    assert first.product is second.product
+
+
+def test_entry_data_reuses_catalog_product():
+    catalog = compact_catalog(RAW_CATALOG)
+    descriptor = DeviceDescriptor.from_dict(DEVICE)
+    assert descriptor.product is catalog["p93sfg"]
+
+
+def test_changed_product_does_not_touch_existing_devices():
+    old = DeviceDescriptor.from_dict({**DEVICE, "pid": "zz1"})
+    new = intern_product("zz1", "01", "Renamed", [1])
+    assert old.model_name == "Smart Bulb Light"
+    assert DeviceDescriptor.from_dict({**DEVICE, "pid": "zz1", "dmn": "Renamed", "dpid": [1]}).product is new
+
+
+def test_descriptor_round_trip():
+    descriptor = DeviceDescriptor.from_dict(DEVICE)
+    assert descriptor.as_dict() == DEVICE
+    assert not hasattr(descriptor, "__dict__")
@@ -0,0 +1,61 @@
+"""Tests for the streaming network scan."""
+from __future__ import annotations
+
+import pytest
+
+import discovery
+from discovery import ScanProgress, scan_ips
+
+
+@pytest.fixture
+def probed(monkeypatch):
+    """Identify every responder as a device without the catalog."""
+    calls: list[str] = []
+
+    def probe(ip, port=None):
+        calls.append(ip)
+        return {"ip": ip, "did": f"did-{ip}"}
+
+    monkeypatch.setattr(discovery, "probe_device", probe)
+    monkeypatch.setattr(discovery, "get_catalog", dict)
+    monkeypatch.setattr(discovery, "read_arp_cache", set)
+    return calls
+
+
+def test_scan_reports_progress(device, probed):
+    ips = ["127.0.0.1"] + [f"127.0.0.{i}" for i in range(2, 10)]
+    progress = ScanProgress(len(ips))
+    devices = scan_ips(ips, port=device.address[1], progress=progress)
+    assert [dev["ip"] for dev in devices] == ["127.0.0.1"]
+    assert progress.probed == len(ips)
+    assert progress.responders == 1
+    assert progress.identified == 1
+    assert progress.found == devices
+    assert progress.fraction == 1.0
+
+
+def test_scan_stops_at_expected_count(device, probed, monkeypatch):
+    monkeypatch.setattr(discovery, "SWEEP_BATCH", 1)
+    ips = ["127.0.0.1"] * 5
+    progress = ScanProgress(len(ips), expected=1)
+    devices = scan_ips(ips, port=device.address[1], progress=progress)
+    assert progress.stopped
+    assert len(devices) == 1
+    assert progress.fraction == 1.0
+
+
+def test_stopped_scan_probes_nothing(device, probed):
+    progress = ScanProgress(1)
+    progress.stop()
+    assert scan_ips(["127.0.0.1"], port=device.address[1], progress=progress) == []
+    assert probed == []
+
+
+def test_hub_ranges_key_like_a_scanned_range():
+    devices = [{"ip": ip} for ip in ("10.0.0.5", "10.0.3.9", "192.168.1.7", "192.168.1.20")]
+    hubs = {key: (start, end, [dev["ip"] for dev in devs])
+            for key, start, end, devs in discovery.hub_ranges(devices)}
+    # A /22 worth of devices gets one hub, not one per /24
+    assert hubs["10.0.0.0/22"] == ("10.0.0.1", "10.0.3.254", ["10.0.0.5", "10.0.3.9"])
+    # Devices in one /24 keep the historical key and range
+    assert hubs["192.168.1"] == ("192.168.1.1", "192.168.1.254", ["192.168.1.7", "192.168.1.20"])
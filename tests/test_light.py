@@ -0,0 +1,61 @@
+"""Tests for CozyLifeLight state parsing; need Home Assistant installed."""
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from homeassistant.components.light import ColorMode  # noqa: E402
+
+from custom_components.cozylife.device import DeviceDescriptor  # noqa: E402
+from custom_components.cozylife.light import CozyLifeGroupLight, CozyLifeLight  # noqa: E402
+from custom_components.cozylife.tcp_client import tcp_client  # noqa: E402
+
+
+@pytest.fixture
+def light():
+    descriptor = DeviceDescriptor.from_dict({
+        "ip": "127.0.0.1",
+        "did": "0123456789abcdef0123",
+        "pid": "p93sfg",
+        "dmn": "Smart Bulb Light",
+        "dpid": [1, 2, 3, 4, 5, 6],
+    })
+    client = tcp_client("127.0.0.1", descriptor=descriptor)
+    return CozyLifeLight(client, None, ["manual"])
+
+
+def test_apply_state_color_temp(light):
+    light._apply_state({"1": 1, "2": 0, "3": 0, "4": 1000, "5": 65535, "6": 65535})
+    assert light.is_on
+    assert light.color_mode == ColorMode.COLOR_TEMP
+    assert light.color_temp_kelvin == light.min_color_temp_kelvin
+    assert light.brightness == 255
+
+
+def test_apply_state_hs(light):
+    light._apply_state({"1": 1, "2": 0, "3": 65535, "4": 500, "5": 120, "6": 1000})
+    assert light.color_mode == ColorMode.HS
+    hue, saturation = light.hs_color
+    assert hue == pytest.approx(120, abs=1)
+    assert saturation == pytest.approx(100, abs=1)
+    assert light.brightness == 128
+
+
+def test_scene_payload_round_trips_through_apply_state(light):
+    payload = light.scene_payload({"state": "on", "brightness": 77, "color_temp_kelvin": 3000})
+    light._apply_state(payload)
+    assert light.brightness == 77
+    assert abs(light.color_temp_kelvin - 3000) <= 4
+
+
+def test_group_drops_brightness_next_to_colour_modes(light, monkeypatch):
+    dimmer = SimpleNamespace(
+        supported_color_modes={ColorMode.BRIGHTNESS}, color_mode=ColorMode.BRIGHTNESS, is_on=True)
+    light._apply_state({"1": 0})
+    group = CozyLifeGroupLight(None, SimpleNamespace(entry_id="entry"), "group", [])
+    monkeypatch.setattr(group, "_members", lambda: [light, dimmer])
+    assert group.supported_color_modes == {ColorMode.COLOR_TEMP, ColorMode.HS}
+    assert group.color_mode in group.supported_color_modes
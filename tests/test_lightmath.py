@@ -0,0 +1,121 @@
+"""Property tests for the HA <-> device scale conversions."""
+from __future__ import annotations
+
+from hypothesis import given, strategies as st
+
+from const import DEFAULT_MAX_KELVIN, DEFAULT_MIN_KELVIN
+from lightmath import (
+    brightness_to_device,
+    device_to_brightness,
+    device_to_kelvin,
+    frame_payload,
+    frame_plan,
+    hs_to_device,
+    kelvin_to_device,
+    payload_steps,
+    step_count,
+)
+from program import CHRISMAS_STEPS, ProgramStep, compile_program, decode_program
+
+kelvins = st.integers(min_value=DEFAULT_MIN_KELVIN, max_value=DEFAULT_MAX_KELVIN)
+
+
+@given(st.integers(min_value=0, max_value=255))
+def test_brightness_round_trip(brightness):
+    assert device_to_brightness(brightness_to_device(brightness)) == brightness
+
+
+@given(st.integers(min_value=0, max_value=1000))
+def test_device_brightness_in_range(value):
+    assert 0 <= device_to_brightness(value) <= 255
+
+
+def test_brightness_endpoints():
+    assert brightness_to_device(0) == 0
+    assert brightness_to_device(255) == 1000
+    assert device_to_brightness(1000) == 255
+
+
+@given(kelvins)
+def test_kelvin_round_trip_within_one_device_step(kelvin):
+    device = kelvin_to_device(kelvin, DEFAULT_MIN_KELVIN, DEFAULT_MAX_KELVIN)
+    assert 0 <= device <= 1000
+    back = device_to_kelvin(device, DEFAULT_MIN_KELVIN, DEFAULT_MAX_KELVIN)
+    step = (DEFAULT_MAX_KELVIN - DEFAULT_MIN_KELVIN) / 1000
+    assert abs(back - kelvin) <= step / 2 + 1
+
+
+@given(st.integers(min_value=0, max_value=1000))
+def test_device_kelvin_round_trip(value):
+    kelvin = device_to_kelvin(value, DEFAULT_MIN_KELVIN, DEFAULT_MAX_KELVIN)
+    assert kelvin_to_device(kelvin, DEFAULT_MIN_KELVIN, DEFAULT_MAX_KELVIN) == value
+
+
+def test_kelvin_endpoints():
+    assert kelvin_to_device(DEFAULT_MIN_KELVIN, DEFAULT_MIN_KELVIN, DEFAULT_MAX_KELVIN) == 0
+    assert kelvin_to_device(DEFAULT_MAX_KELVIN, DEFAULT_MIN_KELVIN, DEFAULT_MAX_KELVIN) == 1000
+
+
+@given(st.floats(min_value=0, max_value=360), st.floats(min_value=0, max_value=100))
+def test_hs_to_device_in_range(hue, saturation):
+    device_hue, device_sat = hs_to_device(hue, saturation)
+    assert 0 <= device_hue <= 360
+    assert 0 <= device_sat <= 1000
+
+
+@given(
+    st.integers(min_value=1, max_value=1000),
+    st.floats(min_value=0.01, max_value=600),
+    st.floats(min_value=0.01, max_value=2),
+)
+def test_frame_plan(steps, transition, min_interval):
+    planned, stepseconds = frame_plan(steps, transition, min_interval)
+    assert 1 <= planned <= steps
+    assert abs(planned * stepseconds - transition) < 1e-6
+    if planned < steps and planned > 1:
+        assert stepseconds >= min_interval * 0.66
+
+
+@given(st.integers(0, 1000), st.integers(0, 1000))
+def test_step_count_symmetric(start, end):
+    assert step_count(start, end, 4) == step_count(end, start, 4)
+    assert step_count(start, start, 4) == 0
+
+
+def test_chrismas_program_matches_stock_string():
+    assert compile_program(CHRISMAS_STEPS) == (
+        "03000003E8FFFF007803E8FFFF00F003E8FFFF003C03E8FFFF"
+        "00B403E8FFFF010E03E8FFFF002603E8FFFF"
+    )
+
+
+@given(st.lists(
+    st.builds(
+        ProgramStep,
+        st.integers(0, 360),
+        st.integers(0, 1000).map(lambda s: s / 10),
+        st.none(),
+    ),
+    min_size=1, max_size=16,
+))
+def test_program_round_trip(steps):
+    mode, decoded = decode_program(compile_program(steps))
+    assert mode == 3
+    assert decoded == steps
+
+
+device_values = st.integers(min_value=0, max_value=1000)
+
+
+@given(device_values, device_values, st.integers(min_value=1, max_value=100))
+def test_frames_run_from_start_to_end(start, end, steps):
+    first = frame_payload({'4': start}, {'1': 255, '4': end}, 0, steps)
+    last = frame_payload({'4': start}, {'1': 255, '4': end}, steps, steps)
+    assert first == {'1': 255, '4': start}
+    assert last == {'1': 255, '4': end}
+
+
+def test_payload_steps_uses_the_slowest_dpid():
+    assert payload_steps({'4': 0, '3': 0}, {'4': 400, '3': 40}) == 100
+    # Nothing to interpolate: a single switch-only payload
+    assert payload_steps({}, {'1': 0}) == 0
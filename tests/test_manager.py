@@ -0,0 +1,68 @@
+"""Tests for the domain-wide connection manager."""
+from __future__ import annotations
+
+from manager import ConnectionManager
+
+
+class FakeClient:
+    def __init__(self, did: str) -> None:
+        self.did = did
+
+
+def test_device_on_two_hubs_gets_one_client():
+    manager = ConnectionManager()
+    first, owned = manager.acquire("hub1", "d1", lambda: FakeClient("d1"))
+    assert owned
+    second, owned = manager.acquire("hub2", "d1", lambda: FakeClient("d1"))
+    assert second is first
+    assert not owned
+    assert len(manager) == 1
+    assert manager.owner("d1") == "hub1"
+
+
+def test_owner_unload_hands_over_and_last_release_closes():
+    manager = ConnectionManager()
+    client, _ = manager.acquire("hub1", "d1", lambda: FakeClient("d1"))
+    manager.acquire("hub1", "d2", lambda: FakeClient("d2"))
+    manager.acquire("hub2", "d1", lambda: FakeClient("d1"))
+
+    unused, moved = manager.release_entry("hub1")
+    assert [c.did for c in unused] == ["d2"]
+    assert moved == {"hub2": [client]}
+    assert manager.owner("d1") == "hub2"
+
+    unused, moved = manager.release_entry("hub2")
+    assert unused == [client]
+    assert moved == {}
+    assert len(manager) == 0
+
+
+def test_releasing_a_non_owner_changes_nothing():
+    manager = ConnectionManager()
+    manager.acquire("hub1", "d1", lambda: FakeClient("d1"))
+    manager.acquire("hub2", "d1", lambda: FakeClient("d1"))
+    assert manager.release("hub2", "d1") == (None, None)
+    assert manager.release("hub3", "d1") == (None, None)
+    assert manager.owner("d1") == "hub1"
+
+
+def test_parked_client_is_taken_over_once():
+    manager = ConnectionManager()
+    client, _ = manager.acquire("hub1", "d1", lambda: FakeClient("d1"))
+    unused, _ = manager.release_entry("hub1")
+    manager.park("d1", unused[0])
+
+    parked = manager.unpark("d1")
+    assert parked is client
+    again, owned = manager.acquire("hub1", "d1", lambda: parked)
+    assert again is client and owned
+    # The grace timer finds it taken and leaves it open
+    assert not manager.discard("d1", client)
+
+
+def test_unclaimed_parked_client_is_closed():
+    manager = ConnectionManager()
+    client = FakeClient("d1")
+    manager.park("d1", client)
+    assert manager.discard("d1", client)
+    assert manager.unpark("d1") is None
@@ -0,0 +1,56 @@
+"""Benchmarks of the protocol and light-math hot paths.
+
+Each measurement is compared with tests/perf_baseline.json and fails when
+it is more than COZYLIFE_PERF_THRESHOLD (default 3) times slower.  Run with
+COZYLIFE_PERF_UPDATE=1 to refresh the baseline after an intended change,
+and COZYLIFE_PERF_OUTPUT=path to save the timings of a run.
+"""
+from __future__ import annotations
+
+from cmdtrace import CommandTrace
+from lightmath import brightness_to_device, device_to_kelvin, frame_plan, kelvin_to_device
+from program import CHRISMAS_STEPS, compile_program
+from tcp_client import CMD_QUERY, CMD_SET, tcp_client
+
+
+def test_perf_get_package(perf):
+    client = tcp_client("127.0.0.1")
+    perf.measure("get_package_set", lambda: client._get_package(CMD_SET, {"1": 255, "2": 0, "3": 500, "4": 800}))
+    perf.measure("get_package_query", lambda: client._get_package(CMD_QUERY, {}))
+
+
+def test_perf_query_loopback(perf, client):
+    assert client.query() is not None
+    # Past the freshness window, so every call goes to the device
+    perf.measure("query_loopback", lambda: client.query_result(max_age=0), number=200)
+
+
+def test_perf_recv_message(perf, client):
+    segment = b'{"cmd":3,"sn":"1"}\r\n{"cmd":10,"sn":"2"}\r\n{"cmd":2,"sn":"3"}\r\n'
+
+    def _parse():
+        client._rbuf = segment
+        client._recv_message()
+        client._recv_message()
+        client._recv_message()
+
+    perf.measure("recv_message_x3", _parse)
+
+
+def test_perf_light_math(perf):
+    def _convert():
+        for value in range(0, 256, 8):
+            brightness_to_device(value)
+            device_to_kelvin(kelvin_to_device(2700 + value * 10, 2700, 6500), 2700, 6500)
+
+    perf.measure("light_math_x32", _convert)
+    perf.measure("frame_plan", lambda: frame_plan(250, 5, 0.2))
+
+
+def test_perf_program_compile(perf):
+    perf.measure("compile_program", lambda: compile_program(CHRISMAS_STEPS))
+
+
+def test_perf_trace_record(perf):
+    trace = CommandTrace()
+    perf.measure("trace_record", lambda: trace.finish(trace.start(3, "1", 64, "poll"), "sent"))
@@ -0,0 +1,63 @@
+"""Tests for the per-hub connection pool."""
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+
+from pool import ConnectionPool
+from tcp_client import tcp_client
+
+
+class FakeSocket:
+    def close(self) -> None:
+        pass
+
+
+def _open_client(pool: ConnectionPool, ip: str) -> tcp_client:
+    client = tcp_client(ip)
+    client._pool = pool
+    client._connect = FakeSocket()
+    pool.checkin(client)
+    return client
+
+
+@contextmanager
+def _busy(client: tcp_client):
+    """Hold the client's I/O lock from another thread, like a running exchange."""
+    held, done = threading.Event(), threading.Event()
+
+    def _hold():
+        with client._io_lock:
+            held.set()
+            done.wait()
+
+    thread = threading.Thread(target=_hold)
+    thread.start()
+    held.wait()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+
+
+def test_eviction_skips_clients_mid_exchange():
+    pool = ConnectionPool(max_connections=2)
+    oldest = _open_client(pool, "10.0.0.1")
+    older = _open_client(pool, "10.0.0.2")
+    with _busy(oldest):
+        newest = _open_client(pool, "10.0.0.3")
+    assert oldest._connect is not None
+    assert older._connect is None
+    assert newest._connect is not None
+    assert len(pool) == 2
+
+
+def test_close_idle_leaves_busy_clients_open():
+    pool = ConnectionPool(idle_timeout=0)
+    busy = _open_client(pool, "10.0.0.1")
+    idle = _open_client(pool, "10.0.0.2")
+    with _busy(busy):
+        assert pool.close_idle() == 1
+    assert busy._connect is not None
+    assert idle._connect is None
@@ -0,0 +1,324 @@
+"""Tests for the tcp_client wire protocol against an emulated device."""
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+import pytest
+
+from conftest import make_client
+from emulator import EmulatedDevice
+from ratelimit import AdaptiveLimiter, RttEstimator, TokenBucket
+from tcp_client import CMD_INFO, CMD_QUERY, CMD_SET, tcp_client
+
+
+def _decode(package: bytes) -> dict:
+    assert package.endswith(b"\r\n")
+    return json.loads(package)
+
+
+def test_get_package_query():
+    client = tcp_client("127.0.0.1")
+    message = _decode(client._get_package(CMD_QUERY, {}))
+    assert message == {"pv": 0, "cmd": CMD_QUERY, "sn": client._sn, "msg": {"attr": [0]}}
+    assert client._sn.isdigit()
+
+
+def test_get_package_query_selected_attrs():
+    client = tcp_client("127.0.0.1")
+    assert _decode(client._get_package(CMD_QUERY, ("1", "4")))["msg"] == {"attr": [1, 4]}
+
+
+def test_get_package_set_lists_attrs_as_ints():
+    client = tcp_client("127.0.0.1")
+    message = _decode(client._get_package(CMD_SET, {"1": 255, "4": 500}))
+    assert message["msg"] == {"attr": [1, 4], "data": {"1": 255, "4": 500}}
+
+
+def test_get_package_info():
+    client = tcp_client("127.0.0.1")
+    assert _decode(client._get_package(CMD_INFO, {}))["msg"] == {}
+
+
+def test_get_package_is_compact():
+    client = tcp_client("127.0.0.1")
+    assert b" " not in client._get_package(CMD_SET, {"1": 1})
+
+
+def test_get_package_rejects_unknown_cmd():
+    with pytest.raises(Exception):
+        tcp_client("127.0.0.1")._get_package(99, {})
+
+
+def test_query_returns_device_state(device, client):
+    assert client.query() == device.state
+
+
+def test_query_selected_attrs(device, client):
+    assert client.query(attrs=["1", "4"]) == {"1": device.state["1"], "4": device.state["4"]}
+
+
+def test_control_reaches_device(device, client):
+    client.control({"1": 1, "4": 321})
+    deadline = time.monotonic() + 2
+    while device.state["4"] != 321 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert device.state["1"] == 1
+    assert device.state["4"] == 321
+
+
+def test_query_after_control_skips_ack_and_push(device, client):
+    # The cmd 3 ack and cmd 10 push may share a segment with the query reply
+    for value in range(0, 1000, 100):
+        client.control({"4": value})
+        assert client.query()["4"] == value
+
+
+def test_recv_message_splits_coalesced_segments(client):
+    client._ensure_connected()
+    client._rbuf = b'{"cmd":3,"sn":"1"}\r\n{"cmd":10,"sn":"2"}\r\n{"cmd":2'
+    assert json.loads(client._recv_message())["sn"] == "1"
+    assert json.loads(client._recv_message())["sn"] == "2"
+    assert client._rbuf == b'{"cmd":2'
+
+
+def test_recv_message_accepts_unterminated_message(client):
+    client._rbuf = b'{"cmd":2,"sn":"7"}'
+    assert json.loads(client._recv_message())["sn"] == "7"
+    assert client._rbuf == b""
+
+
+def test_query_after_burst_of_unacknowledged_controls(device):
+    client = make_client(device, paced=True)
+    rate = client._limiter.rate
+    for value in range(20):
+        assert client.control({"4": 100 + value})
+    # Twenty acks and pushes are still unread when the queries go out
+    for _ in range(4):
+        result = client.query_result(max_age=0)
+        assert result.ok
+        assert result.data["4"] == 119
+    assert client._limiter.rate >= rate
+    client.disconnect()
+
+
+def test_query_without_reply_returns_none(device, client):
+    device.loss = 1.0
+    client.timeout = 0.1
+    client.disconnect()
+    assert client.query() is None
+
+
+def test_device_info(device, client):
+    client._device_info()
+    assert client.device_id == device.did
+    assert client.pid == device.pid
+    assert client.descriptor.ip == "127.0.0.1"
+
+
+def test_unreachable_device_is_unavailable():
+    client = tcp_client("127.0.0.1", timeout=0.2)
+    client._port = 1
+    assert client.query() is None
+    assert not client.available
+
+
+def test_trace_records_query(client):
+    client.query("poll")
+    record = client.trace()[-1]
+    assert record["cmd"] == CMD_QUERY
+    assert record["outcome"] == "ok"
+    assert record["caller"] == "poll"
+    assert record["latency_ms"] >= 0
+
+
+def test_trace_latency_ignores_wall_clock_jumps(monkeypatch):
+    import cmdtrace
+
+    trace = cmdtrace.CommandTrace()
+    slot = trace.start(CMD_QUERY, "1", 32, "poll")
+    # The wall clock steps back an hour between send and reply
+    wall = time.time() - 3600
+    monkeypatch.setattr(cmdtrace.time, "time", lambda: wall)
+    trace.finish(slot, "ok", replied=True)
+    record = trace.dump()[-1]
+    assert 0 <= record["latency_ms"] < 1000
+    assert record["replied"] >= record["sent"]
+
+
+def test_query_result_ok(device, client):
+    result = client.query_result(deadline=1.0)
+    assert result
+    assert result.data == device.state
+    assert result.stage is None
+
+
+def test_deadline_bounds_slow_reply(device, client):
+    device.latency = 1.0
+    started = time.monotonic()
+    result = client.query_result(deadline=0.3)
+    assert time.monotonic() - started < 0.6
+    assert result.timed_out
+    assert result.stage == "recv"
+    assert client.trace()[-1]["outcome"] == "timeout"
+
+
+def test_deadline_covers_every_read(device, client):
+    # Pushes keep arriving but never the reply; the old per-read timeout
+    # would have waited for ten of them
+    client.timeout = 1.0
+    client._ensure_connected()
+    device.loss = 1.0
+    client._rbuf = b'{"cmd":10,"sn":"1"}\r\n' * 5
+    started = time.monotonic()
+    result = client.query_result(deadline=0.3)
+    assert result.timed_out
+    assert time.monotonic() - started < 0.6
+
+
+def test_deadline_bounds_rate_limit_wait(client):
+    client._limiter = AdaptiveLimiter(0.5, 0.5, 0.5)
+    assert client.query_result(deadline=1.0)
+    result = client.query_result(deadline=0.2, max_age=0)
+    assert result.timed_out
+    assert result.stage == "pace"
+
+
+def test_device_pace_refusal_refunds_hub_token(client):
+    client._limiter = AdaptiveLimiter(0.5, 0.5, 0.5)
+    assert client.query_result(deadline=1.0)
+    client._hub_limiter = TokenBucket(0.01, burst=1.0)
+    # The device refuses the next frame, so the hub token it took must go
+    # back for the other devices
+    assert client.query_result(deadline=0.2, max_age=0).stage == "pace"
+    assert client._hub_limiter.acquire(0)
+
+
+def test_control_result(device, client):
+    assert client.control({"1": 1}, deadline=1.0).ok
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_control_reconnects_after_broken_socket(device, client):
+    client._ensure_connected()
+    client._connect.close()
+    result = client.control({"4": 654})
+    assert result.ok
+    assert _wait_for(lambda: device.state["4"] == 654)
+
+
+def test_reliable_control_acknowledged(device, client):
+    result = client.control({"4": 111}, reliable=True)
+    assert result.ok
+    assert result.attempts == 1
+    assert result.data == {"4": 111}
+
+
+def test_reliable_control_retransmits_same_sn(device, client):
+    device.drop = 1
+    result = client.control({"4": 222}, reliable=True)
+    assert result.ok
+    assert result.attempts == 2
+    sets = [r for r in device.requests if r["cmd"] == CMD_SET]
+    assert len(sets) == 2
+    assert sets[0]["sn"] == sets[1]["sn"]
+    assert device.state["4"] == 222
+
+
+def test_reliable_control_gives_up(device, client):
+    device.drop = 10
+    started = time.monotonic()
+    result = client.control({"4": 333}, reliable=True, deadline=5.0)
+    assert not result
+    assert result.stage == "ack"
+    assert result.attempts == 3
+    assert time.monotonic() - started < 4.0
+    assert [r["outcome"] for r in client.trace()[-3:]] == ["no_reply"] * 3
+
+
+def test_rtt_estimator():
+    rtt = RttEstimator()
+    for _ in range(20):
+        rtt.record(0.01)
+    assert rtt.rto == 0.1
+    rtt.backoff()
+    assert rtt.rto == 0.2
+    for _ in range(5):
+        rtt.backoff()
+    assert rtt.rto == 1.0
+
+
+def test_reliable_scene(client):
+    from scene import apply_payloads
+
+    with EmulatedDevice() as lossy:
+        lossy.drop = 1
+        other = tcp_client(lossy.address[0], timeout=1.0)
+        other._port = lossy.address[1]
+        results = apply_payloads([(client, {"1": 1}), (other, {"1": 1})], reliable=True)
+        other.disconnect()
+    assert [r["success"] for r in results] == [True, True]
+    assert [r["attempts"] for r in results] == [1, 2]
+
+
+def test_exchanges_wait_for_the_io_lock(client):
+    from scene import apply_payloads
+
+    # A scene worker holds the lock from prepare to send; a poll meanwhile waits
+    client._io_lock.acquire()
+    polled = []
+    poll = threading.Thread(target=lambda: polled.append(client.query_result(max_age=0)))
+    poll.start()
+    time.sleep(0.2)
+    assert not polled
+    client._io_lock.release()
+    poll.join()
+    assert polled[0].ok
+    assert apply_payloads([(client, {"1": 0})])[0]["success"]
+
+
+def _queries(client) -> int:
+    return sum(1 for record in client.trace() if record["cmd"] == CMD_QUERY)
+
+
+def test_fresh_query_is_reused(device, client):
+    first = client.query_result()
+    assert client.query_result(attrs=["1"]) is first
+    assert _queries(client) == 1
+    # A selective query does not answer a full read
+    client._fresh = (time.monotonic(), ("1",), first)
+    assert client.query_result() is not first
+    assert _queries(client) == 2
+
+
+def test_control_invalidates_fresh_query(device, client):
+    assert client.query()["4"] == device.state["4"]
+    client.control({"4": 555})
+    deadline = time.monotonic() + 2
+    while device.state["4"] != 555 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client.query()["4"] == 555
+    assert _queries(client) == 2
+
+
+def test_concurrent_queries_share_one_request():
+    with EmulatedDevice(latency=0.2) as device:
+        client = make_client(device)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(client.query_result()))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 4
+        assert all(result is results[0] and result.ok for result in results)
+        assert _queries(client) == 1
+        client.disconnect()
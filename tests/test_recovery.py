@@ -0,0 +1,122 @@
+"""Tests for hub-wide outage recovery."""
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from conftest import make_client
+from recovery import RecoveryCoordinator
+
+
+class FakeClient:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+def _wait(predicate, timeout: float = 5.0) -> None:
+    end = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def probes():
+    """A probe that records each release and reports the reconnect as ok."""
+    calls: list[tuple[float, FakeClient]] = []
+    lock = threading.Lock()
+
+    def probe(client):
+        with lock:
+            calls.append((time.monotonic(), client))
+        coordinator.report(client, True)
+
+    coordinator = RecoveryCoordinator(probe, wave_size=3, wave_interval=0.2, jitter=0.05)
+    yield coordinator, calls
+    coordinator.shutdown()
+
+
+def test_single_failures_are_not_an_outage(probes):
+    coordinator, calls = probes
+    clients = [FakeClient(str(i)) for i in range(10)]
+    for client in clients:
+        coordinator.register(client)
+    coordinator.report(clients[0], False)
+    coordinator.report(clients[1], False)
+    assert not coordinator.recovering
+    assert coordinator.may_connect(clients[0])
+
+
+def test_mass_outage_reconnects_in_waves(probes):
+    coordinator, calls = probes
+    clients = [FakeClient(str(i)) for i in range(8)]
+    for client in clients:
+        coordinator.register(client)
+    for client in clients:
+        coordinator.report(client, False)
+    assert coordinator.recovering
+    # Individual retries are held back until the device's turn
+    assert not any(coordinator.may_connect(client) for client in clients)
+
+    _wait(lambda: not coordinator.recovering)
+    assert sorted(c.name for _, c in calls) == sorted(c.name for c in clients)
+    times = [t for t, _ in calls]
+    # Three per wave, and the next wave waits for the interval
+    assert times[3] - times[0] >= 0.15
+    assert times[2] - times[0] < 0.15
+    progress = coordinator.progress()
+    assert progress["down"] == 0
+    assert not progress["recovering"]
+    assert all(coordinator.may_connect(client) for client in clients)
+
+
+def test_unreachable_devices_are_given_up():
+    coordinator = RecoveryCoordinator(
+        lambda client: coordinator.report(client, False),
+        wave_size=5, wave_interval=0.01, jitter=0.0,
+    )
+    clients = [FakeClient(str(i)) for i in range(4)]
+    for client in clients:
+        coordinator.register(client)
+    for client in clients:
+        coordinator.report(client, False)
+    _wait(lambda: not coordinator.recovering)
+    progress = coordinator.progress()
+    assert progress["down"] == 4
+    coordinator.shutdown()
+
+
+def test_client_waits_for_release(device):
+    client = make_client(device)
+    reconnected = []
+
+    def probe(released):
+        if released is client:
+            reconnected.append(client.reconnect())
+        else:
+            coordinator.report(released, True)
+
+    coordinator = RecoveryCoordinator(probe, wave_size=1, wave_interval=0.05, jitter=0.0)
+    client._recovery = coordinator
+    others = [FakeClient(str(i)) for i in range(3)]
+    for other in [client, *others]:
+        coordinator.register(other)
+    for other in others:
+        coordinator.report(other, False)
+    assert coordinator.recovering
+
+    # Held back: no connect attempt, and the device is not marked unavailable
+    assert client.query(deadline=0.5) is None
+    assert client._connect is None
+    assert client.available
+
+    _wait(lambda: not coordinator.recovering)
+    assert reconnected == [True]
+    assert client.query() is not None
+    coordinator.shutdown()
+    client.disconnect()
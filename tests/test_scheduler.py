@@ -0,0 +1,145 @@
+"""Tests for per-device fair scheduling."""
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from conftest import make_client
+from deadline import STAGE_PREEMPTED, PreemptibleDeadline
+from scheduler import (
+    PRIORITY_EFFECT,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_POLL,
+    PRIORITY_TRANSITION,
+    DeviceScheduler,
+)
+
+
+@pytest.fixture
+def scheduler():
+    sched = DeviceScheduler(workers=4, per_device=1)
+    yield sched
+    sched.shutdown()
+
+
+def test_result_and_exception(scheduler):
+    assert scheduler.submit("a", lambda x: x * 2, 21).result(1) == 42
+    with pytest.raises(ZeroDivisionError):
+        scheduler.submit("a", lambda: 1 / 0).result(1)
+
+
+def test_jobs_of_one_device_run_one_at_a_time(scheduler):
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def job():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.pop()
+
+    futures = [scheduler.submit("a", job) for _ in range(6)]
+    for future in futures:
+        future.result(2)
+    assert max(peak) == 1
+
+
+def test_stalled_device_does_not_block_others(scheduler):
+    release = threading.Event()
+    stuck = [scheduler.submit("slow", release.wait, 5) for _ in range(10)]
+    started = time.monotonic()
+    fast = [scheduler.submit(f"dev{i}", time.sleep, 0.01) for i in range(20)]
+    for future in fast:
+        future.result(2)
+    assert time.monotonic() - started < 1.0
+    assert scheduler.stats()["slow"] == {"queued": 9, "running": 1}
+    release.set()
+    for future in stuck:
+        future.result(2)
+
+
+def test_devices_are_served_round_robin():
+    sched = DeviceScheduler(workers=1)
+    gate = threading.Event()
+    order = []
+    # Hold the only worker while both queues fill up
+    sched.submit("gate", gate.wait, 5)
+    for i in range(3):
+        sched.submit("a", order.append, f"a{i}")
+    for i in range(3):
+        sched.submit("b", order.append, f"b{i}")
+    gate.set()
+    sched.submit("b", lambda: None).result(2)
+    sched.shutdown()
+    assert order == ["a0", "b0", "a1", "b1", "a2", "b2"]
+
+
+def test_shutdown_cancels_queued_jobs():
+    sched = DeviceScheduler(workers=1)
+    gate = threading.Event()
+    started = threading.Event()
+
+    def first_job():
+        started.set()
+        return gate.wait(5)
+
+    first = sched.submit("a", first_job)
+    queued = sched.submit("a", lambda: None)
+    assert started.wait(2)
+    sched.shutdown()
+    gate.set()
+    assert first.result(2) is True
+    assert queued.cancelled()
+    with pytest.raises(RuntimeError):
+        sched.submit("a", lambda: None)
+
+
+def test_urgent_jobs_of_a_device_run_first():
+    sched = DeviceScheduler(workers=1)
+    gate = threading.Event()
+    order = []
+    sched.submit("gate", gate.wait, 5)
+    sched.submit("a", order.append, "poll", priority=PRIORITY_POLL)
+    sched.submit("a", order.append, "effect", priority=PRIORITY_EFFECT)
+    sched.submit("a", order.append, "frame", priority=PRIORITY_TRANSITION)
+    sched.submit("a", order.append, "tap", priority=PRIORITY_INTERACTIVE)
+    gate.set()
+    sched.submit("a", lambda: None, priority=PRIORITY_POLL).result(2)
+    sched.shutdown()
+    assert order == ["tap", "frame", "effect", "poll"]
+
+
+def test_devices_with_urgent_work_are_served_first():
+    sched = DeviceScheduler(workers=1)
+    gate = threading.Event()
+    order = []
+    sched.submit("gate", gate.wait, 5)
+    for i in range(3):
+        sched.submit(f"poll{i}", order.append, f"poll{i}", priority=PRIORITY_POLL)
+    sched.submit("b", order.append, "tap")
+    gate.set()
+    sched.submit("x", lambda: None, priority=PRIORITY_POLL).result(2)
+    sched.shutdown()
+    assert order[0] == "tap"
+
+
+def test_running_poll_is_preempted_by_a_command(scheduler, device):
+    client = make_client(device)
+    device.latency = 1.0
+    deadline = PreemptibleDeadline(2.0)
+    started = time.monotonic()
+    # A poll that has just started waiting for its reply...
+    poll = scheduler.submit("a", client.query_result, None, deadline,
+                            priority=PRIORITY_POLL, preempt=deadline.preempt)
+    time.sleep(0.05)
+    # ...gives way at its next read when a command for the device arrives
+    tap = scheduler.submit("a", lambda: time.monotonic())
+    result = poll.result(3)
+    assert result.stage == STAGE_PREEMPTED
+    assert tap.result(3) - started < 1.5
+    client.disconnect()